@@ -6,13 +6,21 @@ installation:
 pip install argparse lakeshore
 """
 import serial
-from time import sleep
+from time import sleep, monotonic
 from datetime import datetime as dt
 import os
+import json
+import logging
+import socket
+import socketserver
+import tempfile
+import threading
 
 import argparse
 from lakeshore.generic_instrument import InstrumentException, GenericInstrument, comports
 
+logger = logging.getLogger(__name__)
+
 cryocoolers = (
     "FT86J1KYA",
     "FT86J1KYD",
@@ -24,6 +32,9 @@ pressure_gauge = "B001UCFNA"
 cryocooler_on_mode = ('temperature', 'temperature', 'power')
 default_setpoints = ('70', '70', '200')
 
+# the daemon listens here, on/off/status requests go to it when it is running
+default_socket_path = os.path.join(tempfile.gettempdir(), 'cryotel_onoff.sock')
+
 
 class ModifiedGenericInstrument(GenericInstrument):
     # vid_pid = (1659, 8963)
@@ -170,23 +181,44 @@ class CryotelAVC(ModifiedGenericInstrument):
     #     print(_cmd)
     #     self.device_serial.write(_cmd)
 
+    def _read_lines(self, line_count):
+        """Reads line_count terminated lines, the port timeout is a ceiling on the whole read"""
+        timeout = self.device_serial.timeout
+        deadline = monotonic() + timeout
+        response = b''
+        try:
+            for _ in range(line_count):
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self.device_serial.timeout = remaining
+                line = self.device_serial.read_until(self.serial_cmd_termination)
+                response += line
+                if not line.endswith(self.serial_cmd_termination):
+                    break
+        finally:
+            self.device_serial.timeout = timeout
+        return response
+
     def _usb_query(self, query):
         """Query over the serial USB connection"""
         query = query.upper()
+        # drop anything left over from a previous reply, e.g. the \n after its last \r
+        self.device_serial.reset_input_buffer()
         self._usb_command(query)
-        # sleep(1)
-        # response = self.device_serial.read(5)
         _cmd = query.split('=')[0].strip()
-        # response = ''
-        # for l in range(self.command_return_lines[_cmd]):
-        #     response += self.device_serial.read_until(self.serial_cmd_termination).decode('ascii') + '\n'
-        sleep(0.5)
-        response = self.device_serial.read_all().decode('ascii')
-        # print(response)
+        line_count = self.command_return_lines.get(_cmd)
+        if line_count is None:
+            # unknown reply length, give the controller time to answer and take whatever arrived
+            sleep(0.5)
+            response = self.device_serial.read_all().decode('ascii')
+        else:
+            # returns as soon as the last line arrives, the port timeout only caps the wait
+            response = self._read_lines(line_count).decode('ascii')
         # If nothing is returned, raise a timeout error.
         if not response:
             raise InstrumentException("Communication timed out")
-        return response.rstrip()
+        return response.strip()
 
     @staticmethod
     def warn_no_arguments(command, argument):
@@ -336,6 +368,18 @@ class CryotelAVC(ModifiedGenericInstrument):
         return delim.join(status_list)
 
 
+def start_cooler_objs(cooler_objs, modes=cryocooler_on_mode, setpoints=default_setpoints):
+    responses = []
+    for cryotel, mode, setpoint in zip(cooler_objs, modes, setpoints):
+        if mode.upper().startswith('P') or mode.upper().startswith('T'):
+            responses.append(cryotel.start_cryocooler(mode, setpoint))
+    return responses
+
+
+def stop_cooler_objs(cooler_objs):
+    return [cryotel.stop_cryocooler() for cryotel in cooler_objs]
+
+
 def start_coolers(modes=cryocooler_on_mode, setpoints=default_setpoints):
     for cooler, mode, setpoint in zip(cryocoolers, modes, setpoints):
         if mode.upper().startswith('P') or mode.upper().startswith('T'):
@@ -359,30 +403,181 @@ def get_cooler_log_header(cooler_objs, delim='\t'):
     return delim.join(cooler_headers)+'\n'
 
 
-def log_coolers(coolers=cryocoolers, logfile=None, delim='\t', poll_period=10):
-    cooler_objs = [CryotelAVC(serial_number=sn) for sn in coolers]
-    if logfile is None:
-        logfile = 'coolers_{}.tsv'.format(dt.today().strftime('%Y%m%d'))
-    if not os.path.exists(logfile):
-        cooler_headers = get_cooler_log_header(cooler_objs, delim)
-        cooler_headers = 'datetime' + delim + cooler_headers
-        print(cooler_headers.rstrip())
-        with open(logfile, 'w') as f:
-            f.write(cooler_headers)
-    while True:
-        statuses = get_all_cooler_status_delim(cooler_objs, delim)
-        statuses = dt.utcnow().isoformat() + delim + statuses
-        print(statuses.rstrip())
-        with open(logfile, 'a') as f:
+def log_cooler_objs(cooler_objs, logfile=None, delim='\t', poll_period=10, stop_event=None, lock=None,
+                    flush_period=60, index_interval=60.):
+    """Logs the coolers every poll_period seconds until stop_event is set. The log stays open and is flushed every
+    flush_period seconds; without a logfile a new coolers_YYYYMMDD.tsv is started at UTC midnight. Next to the log,
+    logfile.idx gets the time and byte offset of the first row of every index_interval seconds, the time index read by
+    housekeeping.acquisition.log_index. A cycle that fails is logged and skipped"""
+    if stop_event is None:
+        stop_event = threading.Event()
+    cooler_headers = 'datetime' + delim + get_cooler_log_header(cooler_objs, delim)
+    rotate = logfile is None
+    f = None
+    index = None
+    day = None
+    last_flush = monotonic()
+    try:
+        while not stop_event.is_set():
+            try:
+                if lock is None:
+                    statuses = get_all_cooler_status_delim(cooler_objs, delim)
+                else:
+                    with lock:
+                        statuses = get_all_cooler_status_delim(cooler_objs, delim)
+            except Exception:
+                # e.g. a truncated STATUS reply, the next cycle may well succeed
+                logger.exception('Unable to read the cryocooler statuses')
+                stop_event.wait(poll_period)
+                continue
+            timestamp = dt.utcnow()
+            if f is None or (rotate and timestamp.date() != day):
+                if f is not None:
+                    f.close()
+                    index.close()
+                day = timestamp.date()
+                if rotate:
+                    logfile = 'coolers_{}.tsv'.format(timestamp.strftime('%Y%m%d'))
+                new_file = not os.path.exists(logfile)
+                f = open(logfile, 'a')
+                if new_file:
+                    print(cooler_headers.rstrip())
+                    f.write(cooler_headers)
+                offset = f.tell()
+                new_index = not os.path.exists(logfile + '.idx')
+                index = open(logfile + '.idx', 'a', newline='')
+                if new_index:
+                    index.write('timestamp\toffset\n')
+                last_interval = None
+            statuses = timestamp.isoformat() + delim + statuses
+            print(statuses.rstrip())
+            interval = (timestamp - dt(1970, 1, 1)).total_seconds() // index_interval
+            if interval != last_interval:
+                index.write('{}\t{}\n'.format(timestamp.isoformat(), offset))
+                last_interval = interval
             f.write(statuses)
-        sleep(poll_period)
+            # line endings are translated on the way to the file
+            offset += len(statuses.replace('\n', os.linesep).encode(f.encoding))
+            if monotonic() - last_flush >= flush_period:
+                f.flush()
+                # after the log, so that no entry points past its end
+                index.flush()
+                last_flush = monotonic()
+            stop_event.wait(poll_period)
+    finally:
+        if f is not None:
+            f.close()
+            index.close()
+
+
+def log_coolers(coolers=cryocoolers, logfile=None, delim='\t', poll_period=10, flush_period=60, index_interval=60.):
+    cooler_objs = [CryotelAVC(serial_number=sn) for sn in coolers]
+    log_cooler_objs(cooler_objs, logfile, delim, poll_period, flush_period=flush_period, index_interval=index_interval)
+
+
+class CoolerRequestHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request per line and writes one JSON response per line"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                result = self.server.cooler_daemon.handle_request(json.loads(line))
+                response = {'ok': True, 'result': result}
+            except (InstrumentException, serial.SerialException, ValueError, KeyError) as e:
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write((json.dumps(response) + '\n').encode())
+
+
+class CoolerDaemon:
+    """
+    Keeps the cryocooler connections open, logs them, and serves on/off/status requests from the command line over a
+    unix socket, so switching a cooler doesn't reopen its port or interrupt the logger
+    """
+
+    def __init__(self, coolers=cryocoolers, socket_path=default_socket_path, logfile=None, delim='\t',
+                 poll_period=10):
+        self.coolers = coolers
+        # opened by serve_forever once it holds the socket, so a second daemon never touches the ports
+        self.cooler_objs = []
+        self.socket_path = socket_path
+        self.logfile = logfile
+        self.delim = delim
+        self.poll_period = poll_period
+        self.stop_event = threading.Event()
+        # the logger and the socket clients share the serial ports, one conversation at a time
+        self.lock = threading.Lock()
+
+    def handle_request(self, request):
+        with self.lock:
+            return self._handle_request(request)
+
+    def _handle_request(self, request):
+        command = request['command']
+        if command == 'on':
+            return start_cooler_objs(
+                self.cooler_objs, request.get('modes', cryocooler_on_mode), request.get('setpoints', default_setpoints)
+            )
+        elif command == 'off':
+            return stop_cooler_objs(self.cooler_objs)
+        elif command == 'status':
+            return [cryotel.get_status_dict() for cryotel in self.cooler_objs]
+        raise ValueError('unknown command {}'.format(command))
+
+    def serve_forever(self):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise OSError('unix sockets are not available on this platform')
+        if os.path.exists(self.socket_path):
+            if send_daemon_request({'command': 'status'}, self.socket_path) is not None:
+                raise OSError('a daemon is already listening on {}'.format(self.socket_path))
+            # left behind by a daemon that didn't shut down cleanly
+            os.remove(self.socket_path)
+        # binding fails if another daemon got there first, requests wait in the backlog until the coolers are open
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, CoolerRequestHandler)
+        try:
+            with server:
+                server.cooler_daemon = self
+                self.cooler_objs = [CryotelAVC(serial_number=sn) for sn in self.coolers]
+                logger_thread = threading.Thread(
+                    target=log_cooler_objs,
+                    args=(self.cooler_objs, self.logfile, self.delim, self.poll_period, self.stop_event, self.lock),
+                    daemon=True
+                )
+                logger_thread.start()
+                server.serve_forever()
+        finally:
+            self.stop_event.set()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+def send_daemon_request(request, socket_path=default_socket_path, timeout=30):
+    """
+    Sends a request to a running CoolerDaemon and returns its result, or None if no daemon is listening
+    """
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            client.sendall((json.dumps(request) + '\n').encode())
+            with client.makefile() as f:
+                response = f.readline()
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+    if not response:
+        return None
+    response = json.loads(response)
+    if not response['ok']:
+        raise InstrumentException(response['error'])
+    return response['result']
 
 
 def main():
     parser = argparse.ArgumentParser(description='cryotel-on-off')
     parser.add_argument(
         'command',
-        help='command can be "on", "off" or "log". This will either start the configured cryocoolers or stop all of the cryocoolers'
+        help='command can be "on", "off", "log", "status" or "daemon". This will either start the configured cryocoolers or stop all of the cryocoolers. "daemon" keeps the coolers connected and logged, and "on", "off" and "status" are then sent to it'
     )
     parser.add_argument(
         '-c','--cooler-on-mode', default=','.join(cryocooler_on_mode),
@@ -390,15 +585,38 @@ def main():
     parser.add_argument(
         '-s', '--setpoints', default=','.join(default_setpoints),
         help='setpoints for the cryocoolers joined with a comma (,) in either Watts for power mode, or Kelvin for temperature mode. Default is {}'.format(','.join(default_setpoints)))
+    parser.add_argument(
+        '--socket', default=default_socket_path,
+        help='unix socket the daemon listens on. Default is {}'.format(default_socket_path))
     args = parser.parse_args()
     if args.command == 'on':
         modes = args.cooler_on_mode.split(',')
         setpoints = args.setpoints.split(',')
-        start_coolers(modes, setpoints)
+        responses = send_daemon_request({'command': 'on', 'modes': modes, 'setpoints': setpoints}, args.socket)
+        if responses is None:
+            start_coolers(modes, setpoints)
+        else:
+            print('\n'.join(responses))
     elif args.command == 'off':
-        stop_coolers()
+        responses = send_daemon_request({'command': 'off'}, args.socket)
+        if responses is None:
+            stop_coolers()
+        else:
+            print('\n'.join(responses))
+    elif args.command == 'status':
+        statuses = send_daemon_request({'command': 'status'}, args.socket)
+        if statuses is None:
+            print('no daemon running on {}'.format(args.socket))
+        else:
+            for cooler, status in zip(cryocoolers, statuses):
+                print(cooler, status)
     elif args.command == 'log':
-        log_coolers()
+        if send_daemon_request({'command': 'status'}, args.socket) is not None:
+            print('the daemon on {} is already logging the cryocoolers'.format(args.socket))
+        else:
+            log_coolers()
+    elif args.command == 'daemon':
+        CoolerDaemon(socket_path=args.socket).serve_forever()
     else:
         print('unknown command')
         parser.print_help()
@@ -6,13 +6,16 @@ installation:
 pip install argparse lakeshore
 """
 import serial
-from time import sleep
+from time import sleep, monotonic
 from datetime import datetime as dt
 import os
+import logging
 
 import argparse
 from lakeshore.generic_instrument import InstrumentException, GenericInstrument, comports
 
+logger = logging.getLogger(__name__)
+
 cryocoolers = (
     "FT86J1KYA",
     "FT86J1KYD",
@@ -169,23 +172,44 @@ class CryotelAVC(ModifiedGenericInstrument):
     #     print(_cmd)
     #     self.device_serial.write(_cmd)
 
+    def _read_lines(self, line_count):
+        """Reads line_count terminated lines, the port timeout is a ceiling on the whole read"""
+        timeout = self.device_serial.timeout
+        deadline = monotonic() + timeout
+        response = b''
+        try:
+            for _ in range(line_count):
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self.device_serial.timeout = remaining
+                line = self.device_serial.read_until(self.serial_cmd_termination)
+                response += line
+                if not line.endswith(self.serial_cmd_termination):
+                    break
+        finally:
+            self.device_serial.timeout = timeout
+        return response
+
     def _usb_query(self, query):
         """Query over the serial USB connection"""
         query = query.upper()
+        # drop anything left over from a previous reply, e.g. the \n after its last \r
+        self.device_serial.reset_input_buffer()
         self._usb_command(query)
-        # sleep(1)
-        # response = self.device_serial.read(5)
         _cmd = query.split('=')[0].strip()
-        # response = ''
-        # for l in range(self.command_return_lines[_cmd]):
-        #     response += self.device_serial.read_until(self.serial_cmd_termination).decode('ascii') + '\n'
-        sleep(0.5)
-        response = self.device_serial.read_all().decode('ascii')
-        # print(response)
+        line_count = self.command_return_lines.get(_cmd)
+        if line_count is None:
+            # unknown reply length, give the controller time to answer and take whatever arrived
+            sleep(0.5)
+            response = self.device_serial.read_all().decode('ascii')
+        else:
+            # returns as soon as the last line arrives, the port timeout only caps the wait
+            response = self._read_lines(line_count).decode('ascii')
         # If nothing is returned, raise a timeout error.
         if not response:
             raise InstrumentException("Communication timed out")
-        return response.rstrip()
+        return response.strip()
 
     @staticmethod
     def warn_no_arguments(command, argument):
@@ -349,7 +373,7 @@ class MKS392BRS485(ModifiedGenericInstrument):
                  ip_address=None,
                  tcp_port=7777,
                  connection=None,
-                 serial_cmd_termination='\f',
+                 serial_cmd_termination=';FF',
                  address=253):
         super(MKS392BRS485, self).__init__(
             serial_number=serial_number,
@@ -370,9 +394,9 @@ class MKS392BRS485(ModifiedGenericInstrument):
 
     def _usb_command(self, command):
         """Send a command over the serial USB connection"""
+        # frames are @<address><command>;FF, where FF are the two characters rather than a form feed
         prefix = '@{}'.format(self.address).encode()
-        suffix = ';'.encode()
-        self.device_serial.write(prefix + command.encode() + suffix + self.serial_cmd_termination)
+        self.device_serial.write(prefix + command.encode() + self.serial_cmd_termination)
 
     def _usb_query(self, query):
         """Query over the serial USB connection."""
@@ -415,24 +439,68 @@ def get_cooler_log_header(cooler_objs, delim='\t'):
     return delim.join(cooler_headers)+'\n'
 
 
-def log_coolers(coolers=cryocoolers, gauge=pressure_gauge, logfile=None, delim='\t', poll_period=10):
+def log_coolers(coolers=cryocoolers, gauge=pressure_gauge, logfile=None, delim='\t', poll_period=10,
+                flush_period=60, index_interval=60.):
+    """Logs the coolers and the pressure every poll_period seconds. The log stays open and is flushed every
+    flush_period seconds; without a logfile a new coolers_YYYYMMDD.tsv is started at UTC midnight. Next to the log,
+    logfile.idx gets the time and byte offset of the first row of every index_interval seconds, the time index read by
+    housekeeping.acquisition.log_index. A cycle that fails is logged and skipped"""
     cooler_objs = [CryotelAVC(serial_number=sn) for sn in coolers]
     gauge_obj = MKS392BRS485(serial_number=gauge)
-    if logfile is None:
-        logfile = 'coolers_{}.tsv'.format(dt.today().strftime('%Y%m%d'))
-    if not os.path.exists(logfile):
-        cooler_headers = get_cooler_log_header(cooler_objs, delim)
-        cooler_headers = 'datetime' + delim + 'pressure' + delim + cooler_headers
-        print(cooler_headers.rstrip())
-        with open(logfile, 'w') as f:
-            f.write(cooler_headers)
-    while True:
-        statuses = get_all_cooler_status_delim(cooler_objs, gauge_obj, delim)
-        statuses = dt.utcnow().isoformat() + delim + statuses
-        print(statuses.rstrip())
-        with open(logfile, 'a') as f:
+    cooler_headers = get_cooler_log_header(cooler_objs, delim)
+    cooler_headers = 'datetime' + delim + 'pressure' + delim + cooler_headers
+    rotate = logfile is None
+    f = None
+    index = None
+    day = None
+    last_flush = monotonic()
+    try:
+        while True:
+            try:
+                statuses = get_all_cooler_status_delim(cooler_objs, gauge_obj, delim)
+            except Exception:
+                # e.g. a truncated STATUS reply, the next cycle may well succeed
+                logger.exception('Unable to read the cryocooler statuses or the pressure')
+                sleep(poll_period)
+                continue
+            timestamp = dt.utcnow()
+            if f is None or (rotate and timestamp.date() != day):
+                if f is not None:
+                    f.close()
+                    index.close()
+                day = timestamp.date()
+                if rotate:
+                    logfile = 'coolers_{}.tsv'.format(timestamp.strftime('%Y%m%d'))
+                new_file = not os.path.exists(logfile)
+                f = open(logfile, 'a')
+                if new_file:
+                    print(cooler_headers.rstrip())
+                    f.write(cooler_headers)
+                offset = f.tell()
+                new_index = not os.path.exists(logfile + '.idx')
+                index = open(logfile + '.idx', 'a', newline='')
+                if new_index:
+                    index.write('timestamp\toffset\n')
+                last_interval = None
+            statuses = timestamp.isoformat() + delim + statuses
+            print(statuses.rstrip())
+            interval = (timestamp - dt(1970, 1, 1)).total_seconds() // index_interval
+            if interval != last_interval:
+                index.write('{}\t{}\n'.format(timestamp.isoformat(), offset))
+                last_interval = interval
             f.write(statuses)
-        sleep(poll_period)
+            # line endings are translated on the way to the file
+            offset += len(statuses.replace('\n', os.linesep).encode(f.encoding))
+            if monotonic() - last_flush >= flush_period:
+                f.flush()
+                # after the log, so that no entry points past its end
+                index.flush()
+                last_flush = monotonic()
+            sleep(poll_period)
+    finally:
+        if f is not None:
+            f.close()
+            index.close()
 
 
 def main():
@@ -0,0 +1,239 @@
+"""
+Threshold monitoring handed to the instruments' own alarms and relays.
+
+Instead of polling every channel fast enough to catch a threshold crossing, the thresholds are written into the
+hardware alarms of the Lake Shore instruments, which check them at every reading and switch their relays without the
+host. The host then only polls one consolidated alarm and relay status per instrument, at whatever rate it needs.
+
+The thresholds live in a JSON file keyed by the device names the fleet gives each devices.json entry:
+
+    {
+      "TemperatureMonitor_Model218_0": {
+        "alarms": {
+          "1": {"high": 320, "low": 3, "deadband": 1, "latch": true},
+          "2": {"source": "sensor", "high": 1.6, "low": 0.1},
+          "3": {"enabled": false}
+        },
+        "relays": {
+          "1": {"input": "1", "trigger": "both"},
+          "2": {"mode": "off"}
+        }
+      }
+    }
+
+Alarm sources are kelvin (default), celsius, sensor or linear. The deadband defaults to 0 and latch to false; a
+latched alarm stays on until reset_alarm_status. Relays with an input are switched by its alarms, triggered by low,
+high or both (default); otherwise mode is on or off. Inputs and relays that aren't listed are left as they are.
+
+    config = load_alarm_config('alarms.json')
+    apply_alarm_config(devices, config)
+    with Poller(devices, read_function=Poller.read_alarm_log_dict) as poller:
+        poller.run(poll_period=30, callback=print_snapshot)
+"""
+import json
+import logging
+import math
+import sys
+
+import serial
+from lakeshore.generic_instrument import InstrumentException
+
+from housekeeping.acquisition.poller import Poller, Fleet, print_snapshot, print_report
+from housekeeping.instruments.temperature.base_lakeshore import (
+    AlarmParameters, InputSensorUnits, RelayControlMode, RelayControlAlarm
+)
+
+logger = logging.getLogger(__name__)
+
+alarm_sources = {
+    'kelvin': InputSensorUnits.KELVIN,
+    'celsius': InputSensorUnits.CELSIUS,
+    'sensor': InputSensorUnits.SENSOR,
+    'linear': InputSensorUnits.LINEAR_EQUATION,
+}
+relay_modes = {
+    'off': RelayControlMode.OFF,
+    'on': RelayControlMode.ON,
+    'alarms': RelayControlMode.ALARMS,
+}
+relay_triggers = {
+    'low': RelayControlAlarm.LOW_ALARM,
+    'high': RelayControlAlarm.HIGH_ALARM,
+    'both': RelayControlAlarm.BOTH_ALARMS,
+}
+
+
+def has_hardware_alarms(device):
+    return hasattr(device, 'get_alarm_summary')
+
+
+def parse_alarm(settings):
+    """Returns the AlarmParameters of one input's alarm settings, None for a disabled alarm"""
+    if not settings.get('enabled', True):
+        return None
+    return AlarmParameters(
+        alarm_sources[settings.get('source', 'kelvin').lower()], float(settings['high']), float(settings['low']),
+        float(settings.get('deadband', 0.)), bool(settings.get('latch', False)), settings.get('audible'),
+        settings.get('visible')
+    )
+
+
+def parse_relay(settings):
+    """Returns the set_relay_control_parameters arguments of one relay's settings, after the relay number"""
+    activating_input_channel = settings.get('input')
+    mode = settings.get('mode', 'off' if activating_input_channel is None else 'alarms')
+    mode = relay_modes[mode.lower()]
+    if mode == RelayControlMode.ALARMS and activating_input_channel is None:
+        raise ValueError('A relay switched by alarms needs an input')
+    return {
+        'mode': mode,
+        'activating_input_channel': None if activating_input_channel is None else str(activating_input_channel),
+        'alarm_relay_trigger_type': relay_triggers[settings.get('trigger', 'both').lower()],
+    }
+
+
+def parse_alarm_config(config):
+    """Converts a loaded JSON alarm configuration
+
+        Returns:
+            (dict):
+                {device_name: {'alarms': {input_channel: AlarmParameters or None}, 'relays': {relay_number: dict}}}
+    """
+    parsed = {}
+    for device_name, device_config in config.items():
+        try:
+            parsed[device_name] = {
+                'alarms': {str(input_channel): parse_alarm(settings)
+                           for input_channel, settings in device_config.get('alarms', {}).items()},
+                'relays': {int(relay_number): parse_relay(settings)
+                           for relay_number, settings in device_config.get('relays', {}).items()},
+            }
+        except (KeyError, ValueError, AttributeError) as e:
+            raise ValueError('Invalid alarm configuration of {}: {!r}'.format(device_name, e))
+    return parsed
+
+
+def load_alarm_config(path):
+    with open(path) as f:
+        return parse_alarm_config(json.load(f))
+
+
+def _alarm_differences(input_channel, alarm_settings, read_back):
+    if alarm_settings is None:
+        return [] if not read_back['alarm_enable'] else ['input {} alarm is enabled'.format(input_channel)]
+    if not read_back['alarm_enable']:
+        return ['input {} alarm is disabled'.format(input_channel)]
+    differences = []
+    for name in ('source', 'high_value', 'low_value', 'deadband', 'latch_enable'):
+        expected = getattr(alarm_settings, name)
+        actual = getattr(read_back['alarm_settings'], name)
+        # the instruments round to their display resolution
+        if not math.isclose(float(expected), float(actual), rel_tol=1e-5, abs_tol=1e-3):
+            differences.append('input {} alarm {} is {}, not {}'.format(input_channel, name, actual, expected))
+    return differences
+
+
+def _relay_differences(relay_number, relay_settings, read_back):
+    differences = []
+    names = ['mode']
+    if relay_settings['mode'] == RelayControlMode.ALARMS:
+        names += ['activating_input_channel', 'alarm_relay_trigger_type']
+    for name in names:
+        expected = relay_settings[name]
+        actual = read_back[name]
+        if str(expected).upper() != str(actual).upper():
+            differences.append('relay {} {} is {}, not {}'.format(relay_number, name, actual, expected))
+    return differences
+
+
+def configure_device(device, device_config, verify=True, reset_latched=False):
+    """Writes one instrument's alarms and relays, in one batch
+
+        Args:
+            device (Model218Model331Overlap):
+                connected instrument
+            device_config (dict):
+                see parse_alarm_config
+            verify (bool):
+                read the settings back
+            reset_latched (bool):
+                clear alarms latched under the previous thresholds
+
+        Returns:
+            (list):
+                descriptions of the settings that didn't read back as written
+    """
+    alarms = device_config['alarms']
+    relays = device_config['relays']
+    with device.batch() as batch:
+        for input_channel, alarm_settings in alarms.items():
+            batch.add(device.set_alarm_parameters, input_channel, alarm_settings is not None, alarm_settings)
+        # relays after the alarms that switch them
+        for relay_number, relay_settings in relays.items():
+            batch.add(device.set_relay_control_parameters, relay_number, **relay_settings)
+        if reset_latched:
+            batch.add(device.reset_alarm_status)
+    if not verify:
+        return []
+    with device.batch() as batch:
+        alarm_read_backs = [batch.add(device.get_alarm_parameters, input_channel) for input_channel in alarms]
+        relay_read_backs = [batch.add(device.get_relay_control_parameters, relay_number) for relay_number in relays]
+    differences = []
+    for (input_channel, alarm_settings), read_back in zip(alarms.items(), alarm_read_backs):
+        differences += _alarm_differences(input_channel, alarm_settings, read_back.value)
+    for (relay_number, relay_settings), read_back in zip(relays.items(), relay_read_backs):
+        differences += _relay_differences(relay_number, relay_settings, read_back.value)
+    return differences
+
+
+def apply_alarm_config(devices, config, verify=True, reset_latched=False):
+    """Writes the alarms and relays of every configured instrument in devices, the others are skipped
+
+        Args:
+            devices (dict):
+                {device_name: instrument}
+            config (dict):
+                see parse_alarm_config
+            verify (bool):
+                read the settings back
+            reset_latched (bool):
+                clear alarms latched under the previous thresholds
+
+        Returns:
+            (dict):
+                {device_name: error or list of settings that didn't read back as written} for each configured device
+                that wasn't configured as asked, empty when everything was
+    """
+    problems = {}
+    for device_name, device_config in config.items():
+        device = devices.get(device_name)
+        if device is None:
+            continue
+        if not has_hardware_alarms(device):
+            problems[device_name] = 'no hardware alarms'
+            logger.warning('%s has no hardware alarms, its alarm configuration is ignored', device_name)
+            continue
+        try:
+            differences = configure_device(device, device_config, verify, reset_latched)
+        except (InstrumentException, serial.SerialException, ValueError) as e:
+            problems[device_name] = str(e)
+            logger.warning('Unable to configure the alarms of %s: %s', device_name, e)
+            continue
+        if differences:
+            problems[device_name] = differences
+            logger.warning('Alarms of %s differ from the configuration: %s', device_name, '; '.join(differences))
+    return problems
+
+
+if __name__ == '__main__':
+    alarm_config = load_alarm_config(sys.argv[1])
+    with Poller({}, read_function=Poller.read_alarm_log_dict) as poller:
+        def add_device(device_name, device):
+            apply_alarm_config({device_name: device}, alarm_config)
+            poller.add_device(device_name, device)
+
+        with Fleet(on_ready=add_device) as fleet:
+            fleet.start()
+            fleet.wait(timeout=10)
+            print_report(fleet.report())
+            poller.run(poll_period=30, callback=print_snapshot)
@@ -0,0 +1,356 @@
+"""
+Columnar archive of the housekeeping logs in Parquet files.
+
+Every channel is a float64 column next to an int64 timestamp column in nanoseconds since the epoch (UTC), so loading
+doesn't parse any text. Hours are written as they end, each to its own file, and once a UTC day is over its hours are
+compacted into one file for the day with a row group per hour:
+
+    archive/2021-06-01.parquet
+    archive/2021-06-02/00.parquet
+    archive/2021-06-02/01.parquet
+
+Readers load only the channels they ask for and skip the files outside the requested time range by name and the row
+groups inside them by their statistics:
+
+    with ArchiveWriter('archive') as archive, Poller(devices) as poller:
+        poller.run(poll_period=5, callback=archive.write_snapshot)
+
+    data = read_archive('archive', ['Pressure_Lesker392_0_Lesker392_pressure_mBar'], start, end)
+
+Reading costs a fraction of a millisecond per row group, so a month of one channel at hourly row groups takes a few
+hundred milliseconds and half an hour of it a few. Archives mostly read a month at a time can be compacted with a row
+group per day instead (row_group_hours=24).
+
+The hour in progress is only in memory, so keep the TSV log (LogWriter) as the record of it. Existing TSV logs are
+added with archive_tsv:
+
+    python -m housekeeping.acquisition.archive archive 2021-06-01.tsv 2021-06-02.tsv
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+timestamp_column = 'timestamp'
+day_format = '%Y-%m-%d'
+
+
+def to_epoch_ns(timestamps):
+    """Converts naive UTC datetimes to int64 nanoseconds since the epoch"""
+    return np.asarray(timestamps, dtype='datetime64[ns]').astype(np.int64)
+
+
+def to_float(value):
+    """Channels are float64, values that aren't numbers are stored as NaN"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def hour_path(directory, hour, part=0):
+    file_name = '{:02d}.parquet'.format(hour.hour) if not part else '{:02d}_{}.parquet'.format(hour.hour, part)
+    return os.path.join(directory, hour.strftime(day_format), file_name)
+
+
+def day_path(directory, day):
+    return os.path.join(directory, day.strftime(day_format) + '.parquet')
+
+
+def _read_table(paths, channels=None, condition=None):
+    """Reads Parquet files into one table of the timestamp and the channels, all channels if None"""
+    if channels is None:
+        schema = pa.unify_schemas([pq.read_schema(path) for path in paths])
+        channels = [name for name in schema.names if name != timestamp_column]
+    # every channel is float64, the schema is known without reading the file footers
+    schema = pa.schema([(timestamp_column, pa.int64())] + [(channel, pa.float64()) for channel in channels])
+    return ds.dataset(paths, schema=schema, format='parquet').to_table(columns=schema.names, filter=condition)
+
+
+def write_hour(directory, hour, timestamps, columns, compression='zstd'):
+    """Writes one hour of rows as a single row group
+
+        Args:
+            directory (str):
+                archive directory
+            hour (datetime):
+                start of the hour, UTC
+            timestamps (array_like):
+                int64 nanoseconds since the epoch
+            columns (dict):
+                {channel: float64 values}
+
+        Returns:
+            (str):
+                path of the file, a numbered part if the hour was already archived
+    """
+    order = np.argsort(timestamps, kind='stable')
+    arrays = [pa.array(np.asarray(timestamps, dtype=np.int64)[order])]
+    arrays += [pa.array(np.asarray(values, dtype=np.float64)[order]) for values in columns.values()]
+    table = pa.Table.from_arrays(arrays, names=[timestamp_column] + list(columns))
+    part = 0
+    while os.path.exists(hour_path(directory, hour, part)):
+        part += 1
+    path = hour_path(directory, hour, part)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # readers never see a half written file
+    temporary_path = path + '.tmp'
+    pq.write_table(table, temporary_path, row_group_size=max(len(table), 1), compression=compression)
+    os.replace(temporary_path, path)
+    return path
+
+
+def compact_day(directory, day, row_group_hours=1, compression='zstd'):
+    """Merges the hour files of a day, and the day's file if it has one already, into the day's file
+
+        Args:
+            directory (str):
+                archive directory
+            day (datetime or date):
+                UTC day
+            row_group_hours (int):
+                hours per row group
+
+        Returns:
+            (str):
+                path of the day's file, None if the day had no hour files
+    """
+    hour_directory = os.path.join(directory, day.strftime(day_format))
+    if not os.path.isdir(hour_directory):
+        return None
+    hour_files = [os.path.join(hour_directory, file_name) for file_name in sorted(os.listdir(hour_directory))
+                  if file_name.endswith('.parquet')]
+    path = day_path(directory, day)
+    paths = ([path] if os.path.exists(path) else []) + hour_files
+    if paths:
+        table = _read_table(paths)
+        table = table.take(pa.array(np.argsort(table[timestamp_column].to_numpy(), kind='stable')))
+        row_groups = table[timestamp_column].to_numpy() // (row_group_hours * 3600 * 10 ** 9)
+        boundaries = np.flatnonzero(np.diff(row_groups)) + 1
+        temporary_path = path + '.tmp'
+        with pq.ParquetWriter(temporary_path, table.schema, compression=compression) as writer:
+            for start, stop in zip(np.r_[0, boundaries], np.r_[boundaries, len(table)]):
+                writer.write_table(table.slice(start, stop - start), row_group_size=max(stop - start, 1))
+        os.replace(temporary_path, path)
+    for hour_file in hour_files:
+        os.remove(hour_file)
+    try:
+        os.rmdir(hour_directory)
+    except OSError:
+        # something else was left in it
+        pass
+    return path
+
+
+def compact_archive(directory, before=None, row_group_hours=1, compression='zstd'):
+    """Compacts every day before the given UTC day that still has hour files, defaults to all days before today
+
+        Returns:
+            (list):
+                paths of the day files written
+    """
+    if before is None:
+        before = datetime.utcnow()
+    before = before.strftime(day_format)
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        if name >= before or not os.path.isdir(os.path.join(directory, name)):
+            continue
+        try:
+            day = datetime.strptime(name, day_format)
+        except ValueError:
+            continue
+        paths.append(compact_day(directory, day, row_group_hours, compression))
+    return paths
+
+
+class ArchiveWriter:
+    """Collects rows and writes them to the archive an hour at a time"""
+
+    def __init__(self, directory, compression='zstd', compact=True, row_group_hours=1):
+        """
+        Parameters
+        ----------
+        directory : str
+            archive directory
+        compression : str
+            Parquet compression codec
+        compact : bool
+            compact each day into one file once the first row of the next day arrives
+        row_group_hours : int
+            hours per row group of the compacted days
+        """
+        self.directory = directory
+        self.compression = compression
+        self.compact = compact
+        self.row_group_hours = row_group_hours
+        # start of the buffered hour
+        self.hour = None
+        self.timestamps = []
+        # {channel: values}, NaN where a row didn't have the channel
+        self.columns = {}
+
+    def write(self, row, timestamp=None):
+        """Adds a row
+
+            Args:
+                row (dict):
+                    {channel: value}
+                timestamp (datetime):
+                    UTC time of the row, defaults to now
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+        if self.hour is not None and hour != self.hour:
+            self.flush()
+            if self.compact and hour.date() != self.hour.date():
+                compact_day(self.directory, self.hour, self.row_group_hours, self.compression)
+        self.hour = hour
+        row_count = len(self.timestamps)
+        for channel, value in row.items():
+            values = self.columns.get(channel)
+            if values is None:
+                values = self.columns[channel] = [np.nan] * row_count
+            values.append(to_float(value))
+        for values in self.columns.values():
+            if len(values) == row_count:
+                values.append(np.nan)
+        self.timestamps.append(timestamp)
+
+    def write_snapshot(self, snapshot):
+        """Poller callback that archives every channel of a Snapshot"""
+        self.write(snapshot.flatten(), snapshot.timestamp)
+
+    def flush(self):
+        """Writes the buffered rows, returns the path of the file or None if there was nothing to write"""
+        if not self.timestamps:
+            return None
+        path = write_hour(self.directory, self.hour, to_epoch_ns(self.timestamps), self.columns, self.compression)
+        self.timestamps = []
+        self.columns = {}
+        return path
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def archive_files(directory, start=None, end=None):
+    """Returns the archive files that can hold rows between start and end (UTC datetimes, None for open ended)"""
+    paths = []
+    if not os.path.isdir(directory):
+        return paths
+    for name in sorted(os.listdir(directory)):
+        try:
+            day = datetime.strptime(name.replace('.parquet', ''), day_format)
+        except ValueError:
+            continue
+        if (start is not None and day + timedelta(days=1) <= start) or (end is not None and day > end):
+            continue
+        if name.endswith('.parquet'):
+            paths.append(os.path.join(directory, name))
+            continue
+        for file_name in sorted(os.listdir(os.path.join(directory, name))):
+            if not file_name.endswith('.parquet'):
+                continue
+            hour = day + timedelta(hours=int(file_name[:2]))
+            if (start is not None and hour + timedelta(hours=1) <= start) or (end is not None and hour > end):
+                continue
+            paths.append(os.path.join(directory, name, file_name))
+    return paths
+
+
+def read_archive(directory, channels=None, start=None, end=None):
+    """Loads channels of the archive between two times
+
+        Args:
+            directory (str):
+                archive directory
+            channels (list):
+                channels to load, all of them if None
+            start (datetime):
+                first UTC time to include, None for the beginning of the archive
+            end (datetime):
+                last UTC time to include, None for the end of the archive
+
+        Returns:
+            (pandas.DataFrame):
+                timestamp column of datetime64[ns] followed by the channels in time order, NaN where a channel wasn't
+                logged
+    """
+    paths = archive_files(directory, start, end)
+    if not paths:
+        columns = {timestamp_column: pd.Series(dtype='datetime64[ns]')}
+        columns.update((channel, pd.Series(dtype='float64')) for channel in channels or ())
+        return pd.DataFrame(columns)
+    condition = None
+    if start is not None:
+        condition = ds.field(timestamp_column) >= int(to_epoch_ns([start])[0])
+    if end is not None:
+        end_condition = ds.field(timestamp_column) <= int(to_epoch_ns([end])[0])
+        condition = end_condition if condition is None else condition & end_condition
+    data = _read_table(paths, channels, condition).to_pandas()
+    data[timestamp_column] = pd.to_datetime(data[timestamp_column], unit='ns')
+    if data[timestamp_column].is_monotonic_increasing:
+        return data
+    return data.sort_values(timestamp_column, kind='stable').reset_index(drop=True)
+
+
+def archive_columns(directory, timestamps, columns, row_group_hours=1, compression='zstd'):
+    """Adds rows to the archive and compacts the days they cover
+
+        Args:
+            directory (str):
+                archive directory
+            timestamps (pandas.Series):
+                datetime64 UTC times of the rows
+            columns (dict):
+                {channel: float64 values}
+
+        Returns:
+            (list):
+                paths of the day files written
+    """
+    hours = timestamps.dt.floor('h')
+    timestamps = timestamps.to_numpy()
+    days = set()
+    for hour, rows in hours.groupby(hours).indices.items():
+        hour = pd.Timestamp(hour).to_pydatetime()
+        write_hour(
+            directory, hour, to_epoch_ns(timestamps[rows]),
+            {channel: values[rows] for channel, values in columns.items()}, compression
+        )
+        days.add(hour.date())
+    return [compact_day(directory, day, row_group_hours, compression) for day in sorted(days)]
+
+
+def archive_tsv(path, directory, row_group_hours=1, compression='zstd'):
+    """Adds a TSV log to the archive and compacts the days it covers, its timestamps are taken as UTC
+
+        Returns:
+            (list):
+                paths of the day files written
+    """
+    data = pd.read_csv(path, delimiter='\t')
+    # the first column holds the timestamps, 'timestamp' or 'datetime' depending on the logger
+    timestamps = pd.to_datetime(data.pop(data.columns[0]))
+    columns = {channel: pd.to_numeric(data[channel], errors='coerce').to_numpy(dtype=np.float64)
+               for channel in data.columns}
+    return archive_columns(directory, timestamps, columns, row_group_hours, compression)
+
+
+if __name__ == '__main__':
+    for tsv_path in sys.argv[2:]:
+        for archive_path in archive_tsv(tsv_path, sys.argv[1]):
+            print(archive_path)
@@ -0,0 +1,270 @@
+"""
+Acquisition benchmarks against the simulated instruments.
+
+Times individual driver calls (p50/p99 latency, calls per second, bytes on the wire) and the poll cycle of a whole
+devices.json fleet read one device after another versus by the Poller. Results are written as JSON so runs can be
+compared from release to release:
+
+    python -m housekeeping.acquisition.benchmark --output bench.json
+    python -m housekeeping.acquisition.benchmark --compare bench.json
+
+The second form exits with status 1 when a p50 latency or cycle time got slower than the tolerance allows.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+import serial
+from lakeshore.generic_instrument import InstrumentException
+
+from housekeeping.acquisition.poller import Poller
+from housekeeping.instruments.motors.motor_serial import LinearStageMotorCom
+from housekeeping.instruments.simulated import (
+    build_simulated_devices, close_simulators, default_devices_file, get_simulator_class, simulated_connection
+)
+from housekeeping.instruments.utils import (
+    Model218, Model325, Model331, CryotelAVC, Lesker392, MKS392BRS485, PfeifferDualGauge
+)
+
+
+class BenchmarkCase:
+    """One driver call to time"""
+
+    def __init__(self, device_class, method, args=(), iterations=None, simulator_kwargs=None):
+        """
+        Parameters
+        ----------
+        device_class : class
+            driver class
+        method : str
+            name of the driver method to call
+        args : tuple
+            arguments of the call
+        iterations : int
+            overrides the number of calls, for slow methods
+        simulator_kwargs : dict
+            passed to the simulator
+        """
+        self.device_class = device_class
+        self.method = method
+        self.args = args
+        self.iterations = iterations
+        self.simulator_kwargs = simulator_kwargs or {}
+
+    @property
+    def name(self):
+        return '{}.{}'.format(self.device_class.__name__, self.method)
+
+
+default_cases = [
+    BenchmarkCase(Model218, 'get_kelvin_reading_all'),
+    BenchmarkCase(Model218, 'get_kelvin_reading', (1,)),
+    BenchmarkCase(Model331, 'get_kelvin_reading', ('A',)),
+    BenchmarkCase(Model331, 'get_control_snapshot', (1,)),
+    BenchmarkCase(Model325, 'get_setpoint', (1,)),
+    BenchmarkCase(CryotelAVC, 'get_status_dict'),
+    BenchmarkCase(Lesker392, 'get_pressure'),
+    BenchmarkCase(MKS392BRS485, 'get_pressure'),
+    BenchmarkCase(PfeifferDualGauge, 'get_pressure'),
+    # moves always include the driver's 1 s settling sleep, the motion itself is sped up
+    BenchmarkCase(LinearStageMotorCom, 'move', (0, 100), iterations=3, simulator_kwargs={'time_scale': 0.01}),
+]
+
+# SeeedSTH01 doesn't speak the sensor's Modbus protocol yet, every read would only measure its timeout
+default_excluded_types = ('HumiditySensor',)
+
+
+def latency_summary(latencies):
+    """Returns latency percentiles in milliseconds"""
+    latencies = np.asarray(latencies) * 1e3
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_ms': float(np.mean(latencies)),
+        'max_ms': float(np.max(latencies)),
+    }
+
+
+def run_case(case, iterations=50, latency=None, baud_rate=None, pty=False):
+    """Calls a driver method repeatedly against a fresh simulated instrument
+
+        Returns:
+            (dict):
+                latency percentiles, calls per second and bytes per call in each direction
+    """
+    device = get_simulator_class(case.device_class)(latency=latency, **case.simulator_kwargs)
+    instrument = case.device_class(connection=simulated_connection(device, baud_rate, pty=pty))
+    method = getattr(instrument, case.method)
+    if case.iterations is not None:
+        iterations = case.iterations
+    latencies = []
+    errors = 0
+    # some drivers print every response, keep that out of the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        method(*case.args)
+        bytes_received, bytes_sent = device.bytes_received, device.bytes_sent
+        start = perf_counter()
+        for _ in range(iterations):
+            call_start = perf_counter()
+            try:
+                method(*case.args)
+            except (InstrumentException, serial.SerialException, ValueError):
+                errors += 1
+            latencies.append(perf_counter() - call_start)
+        elapsed = perf_counter() - start
+    result = {
+        'name': case.name,
+        'iterations': iterations,
+        'errors': errors,
+        'queries_per_second': iterations / elapsed,
+        'bytes_written_per_call': (device.bytes_received - bytes_received) / iterations,
+        'bytes_read_per_call': (device.bytes_sent - bytes_sent) / iterations,
+    }
+    result.update(latency_summary(latencies))
+    return result
+
+
+def run_fleet(devices_file=default_devices_file, cycles=5, latency=None, baud_rate=None, pty=False,
+              excluded_types=default_excluded_types):
+    """Times full poll cycles of a simulated fleet, reading the devices one after another and then with the Poller
+
+        Returns:
+            (dict):
+                cycle time percentiles of both modes and the speedup of concurrent polling
+    """
+    devices = build_simulated_devices(devices_file, latency, baud_rate, pty=pty)
+    devices = {name: device for name, device in devices.items() if not name.startswith(tuple(excluded_types))}
+    sequential = []
+    concurrent = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(cycles):
+            start = perf_counter()
+            for device in devices.values():
+                Poller.read_log_dict(device)
+            sequential.append(perf_counter() - start)
+        with Poller(devices) as poller:
+            for _ in range(cycles):
+                concurrent.append(poller.poll().cycle_time)
+    sequential_summary = latency_summary(sequential)
+    concurrent_summary = latency_summary(concurrent)
+    return {
+        'devices': len(devices),
+        'cycles': cycles,
+        'sequential': sequential_summary,
+        'concurrent': concurrent_summary,
+        'speedup': sequential_summary['p50_ms'] / concurrent_summary['p50_ms'],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, universal_newlines=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(cases=None, iterations=50, cycles=5, latency=None, baud_rate=None, pty=False,
+                   devices_file=default_devices_file):
+    """Runs every case and the fleet benchmark
+
+        Returns:
+            (dict):
+                JSON serializable results, with the settings and environment they were measured with
+    """
+    if cases is None:
+        cases = default_cases
+    try:
+        results = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': {
+                'iterations': iterations,
+                'cycles': cycles,
+                'latency': latency,
+                'baud_rate': baud_rate,
+                'transport': 'pty' if pty else 'memory',
+            },
+            'drivers': [run_case(case, iterations, latency, baud_rate, pty) for case in cases],
+            'fleet': run_fleet(devices_file, cycles, latency, baud_rate, pty),
+        }
+    finally:
+        close_simulators()
+    return results
+
+
+def compare_results(previous, current, tolerance=0.2):
+    """Lists the p50 latencies and cycle times that got slower by more than the tolerance
+
+        Args:
+            previous (dict):
+                results of an earlier run_benchmarks
+            current (dict):
+                results of this run
+            tolerance (float):
+                allowed relative slowdown
+
+        Returns:
+            (list):
+                (name, previous p50 ms, current p50 ms) for each regression
+    """
+    regressions = []
+    previous_drivers = {result['name']: result for result in previous['drivers']}
+    for result in current['drivers']:
+        before = previous_drivers.get(result['name'])
+        if before is not None and result['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+            regressions.append((result['name'], before['p50_ms'], result['p50_ms']))
+    for mode in ('sequential', 'concurrent'):
+        before = previous['fleet'][mode]['p50_ms']
+        after = current['fleet'][mode]['p50_ms']
+        if after > before * (1 + tolerance):
+            regressions.append(('fleet {}'.format(mode), before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the drivers and the poller against simulated instruments')
+    parser.add_argument('-n', '--iterations', type=int, default=50, help='calls per driver method')
+    parser.add_argument('-c', '--cycles', type=int, default=5, help='fleet poll cycles per mode')
+    parser.add_argument('-l', '--latency', type=float, default=None,
+                        help='instrument response latency in seconds, defaults to each simulator\'s own')
+    parser.add_argument('-b', '--baud-rate', type=int, default=None,
+                        help='line speed, defaults to each instrument\'s own')
+    parser.add_argument('--pty', action='store_true', help='serve the simulators on pseudo terminals')
+    parser.add_argument('--devices-file', default=default_devices_file)
+    parser.add_argument('-o', '--output', help='write the results to this JSON file instead of stdout')
+    parser.add_argument('--compare', help='JSON results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown for --compare')
+    args = parser.parse_args()
+    results = run_benchmarks(
+        iterations=args.iterations, cycles=args.cycles, latency=args.latency, baud_rate=args.baud_rate,
+        pty=args.pty, devices_file=args.devices_file
+    )
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        regressions = compare_results(previous, results, args.tolerance)
+        for name, before, after in regressions:
+            sys.stderr.write('{}: p50 {:.2f} ms -> {:.2f} ms\n'.format(name, before, after))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
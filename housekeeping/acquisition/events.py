@@ -0,0 +1,102 @@
+"""
+Event-driven acquisition: the Lake Shore instruments are read when they have a new reading instead of on a fixed
+timer.
+
+Every check reads the status byte (*STB?, a few bytes) and only fetches the readings when its new reading bit is set,
+so the log follows the instrument's own update cadence and most checks cost a fraction of a full read. Over serial
+the bit stays set until *CLS, which is sent before each fetch. Instruments without a status byte are read on a timer as
+before:
+
+    reader = NewReadingReader(fallback_period=5)
+    enable_new_reading_requests(devices)
+    with Poller(devices, read_function=reader) as poller:
+        poller.run(poll_period=0.25, callback=print_snapshot)
+
+Snapshots then only hold the devices that had something new.
+"""
+import logging
+from threading import Lock
+from time import monotonic
+
+import serial
+from lakeshore.generic_instrument import InstrumentException
+
+from housekeeping.acquisition.poller import Poller, Fleet, print_snapshot, print_report
+
+logger = logging.getLogger(__name__)
+
+
+def has_status_byte(device):
+    return hasattr(device, 'new_reading_available')
+
+
+def enable_new_reading_requests(devices):
+    """Sets the service request enable mask of every Lake Shore instrument to the new reading bit
+
+        Args:
+            devices (dict):
+                {device_name: instrument}, other instruments are skipped
+    """
+    for device_name, device in devices.items():
+        if not has_status_byte(device):
+            continue
+        try:
+            device.enable_new_reading_request()
+        except (InstrumentException, serial.SerialException, ValueError) as e:
+            logger.warning('Unable to enable new reading requests on %s: %s', device_name, e)
+
+
+class NewReadingReader:
+    """Poller read function that returns None until a device has a new reading"""
+
+    def __init__(self, read_function=None, fallback_period=5.):
+        """
+        Parameters
+        ----------
+        read_function : callable
+            reads a device once it has something new, defaults to Poller.read_log_dict
+        fallback_period : float
+            seconds between reads of instruments without a status byte
+        """
+        if read_function is None:
+            read_function = Poller.read_log_dict
+        self.read_function = read_function
+        self.fallback_period = fallback_period
+        # {id(device): monotonic time of the last timed read}, the poller calls from one thread per port
+        self.last_read = {}
+        self.lock = Lock()
+        # status byte checks and the reads they led to, to see how much traffic the events save
+        self.checks = 0
+        self.reads = 0
+
+    def __call__(self, device):
+        if has_status_byte(device):
+            new_reading = device.new_reading_available()
+            with self.lock:
+                self.checks += 1
+                if new_reading:
+                    self.reads += 1
+            if not new_reading:
+                return None
+            device.clear_new_reading()
+            return self.read_function(device)
+        now = monotonic()
+        with self.lock:
+            last_read = self.last_read.get(id(device))
+            if last_read is not None and now - last_read < self.fallback_period:
+                return None
+            self.last_read[id(device)] = now
+        return self.read_function(device)
+
+
+if __name__ == '__main__':
+    with Poller({}, read_function=NewReadingReader()) as poller:
+        def add_device(device_name, device):
+            enable_new_reading_requests({device_name: device})
+            poller.add_device(device_name, device)
+
+        with Fleet(on_ready=add_device) as fleet:
+            fleet.start()
+            fleet.wait(timeout=10)
+            print_report(fleet.report())
+            poller.run(poll_period=0.25, callback=print_snapshot)
@@ -0,0 +1,169 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Event, Lock
+from time import monotonic
+
+import serial
+from lakeshore.generic_instrument import InstrumentException
+
+from housekeeping.instruments.base.instrumentation import instrumentation
+from housekeeping.instruments.utils import load_devices, get_device_class
+
+default_devices_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'devices.json')
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceStatus:
+    """Connection state of one fleet device"""
+
+    def __init__(self, device_name, device_class, device_kwargs):
+        self.device_name = device_name
+        self.device_class = device_class
+        self.device_kwargs = device_kwargs
+        self.device = None
+        self.state = 'pending'
+        self.attempts = 0
+        # seconds spent in the constructor of the successful attempt (port open, settling, identity query)
+        self.connect_time = None
+        self.error = None
+
+    def as_dict(self):
+        return {
+            'device_name': self.device_name,
+            'device_class': self.device_class.__name__,
+            'state': self.state,
+            'attempts': self.attempts,
+            'connect_time': self.connect_time,
+            'error': self.error
+        }
+
+
+class Fleet:
+    """
+    Opens every instrument listed in a devices.json file at the same time. Each device connects on its own thread, so
+    bring-up takes as long as the slowest device rather than the sum of all of them. Devices that fail keep retrying in
+    the background, on_ready is called for each device as soon as it is connected so it can start polling right away:
+
+        poller = Poller({})
+        fleet = Fleet(on_ready=poller.add_device)
+        fleet.start()
+        poller.run()
+    """
+
+    def __init__(self, devices_file=default_devices_file, on_ready=None, retry_period=10.0, max_attempts=None):
+        """
+        Parameters
+        ----------
+        devices_file : str
+            path to the devices.json file
+        on_ready : callable
+            on_ready(device_name, instrument), called from the connecting thread
+        retry_period : float
+            seconds between attempts for a device that failed to connect
+        max_attempts : int
+            attempts per device before giving up, retries forever if None
+        """
+        self.on_ready = on_ready
+        self.retry_period = retry_period
+        self.max_attempts = max_attempts
+        self.statuses = {}
+        for device_name, (device_type, class_name, device_dict) in load_devices(devices_file).items():
+            self.statuses[device_name] = DeviceStatus(
+                device_name, get_device_class(device_type, class_name), device_dict
+            )
+        self.lock = Lock()
+        self.stopping = Event()
+        self.executor = None
+        self.futures = []
+
+    def start(self):
+        """Starts connecting every device, returns immediately"""
+        self.executor = ThreadPoolExecutor(max_workers=max(len(self.statuses), 1), thread_name_prefix='fleet')
+        self.futures = [self.executor.submit(self._connect, status) for status in self.statuses.values()]
+
+    def _connect(self, status):
+        while not self.stopping.is_set():
+            with self.lock:
+                status.state = 'connecting'
+                status.attempts += 1
+            start = monotonic()
+            try:
+                device = status.device_class(**status.device_kwargs)
+            except Exception as e:
+                # anything else, e.g. an OSError or ValueError from a bad port, must not end the thread with the
+                # device left 'connecting'
+                expected = isinstance(e, (InstrumentException, serial.SerialException))
+                with self.lock:
+                    status.error = str(e) if expected else '{}: {}'.format(type(e).__name__, e)
+                    give_up = self.max_attempts is not None and status.attempts >= self.max_attempts
+                    status.state = 'failed' if give_up else 'retrying'
+                logger.warning(
+                    'Unable to connect to %s (attempt %s): %s', status.device_name, status.attempts, status.error,
+                    exc_info=not expected
+                )
+                if give_up:
+                    return
+                instrumentation.record_retry(status.device_name, 'connect')
+                self.stopping.wait(self.retry_period)
+                continue
+            # file the device's command statistics under its devices.json name
+            device.instrument_name = status.device_name
+            with self.lock:
+                status.device = device
+                status.connect_time = monotonic() - start
+                status.error = None
+                status.state = 'ready'
+            logger.info('Connected to %s in %.2f s', status.device_name, status.connect_time)
+            if self.on_ready is not None:
+                self.on_ready(status.device_name, device)
+            return
+
+    def wait(self, timeout=None):
+        """Waits for every device to either connect or give up
+
+            Returns:
+                (bool):
+                    True if every device finished within the timeout
+        """
+        _, not_done = wait(self.futures, timeout)
+        return not not_done
+
+    @property
+    def devices(self):
+        """{device_name: instrument} for the devices connected so far"""
+        with self.lock:
+            return {name: status.device for name, status in self.statuses.items() if status.device is not None}
+
+    def report(self):
+        """Returns the connection state, attempt count and connect latency of every device"""
+        with self.lock:
+            return [status.as_dict() for status in self.statuses.values()]
+
+    def close(self):
+        """Stops retrying, waits for connection attempts in progress"""
+        self.stopping.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def print_report(report):
+    for status in report:
+        connect_time = 'n/a' if status['connect_time'] is None else '{:.2f}s'.format(status['connect_time'])
+        print('{device_name}\t{device_class}\t{state}\tattempts={attempts}\t'.format(**status) + connect_time +
+              ('' if status['error'] is None else '\t' + status['error']))
+
+
+if __name__ == '__main__':
+    with Fleet(max_attempts=1) as fleet:
+        fleet.start()
+        fleet.wait()
+        print_report(fleet.report())
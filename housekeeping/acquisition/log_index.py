@@ -0,0 +1,220 @@
+"""
+Time index of the tab separated housekeeping logs, kept next to each log.
+
+The index of 2021-06-01.tsv is 2021-06-01.tsv.idx, a small text file with the timestamp and byte offset of the first
+row of every interval (a minute by default):
+
+    timestamp	offset
+    2021-06-01T00:00:02.512345	52
+    2021-06-01T00:01:02.513306	795
+    ...
+
+LogWriter and log_coolers write it along with the log. The index of an existing log is built with build_index, once:
+
+    python -m housekeeping.acquisition.log_index 2021-06-01.tsv coolers_20210601.tsv
+
+read_log then seeks straight to a time range and parses only the rows around it, a few kilobytes for half an hour
+instead of the whole day:
+
+    data = read_log('2021-06-01.tsv', datetime(2021, 6, 1, 14), datetime(2021, 6, 1, 14, 30))
+
+The rows of a log are expected in time order. Rows after the last entry of an index are still read, an index that
+lags its log only makes reading slower.
+"""
+import io
+import os
+import sys
+from bisect import bisect_right
+from datetime import datetime
+
+import pandas as pd
+
+index_extension = '.idx'
+index_header = 'timestamp\toffset\n'
+epoch = datetime(1970, 1, 1)
+
+
+def index_path(log_path):
+    return log_path + index_extension
+
+
+def parse_timestamp(text):
+    """Returns the datetime of a log's timestamp column, None if it isn't one"""
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+class LogIndexWriter:
+    """Appends an entry to a log's index whenever a row starts a new interval"""
+
+    def __init__(self, path, interval=60.):
+        """
+        Parameters
+        ----------
+        path : str
+            the index, see index_path
+        interval : float
+            seconds between entries
+        """
+        self.path = path
+        self.interval = interval
+        new_file = not os.path.exists(self.path) or not os.path.getsize(self.path)
+        self.file = open(self.path, 'a', newline='')
+        if new_file:
+            self.file.write(index_header)
+        # interval of the last entry
+        self.last_interval = None
+
+    def add(self, timestamp, offset):
+        """Indexes a row if it is the first of its interval
+
+            Args:
+                timestamp (datetime):
+                    time of the row
+                offset (int):
+                    byte offset of the row in the log
+        """
+        interval = (timestamp - epoch).total_seconds() // self.interval
+        if interval == self.last_interval:
+            return
+        self.last_interval = interval
+        self.file.write('{}\t{}\n'.format(timestamp.isoformat(), offset))
+
+    def flush(self):
+        """Flushes the index, after the log so that no entry points past the end of the log"""
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def build_index(log_path, interval=60., delimiter='\t'):
+    """Writes the index of an existing log, replacing any earlier one
+
+        Returns:
+            (str):
+                path of the index
+    """
+    path = index_path(log_path)
+    # write the entries next to the index so that readers never see half of it
+    temporary_path = path + '.tmp'
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    separator = delimiter.encode()
+    with LogIndexWriter(temporary_path, interval) as index, open(log_path, 'rb') as log:
+        offset = len(log.readline())
+        for line in log:
+            timestamp = parse_timestamp(line.split(separator, 1)[0].decode())
+            if timestamp is not None:
+                index.add(timestamp, offset)
+            offset += len(line)
+    os.replace(temporary_path, path)
+    return path
+
+
+def read_index(log_path):
+    """Returns the timestamps and offsets of a log's index, in order, as two lists"""
+    timestamps = []
+    offsets = []
+    with open(index_path(log_path), newline='') as f:
+        f.readline()
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+            timestamp = parse_timestamp(fields[0])
+            # skip an entry cut short by a crash
+            if timestamp is None or len(fields) != 2 or not fields[1].isdigit():
+                continue
+            timestamps.append(timestamp)
+            offsets.append(int(fields[1]))
+    return timestamps, offsets
+
+
+def log_range(log_path, start=None, end=None, build=True):
+    """Returns the byte range of a log that holds every row from start to end
+
+        Args:
+            log_path (str):
+                the log
+            start (datetime):
+                first time wanted, None for the beginning of the log
+            end (datetime):
+                last time wanted, None for the end of the log
+            build (bool):
+                build the index if the log doesn't have one, otherwise the whole log is the range
+
+        Returns:
+            (tuple):
+                (start offset, end offset), the end offset None for the end of the log
+    """
+    with open(log_path, 'rb') as f:
+        data_offset = len(f.readline())
+    if not os.path.exists(index_path(log_path)):
+        if not build:
+            return data_offset, None
+        build_index(log_path)
+    timestamps, offsets = read_index(log_path)
+    start_offset = data_offset
+    end_offset = None
+    if start is not None:
+        # rows before the last entry at or before start are earlier than start
+        position = bisect_right(timestamps, start) - 1
+        if position >= 0:
+            start_offset = offsets[position]
+    if end is not None:
+        # rows from the first entry after end on are later than end
+        position = bisect_right(timestamps, end)
+        if position < len(timestamps):
+            end_offset = offsets[position]
+    return start_offset, end_offset
+
+
+def read_log(log_path, start=None, end=None, delimiter='\t', build=True):
+    """Loads the rows of a log from start to end, parsing only the part of the file its index points to
+
+        Args:
+            log_path (str):
+                the log
+            start (datetime):
+                first time to include, None for the beginning of the log
+            end (datetime):
+                last time to include, None for the end of the log
+            delimiter (str):
+                column separator
+            build (bool):
+                build the index if the log doesn't have one
+
+        Returns:
+            (pandas.DataFrame):
+                the columns of the log, the first one (timestamp or datetime) as datetime64
+    """
+    start_offset, end_offset = log_range(log_path, start, end, build)
+    with open(log_path, 'rb') as f:
+        header = f.readline().decode().rstrip('\r\n').split(delimiter)
+        f.seek(start_offset)
+        data = f.read() if end_offset is None else f.read(max(end_offset - start_offset, 0))
+    # leave out a row that is still being written
+    data = data[:data.rfind(b'\n') + 1]
+    if not data:
+        log_data = pd.DataFrame({column: pd.Series(dtype='float64') for column in header})
+    else:
+        log_data = pd.read_csv(io.BytesIO(data), delimiter=delimiter, names=header, header=None)
+    timestamps = log_data[header[0]] = pd.to_datetime(log_data[header[0]])
+    rows = pd.Series(True, index=log_data.index)
+    if start is not None:
+        rows &= timestamps >= start
+    if end is not None:
+        rows &= timestamps <= end
+    return log_data[rows].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    for _log_path in sys.argv[1:]:
+        print(build_index(_log_path))
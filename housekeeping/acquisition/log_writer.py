@@ -0,0 +1,203 @@
+"""
+Buffered, rotating writer for the tab separated housekeeping logs.
+
+The file stays open between samples and rows are collected in memory, then written together once enough rows have
+piled up or enough time has passed since the last write. An optional fsync interval bounds what a power cut can lose
+without syncing every row. Files are named after the UTC date of their rows and rotate at UTC midnight:
+
+    with LogWriter(columns=['temp{}'.format(i) for i in range(1, 9)]) as writer:
+        while True:
+            writer.write(monitor.get_kelvin_reading_all())
+            sleep(5)
+
+    with LogWriter(file_name_format='fleet_%Y%m%d.tsv') as writer, Poller(devices) as poller:
+        poller.run(poll_period=5, callback=writer.write_snapshot)
+
+The header always matches the rows under it. When rows of dictionaries bring new columns, or an existing file of the
+day has a different header, the rows go to a new part file (2021-06-01_1.tsv, ...) with the right header. Columns
+missing from a row are left empty.
+
+Each file gets a time index next to it (2021-06-01.tsv.idx) that read_log in housekeeping.acquisition.log_index uses
+to read a time range without parsing the whole day.
+"""
+import os
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+
+from housekeeping.acquisition.log_index import LogIndexWriter, index_path
+
+
+class LogWriter:
+
+    def __init__(self, directory='.', file_name_format='%Y-%m-%d.tsv', columns=None, delimiter='\t',
+                 timestamp_column='timestamp', flush_rows=100, flush_period=30., fsync_period=None, index_interval=60.):
+        """
+        Parameters
+        ----------
+        directory : str
+            where the log files go
+        file_name_format : str
+            strftime format of the file names, evaluated with the UTC date of the rows
+        columns : list
+            column names after the timestamp, defaults to the keys of the first row written
+        delimiter : str
+            column separator
+        timestamp_column : str
+            name of the first column
+        flush_rows : int
+            rows to buffer before writing them to the file
+        flush_period : float
+            longest time in seconds a row waits in the buffer, checked whenever a row is written
+        fsync_period : float
+            seconds between fsyncs of the file, None to leave it to the operating system
+        index_interval : float
+            seconds between the entries of the time index, None for no index
+        """
+        self.directory = directory
+        self.file_name_format = file_name_format
+        self.columns = None if columns is None else list(columns)
+        self.delimiter = delimiter
+        self.timestamp_column = timestamp_column
+        self.flush_rows = flush_rows
+        self.flush_period = flush_period
+        self.fsync_period = fsync_period
+        self.index_interval = index_interval
+        self.file = None
+        self.path = None
+        self.index = None
+        # byte offset of the next row in the file
+        self.offset = 0
+        # UTC date of the open file
+        self.date = None
+        self.buffer = []
+        self.last_flush = monotonic()
+        self.last_fsync = monotonic()
+        self.lock = Lock()
+
+    @property
+    def header(self):
+        return [self.timestamp_column] + self.columns
+
+    def _file_path(self, timestamp, part):
+        file_name = timestamp.strftime(self.file_name_format)
+        if part:
+            root, extension = os.path.splitext(file_name)
+            file_name = '{}_{}{}'.format(root, part, extension)
+        return os.path.join(self.directory, file_name)
+
+    def _read_header(self, path):
+        with open(path, newline='') as f:
+            return f.readline().rstrip('\r\n').split(self.delimiter)
+
+    def _open(self, timestamp):
+        header = self.header
+        part = 0
+        while True:
+            path = self._file_path(timestamp, part)
+            if not os.path.exists(path) or not os.path.getsize(path):
+                new_file = True
+                break
+            if self._read_header(path) == header:
+                new_file = False
+                break
+            part += 1
+        self.file = open(path, 'a', newline='')
+        self.path = path
+        self.date = timestamp.date()
+        if new_file:
+            self.file.write(self.delimiter.join(header) + '\n')
+        self.offset = self.file.tell()
+        if self.index_interval is not None:
+            self.index = LogIndexWriter(index_path(path), self.index_interval)
+
+    def _close(self):
+        if self.file is None:
+            return
+        self._flush()
+        if self.fsync_period is not None:
+            os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def _flush(self):
+        if self.buffer:
+            self.file.write(''.join(self.buffer))
+            self.buffer = []
+        self.file.flush()
+        if self.index is not None:
+            self.index.flush()
+        self.last_flush = monotonic()
+        if self.fsync_period is not None and self.last_flush - self.last_fsync >= self.fsync_period:
+            os.fsync(self.file.fileno())
+            self.last_fsync = self.last_flush
+
+    def _row_values(self, row):
+        """Returns the values of a row in column order, starting a new file if it brings new columns"""
+        if not isinstance(row, dict):
+            row = list(row)
+            if self.columns is None or len(row) != len(self.columns):
+                raise ValueError('Rows without column names must have one value per column')
+            return row
+        if self.columns is None:
+            self.columns = list(row)
+        else:
+            new_columns = [column for column in row if column not in self.columns]
+            if new_columns:
+                self._close()
+                self.columns += new_columns
+        return [row.get(column) for column in self.columns]
+
+    def write(self, row, timestamp=None):
+        """Adds a row to the log
+
+            Args:
+                row (dict or list):
+                    {column: value}, or values in column order
+                timestamp (datetime):
+                    UTC time of the row, defaults to now
+
+            Returns:
+                (str):
+                    the line as written, without the line ending
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        with self.lock:
+            values = self._row_values(row)
+            if self.file is not None and timestamp.date() != self.date:
+                self._close()
+            if self.file is None:
+                self._open(timestamp)
+            line = self.delimiter.join(
+                [timestamp.isoformat()] + ['' if value is None else str(value) for value in values]
+            )
+            if self.index is not None:
+                self.index.add(timestamp, self.offset)
+            self.buffer.append(line + '\n')
+            self.offset += len(self.buffer[-1].encode(self.file.encoding))
+            if len(self.buffer) >= self.flush_rows or monotonic() - self.last_flush >= self.flush_period:
+                self._flush()
+        return line
+
+    def write_snapshot(self, snapshot):
+        """Poller callback that logs every channel of a Snapshot"""
+        self.write(snapshot.flatten(), snapshot.timestamp)
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self._flush()
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
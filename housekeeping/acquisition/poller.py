@@ -0,0 +1,288 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from time import sleep, monotonic
+
+import serial
+from lakeshore.generic_instrument import InstrumentException
+
+from housekeeping.acquisition.fleet import Fleet, default_devices_file, print_report
+
+logger = logging.getLogger(__name__)
+
+
+def build_devices(devices_file=default_devices_file, skip_missing=True):
+    """Connects to every instrument listed in a devices.json file, all at the same time
+
+        Args:
+            devices_file (str):
+                path to the devices.json file
+            skip_missing (bool):
+                log and skip instruments that fail to connect instead of raising
+
+        Returns:
+            (dict):
+                {device_name: instrument}, named as in get_ports.py
+    """
+    with Fleet(devices_file, max_attempts=1) as fleet:
+        fleet.start()
+        fleet.wait()
+    if not skip_missing:
+        for status in fleet.report():
+            if status['state'] != 'ready':
+                raise InstrumentException('Unable to connect to {}: {}'.format(status['device_name'], status['error']))
+    return fleet.devices
+
+
+def get_port_name(device):
+    """Returns the name of the serial port a device talks over, devices without one get their own worker"""
+    port = getattr(device.device_serial, 'port', None)
+    if port is None:
+        return 'device_{}'.format(id(device))
+    return port
+
+
+class Snapshot:
+    """One poll cycle worth of readings"""
+
+    def __init__(self, timestamp, readings, errors, cycle_time, reading_schemas=None):
+        """
+        Parameters
+        ----------
+        timestamp : datetime
+            UTC time at the start of the cycle
+        readings : dict
+            {device_name: reading}, reading is whatever the read function returned (log_dict by default)
+        errors : dict
+            {device_name: error message} for the devices that failed this cycle
+        cycle_time : float
+            wall time in seconds spent polling all devices
+        reading_schemas : dict
+            {device_name: ReadingSchema} of the devices whose readings are values in schema order, see
+            Poller.read_values. flatten names their values with it, as log_dict would
+        """
+        self.timestamp = timestamp
+        self.readings = readings
+        self.errors = errors
+        self.cycle_time = cycle_time
+        self.reading_schemas = {} if reading_schemas is None else reading_schemas
+
+    def flatten(self):
+        """Returns all readings merged into a single {channel: value} dictionary, so the writers' write_snapshot take
+        typed polls as well"""
+        _dict = {}
+        for device_name, reading in self.readings.items():
+            if not isinstance(reading, dict):
+                if device_name not in self.reading_schemas:
+                    raise TypeError('{} returned {}, not a dictionary, and has no reading schema'.format(
+                        device_name, type(reading).__name__
+                    ))
+                reading = self.reading_schemas[device_name].as_dict(reading)
+            for channel, value in reading.items():
+                _dict['{}_{}'.format(device_name, channel)] = value
+        return _dict
+
+    def values(self, schemas):
+        """Returns the readings of a Poller.read_values poll as one list, in the order of the schemas
+
+            Args:
+                schemas (dict):
+                    {device_name: ReadingSchema}, see fleet_schemas. Devices that failed or had nothing new get the
+                    missing values of their schema
+        """
+        values = []
+        for device_name, schema in schemas.items():
+            reading = self.readings.get(device_name)
+            values.extend(schema.missing if reading is None else reading)
+        return values
+
+
+class Poller:
+    """
+    Polls a fleet of instruments with one worker per serial port. Devices sharing a port are read one after another,
+    independent ports are read in parallel, so the cycle time is set by the slowest port.
+    """
+
+    def __init__(self, devices, read_function=None):
+        """
+        Parameters
+        ----------
+        devices : dict
+            {device_name: instrument}, see build_devices
+        read_function : callable
+            read_function(instrument) returns the reading stored in the snapshot, or None if the instrument has nothing
+            new (see housekeeping.acquisition.events). Defaults to instrument.log_dict()
+        """
+        if read_function is None:
+            read_function = self.read_log_dict
+        self.read_function = read_function
+        self.devices = {}
+        self.ports = {}
+        self.executor = None
+        self.executor_size = 0
+        # devices can be added from other threads while polling, e.g. by Fleet as they connect
+        self.lock = Lock()
+        for device_name, device in devices.items():
+            self.add_device(device_name, device)
+
+    @staticmethod
+    def read_log_dict(device):
+        return device.log_dict()
+
+    @staticmethod
+    def read_values(device):
+        """Read function for typed acquisition, readings are tuples in the order of the device's reading schema. See
+        fleet_schemas and Snapshot.values"""
+        return device.read_values()
+
+    @staticmethod
+    def read_envelope_log_dict(device):
+        """
+        Read function for slow trend logging. Instruments that track extremes (Model218, Model331) add the minimum and
+        maximum since the previous poll to each reading, so excursions between polls still make it into the log. See
+        reset_envelopes to start the first window at the first poll.
+        """
+        if hasattr(device, 'envelope_log_dict'):
+            return device.envelope_log_dict()
+        return device.log_dict()
+
+    @staticmethod
+    def read_alarm_log_dict(device):
+        """
+        Read function for alarm monitoring. Instruments with hardware alarms (Model218, Model331) report their alarm
+        and relay states, the others are skipped. See housekeeping.acquisition.alarms.
+        """
+        if hasattr(device, 'alarm_log_dict'):
+            return device.alarm_log_dict()
+        return None
+
+    def add_device(self, device_name, device):
+        with self.lock:
+            self.devices[device_name] = device
+            self.ports.setdefault(get_port_name(device), []).append(device_name)
+            self._resize_executor()
+
+    def remove_device(self, device_name):
+        with self.lock:
+            device = self.devices.pop(device_name)
+            port = get_port_name(device)
+            self.ports[port].remove(device_name)
+            if not self.ports[port]:
+                del self.ports[port]
+
+    def _resize_executor(self):
+        if self.executor is not None and self.executor_size >= len(self.ports):
+            return
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        self.executor_size = max(len(self.ports), 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.executor_size, thread_name_prefix='poller')
+
+    def _poll_port(self, device_names):
+        readings = {}
+        errors = {}
+        for device_name in device_names:
+            try:
+                reading = self.read_function(self.devices[device_name])
+                if reading is not None:
+                    readings[device_name] = reading
+            except (InstrumentException, serial.SerialException, ValueError) as e:
+                logger.warning('Failed to read %s: %s', device_name, e)
+                errors[device_name] = str(e)
+            except Exception as e:
+                # e.g. a KeyError from a partial reply, one driver must not stop the poll of the whole fleet
+                logger.exception('Failed to read %s', device_name)
+                errors[device_name] = '{}: {}'.format(type(e).__name__, e)
+        return readings, errors
+
+    def poll(self):
+        """Reads every device once
+
+            Returns:
+                (Snapshot)
+        """
+        timestamp = datetime.utcnow()
+        start = monotonic()
+        with self.lock:
+            futures = [self.executor.submit(self._poll_port, list(names)) for names in self.ports.values()]
+            devices = dict(self.devices)
+        port_readings = {}
+        errors = {}
+        for future in futures:
+            readings, port_errors = future.result()
+            port_readings.update(readings)
+            errors.update(port_errors)
+        # keep the order devices were added in, not the order ports finished in
+        readings = {name: port_readings[name] for name in devices if name in port_readings}
+        reading_schemas = {
+            name: devices[name].get_reading_schema() for name, reading in readings.items()
+            if not isinstance(reading, dict) and hasattr(devices[name], 'get_reading_schema')
+        }
+        return Snapshot(timestamp, readings, errors, monotonic() - start, reading_schemas)
+
+    def run(self, poll_period=5, callback=None, cycles=None):
+        """Polls all devices every poll_period seconds
+
+            Args:
+                poll_period (float):
+                    time between the start of consecutive cycles, in seconds
+                callback (callable):
+                    called with each Snapshot
+                cycles (int):
+                    number of cycles to run, runs forever if None
+        """
+        cycle = 0
+        while cycles is None or cycle < cycles:
+            start = monotonic()
+            snapshot = self.poll()
+            if callback is not None:
+                callback(snapshot)
+            cycle += 1
+            sleep(max(poll_period - (monotonic() - start), 0))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def fleet_schemas(devices):
+    """Returns {device_name: ReadingSchema} with the device name in front of every channel, the names Snapshot.flatten
+    gives the log_dict readings. Size logs and buffers from ReadingSchema.concatenate(fleet_schemas(devices).values())
+    once and fill them with Snapshot.values"""
+    return {device_name: device.get_reading_schema().prefixed(device_name) for device_name, device in devices.items()}
+
+
+def reset_envelopes(devices):
+    """Resets the extremes of every instrument that tracks them, see Poller.read_envelope_log_dict"""
+    for device_name, device in devices.items():
+        if not hasattr(device, 'envelope_log_dict'):
+            continue
+        try:
+            device.reset_min_max_data()
+        except (InstrumentException, serial.SerialException) as e:
+            logger.warning('Unable to reset the extremes of %s: %s', device_name, e)
+
+
+def print_snapshot(snapshot):
+    print(snapshot.timestamp.isoformat(), '{:.3f}s'.format(snapshot.cycle_time))
+    for channel, value in snapshot.flatten().items():
+        print('    {}\t{}'.format(channel, value))
+    for device_name, error in snapshot.errors.items():
+        print('    {}\tERROR {}'.format(device_name, error))
+
+
+if __name__ == '__main__':
+    # start polling each device as soon as it connects, missing devices keep retrying in the background
+    with Poller({}) as poller, Fleet(on_ready=poller.add_device) as fleet:
+        fleet.start()
+        fleet.wait(timeout=10)
+        print_report(fleet.report())
+        poller.run(poll_period=5, callback=print_snapshot)
@@ -0,0 +1,222 @@
+"""
+Latest readings of every channel shared with other processes through a memory mapped ring buffer.
+
+The acquisition process publishes each poll into a file mapped into memory (in /dev/shm where there is one), and
+dashboards, loggers and control scripts on the same machine map the same file to read the latest samples, without
+opening a serial port or waiting on any lock:
+
+    with RingBufferWriter(default_ring_path, channels) as ring, Poller(devices) as poller:
+        poller.run(poll_period=5, callback=ring.write_snapshot)
+
+    ring = RingBufferReader(default_ring_path)
+    ring.latest_dict()['TemperatureMonitor_Model218_0_Model218_ch1']
+    samples = ring.latest(100)
+    samples['timestamp'], samples['values'][:, ring.channel_index('...')]
+
+The file is a fixed header, the channel names, then capacity records of (sequence, timestamp, values) as a NumPy
+record array. There is one writer. It marks a record as being written by making its sequence odd, fills it in, makes
+the sequence even again and only then advances the head. Readers copy the records they want and keep them only if
+every sequence was even and unchanged across the copy (a seqlock), retrying otherwise, so they never see a half
+written record and never hold up the writer. This relies on the stores reaching memory in program order, which x86
+guarantees.
+
+The channels are fixed when the file is created. Values of other channels are dropped, channels missing from a poll
+are NaN and values that aren't numbers are stored as NaN.
+"""
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+default_ring_path = os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'housekeeping_ring'
+)
+magic = b'HKRING01'
+header_dtype = np.dtype([
+    ('magic', 'S8'),
+    ('channel_count', '<u4'),
+    ('name_length', '<u4'),
+    ('capacity', '<u8'),
+    # records written so far, the newest is at (head - 1) % capacity
+    ('head', '<u8'),
+    ('padding', 'V32'),
+])
+
+
+def record_dtype(channel_count):
+    return np.dtype([('sequence', '<u8'), ('timestamp', '<i8'), ('values', '<f8', (channel_count,))])
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class _RingBufferFile:
+    """Memory maps of the header, channel names and records of a ring buffer file"""
+
+    def _map(self, path, mode, channel_count, name_length, capacity):
+        names_dtype = np.dtype('S{}'.format(name_length))
+        names_size = -(-channel_count * name_length // 8) * 8
+        self.header = np.memmap(path, header_dtype, mode, 0, (1,))
+        self.names = np.memmap(path, names_dtype, mode, header_dtype.itemsize, (channel_count,))
+        self.records = np.memmap(
+            path, record_dtype(channel_count), mode, header_dtype.itemsize + names_size, (capacity,)
+        )
+        self.capacity = capacity
+        self.channels = [name.decode('utf-8') for name in self.names]
+        self.channel_indices = {channel: index for index, channel in enumerate(self.channels)}
+
+    def channel_index(self, channel):
+        return self.channel_indices[channel]
+
+    def close(self):
+        # numpy has no explicit unmap, the mapping closes once the arrays are gone
+        self.header = self.names = self.records = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RingBufferWriter(_RingBufferFile):
+
+    def __init__(self, path=default_ring_path, channels=(), capacity=8192, name_length=128):
+        """
+        Parameters
+        ----------
+        path : str
+            file to create, replacing any earlier one
+        channels : list
+            channel names, in the order of the values
+        capacity : int
+            records kept
+        name_length : int
+            longest channel name in bytes
+        """
+        channels = list(channels)
+        encoded = [channel.encode('utf-8') for channel in channels]
+        if any(len(name) > name_length for name in encoded):
+            raise ValueError('Channel names must be at most {} bytes'.format(name_length))
+        # build the file next to its final name, readers opening the path always find a complete header
+        temporary_path = path + '.tmp'
+        header = np.zeros(1, header_dtype)
+        header['magic'] = magic
+        header['channel_count'] = len(channels)
+        header['name_length'] = name_length
+        header['capacity'] = capacity
+        names_size = -(-len(channels) * name_length // 8) * 8
+        with open(temporary_path, 'wb') as f:
+            f.write(header.tobytes())
+            f.write(np.array(encoded, dtype='S{}'.format(name_length)).tobytes().ljust(names_size, b'\0'))
+            f.truncate(header_dtype.itemsize + names_size + capacity * record_dtype(len(channels)).itemsize)
+        os.replace(temporary_path, path)
+        self._map(path, 'r+', len(channels), name_length, capacity)
+        self.path = path
+        self.head = 0
+        self.dropped_channels = set()
+
+    def write(self, row, timestamp=None):
+        """Publishes one sample of every channel
+
+            Args:
+                row (dict):
+                    {channel: value}
+                timestamp (datetime):
+                    UTC time of the sample, defaults to now
+        """
+        values = np.full(len(self.channels), np.nan)
+        for channel, value in row.items():
+            index = self.channel_indices.get(channel)
+            if index is None:
+                if channel not in self.dropped_channels:
+                    self.dropped_channels.add(channel)
+                    logger.warning('%s is not in the ring buffer, its values are dropped', channel)
+                continue
+            values[index] = _to_float(value)
+        self.write_values(values, timestamp)
+
+    def write_values(self, values, timestamp=None):
+        """Publishes one sample given as values in channel order, e.g. Snapshot.values of a typed poll"""
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        slot = self.head % self.capacity
+        sequences = self.records['sequence']
+        sequence = int(sequences[slot])
+        # odd while the record is being written
+        sequences[slot] = sequence + 1
+        self.records['timestamp'][slot] = np.datetime64(timestamp, 'ns').astype(np.int64)
+        self.records['values'][slot] = values
+        sequences[slot] = sequence + 2
+        self.head += 1
+        self.header['head'] = self.head
+
+    def write_snapshot(self, snapshot):
+        """Poller callback that publishes every channel of a Snapshot"""
+        self.write(snapshot.flatten(), snapshot.timestamp)
+
+
+class RingBufferReader(_RingBufferFile):
+
+    def __init__(self, path=default_ring_path, retries=100):
+        """
+        Parameters
+        ----------
+        path : str
+            file published by a RingBufferWriter
+        retries : int
+            attempts at a consistent copy before giving up
+        """
+        header = np.fromfile(path, header_dtype, 1)
+        if not len(header) or header['magic'][0] != magic:
+            raise ValueError('{} is not a ring buffer'.format(path))
+        self._map(
+            path, 'r', int(header['channel_count'][0]), int(header['name_length'][0]), int(header['capacity'][0])
+        )
+        self.path = path
+        self.retries = retries
+
+    @property
+    def head(self):
+        """Records written so far"""
+        return int(self.header['head'][0])
+
+    def latest(self, n=1):
+        """Returns a consistent copy of the newest n records, oldest first
+
+            Returns:
+                (numpy.ndarray):
+                    records with timestamp (int64 ns since the epoch, UTC) and values (one column per channel),
+                    fewer than n if fewer were written
+        """
+        n = min(n, self.capacity)
+        for _ in range(self.retries):
+            head = self.head
+            count = min(n, head)
+            slots = np.arange(head - count, head) % self.capacity
+            records = self.records[slots]
+            sequences = self.records['sequence'][slots]
+            # the oldest slot copied may have been overwritten by a lap of the writer that finished during the copy
+            lapped = self.head - (head - count) > self.capacity
+            if not lapped and not np.any(records['sequence'] & 1) and np.array_equal(records['sequence'], sequences):
+                return np.asarray(records)
+        raise RuntimeError('No consistent copy of {} after {} attempts'.format(self.path, self.retries))
+
+    def latest_dict(self):
+        """Returns {channel: value} of the newest record, with its timestamp as a datetime under 'timestamp'"""
+        records = self.latest(1)
+        if not len(records):
+            return {}
+        timestamp = records['timestamp'][0].astype('datetime64[ns]')
+        # datetime64[ns] converts to an int, microseconds to a datetime
+        _dict = {'timestamp': timestamp.astype('datetime64[us]').astype(datetime)}
+        _dict.update(zip(self.channels, records['values'][0].tolist()))
+        return _dict
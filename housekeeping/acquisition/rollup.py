@@ -0,0 +1,360 @@
+"""
+Downsampled tiers of the housekeeping logs for plotting long trends.
+
+Every sample is folded into the open bucket of each tier (1 s, 1 min and 1 h by default) as it arrives, a constant
+amount of work per channel, and a bucket is written once a sample lands past its end. Each tier is an archive (see
+housekeeping.acquisition.archive) where every channel has min, max, mean, last and count columns, and a row per
+bucket stamped with the start of the bucket:
+
+    rollup/1s/...
+    rollup/1min/...
+    rollup/1h/...
+
+    with RollupWriter('rollup') as rollup, Poller(devices) as poller:
+        poller.run(poll_period=5, callback=rollup.write_snapshot)
+
+Readers ask for a time range and how many points they can show, usually the width of the plot in pixels, and get the
+coarsest tier that still has that many buckets in the range. A month long cooldown has about 720 hourly buckets, so at
+the default width of 1920 it loads about 43 000 minute rows instead of half a million samples, and 720 hourly rows
+for a plot up to 720 pixels wide:
+
+    data = read_rollup('rollup', ['Pressure_Lesker392_0_Lesker392_pressure_mBar'], start, end, width=1000)
+    data['Pressure_Lesker392_0_Lesker392_pressure_mBar_max']
+
+NaN samples are left out of the statistics, count is the number of samples in the bucket. A bucket split across two
+inputs, e.g. two log files rolled up one after the other, is written as a partial row by each, read_rollup merges the
+rows with the same start into one. As with the archive, the buckets of the hour in progress are only in
+memory, and an hourly bucket reaches the disk with the hour after it. Existing logs are rolled up with rollup_frame:
+
+    python -m housekeeping.acquisition.rollup rollup 2021-06-01.tsv 2021-06-02.tsv
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from housekeeping.acquisition.archive import (
+    ArchiveWriter, archive_columns, archive_files, read_archive, timestamp_column
+)
+
+# (name, seconds) from the finest to the coarsest
+default_tiers = (('1s', 1), ('1min', 60), ('1h', 3600))
+statistics = ('min', 'max', 'mean', 'last', 'count')
+epoch = datetime(1970, 1, 1)
+
+
+def tier_row_group_hours(seconds):
+    """Hours per row group of a tier's day files, a day for the tiers with at most a few thousand buckets a day"""
+    return 1 if seconds < 60 else 24
+
+
+def rollup_column(channel, statistic):
+    return '{}_{}'.format(channel, statistic)
+
+
+class RollupTier:
+    """Open bucket of one tier, as a statistic of every channel"""
+
+    def __init__(self, seconds, channel_count=0):
+        self.seconds = seconds
+        # index of the open bucket since the epoch, None before the first sample
+        self.bucket = None
+        self._allocate(channel_count)
+
+    def _allocate(self, channel_count):
+        self.count = np.zeros(channel_count)
+        self.sum = np.zeros(channel_count)
+        self.min = np.full(channel_count, np.nan)
+        self.max = np.full(channel_count, np.nan)
+        self.last = np.full(channel_count, np.nan)
+
+    def add_channels(self, channel_count):
+        """Extends the bucket to channel_count channels, the new ones without samples"""
+        added = channel_count - len(self.count)
+        self.count = np.r_[self.count, np.zeros(added)]
+        self.sum = np.r_[self.sum, np.zeros(added)]
+        self.min = np.r_[self.min, np.full(added, np.nan)]
+        self.max = np.r_[self.max, np.full(added, np.nan)]
+        self.last = np.r_[self.last, np.full(added, np.nan)]
+
+    def add(self, bucket, values):
+        """Folds one sample into the bucket
+
+            Args:
+                bucket (int):
+                    index of the sample's bucket since the epoch
+                values (numpy.ndarray):
+                    float64 value of every channel, NaN where there is none
+
+            Returns:
+                (tuple):
+                    (start, {statistic: values}) of the bucket the sample closed, None if it didn't close one
+        """
+        closed = None
+        if bucket != self.bucket:
+            if self.bucket is not None:
+                closed = self.close()
+            self.bucket = bucket
+        valid = ~np.isnan(values)
+        self.count += valid
+        self.sum += np.where(valid, values, 0.)
+        self.min = np.fmin(self.min, values)
+        self.max = np.fmax(self.max, values)
+        self.last = np.where(valid, values, self.last)
+        return closed
+
+    def close(self):
+        """Returns (start, {statistic: values}) of the open bucket and empties it, None if it had no samples"""
+        if self.bucket is None:
+            return None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum / self.count
+        closed = (
+            epoch + timedelta(seconds=self.bucket * self.seconds),
+            {'min': self.min, 'max': self.max, 'mean': mean, 'last': self.last, 'count': self.count}
+        )
+        self.bucket = None
+        self._allocate(len(self.count))
+        return closed
+
+
+class RollupWriter:
+    """Folds rows into the tiers and writes their buckets to an archive per tier"""
+
+    def __init__(self, directory, tiers=default_tiers, compression='zstd', compact=True):
+        """
+        Parameters
+        ----------
+        directory : str
+            rollup directory, with an archive directory for each tier
+        tiers : tuple
+            (name, seconds) of each tier
+        compression : str
+            Parquet compression codec
+        compact : bool
+            compact each day of the tiers into one file once it is over
+        """
+        self.directory = directory
+        self.tiers = [RollupTier(seconds) for _, seconds in tiers]
+        self.archives = [
+            ArchiveWriter(os.path.join(directory, name), compression, compact, tier_row_group_hours(seconds))
+            for name, seconds in tiers
+        ]
+        self.channels = []
+        self.channel_indices = {}
+
+    def _write_bucket(self, archive, closed):
+        if closed is None:
+            return
+        start, values = closed
+        archive.write(
+            {rollup_column(channel, statistic): values[statistic][index]
+             for statistic in statistics for index, channel in enumerate(self.channels)},
+            start
+        )
+
+    def write(self, row, timestamp=None):
+        """Folds a row into every tier
+
+            Args:
+                row (dict):
+                    {channel: value}
+                timestamp (datetime):
+                    UTC time of the row, defaults to now
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        new_channels = [channel for channel in row if channel not in self.channel_indices]
+        if new_channels:
+            for channel in new_channels:
+                self.channel_indices[channel] = len(self.channels)
+                self.channels.append(channel)
+            for tier in self.tiers:
+                tier.add_channels(len(self.channels))
+        values = np.full(len(self.channels), np.nan)
+        for channel, value in row.items():
+            try:
+                values[self.channel_indices[channel]] = float(value)
+            except (TypeError, ValueError):
+                pass
+        seconds = (timestamp - epoch).total_seconds()
+        for tier, archive in zip(self.tiers, self.archives):
+            self._write_bucket(archive, tier.add(int(seconds // tier.seconds), values))
+
+    def write_snapshot(self, snapshot):
+        """Poller callback that rolls up every channel of a Snapshot"""
+        self.write(snapshot.flatten(), snapshot.timestamp)
+
+    def flush(self):
+        """Writes the buckets closed so far, the open buckets stay open"""
+        for archive in self.archives:
+            archive.flush()
+
+    def close(self):
+        """Closes the open buckets, they are written even if incomplete"""
+        for tier, archive in zip(self.tiers, self.archives):
+            self._write_bucket(archive, tier.close())
+            archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def select_tier(start, end, width, tiers=default_tiers):
+    """Returns the name of the coarsest tier with at least width buckets between start and end, the finest if none
+    has that many"""
+    span = (end - start).total_seconds()
+    selected = tiers[0][0]
+    for name, seconds in tiers:
+        if span / seconds >= width:
+            selected = name
+    return selected
+
+
+def first_timestamp(directory, tiers=default_tiers):
+    """Returns the start of the first bucket of the finest tier, None if it is empty"""
+    paths = archive_files(os.path.join(directory, tiers[0][0]))
+    if not paths:
+        return None
+    timestamps = pq.read_table(paths[0], columns=[timestamp_column])[timestamp_column].to_numpy()
+    if not len(timestamps):
+        return None
+    return epoch + timedelta(microseconds=int(timestamps.min()) // 1000)
+
+
+def read_rollup(directory, channels, start=None, end=None, width=1920, tiers=default_tiers,
+                statistics=statistics):
+    """Loads the statistics of channels from the coarsest tier that has width buckets between start and end
+
+        Args:
+            directory (str):
+                rollup directory
+            channels (list):
+                channels to load
+            start (datetime):
+                first UTC time to include, None for the first bucket
+            end (datetime):
+                last UTC time to include, None for now
+            width (int):
+                points wanted across the range, e.g. the plot width in pixels
+            statistics (tuple):
+                statistics to load for each channel, of min, max, mean, last and count
+
+        Returns:
+            (pandas.DataFrame):
+                timestamp column with the start of each bucket followed by {channel}_{statistic} columns
+    """
+    if start is None:
+        start = first_timestamp(directory, tiers)
+    if end is None:
+        end = datetime.utcnow()
+    name = tiers[0][0] if start is None else select_tier(start, end, width, tiers)
+    # the means of partial rows are weighted by their counts
+    loaded = tuple(statistics) + (('count',) if 'mean' in statistics and 'count' not in statistics else ())
+    columns = [rollup_column(channel, statistic) for channel in channels for statistic in loaded]
+    data = merge_buckets(read_archive(os.path.join(directory, name), columns, start, end), channels, loaded)
+    return data[[timestamp_column] + [rollup_column(channel, statistic) for channel in channels
+                                      for statistic in statistics]]
+
+
+def merge_buckets(data, channels, statistics=statistics):
+    """Merges the rows of a tier with the same bucket start, the partial rows of a bucket that was rolled up in two
+    parts. Rows written before counts were stored have the same weight in the mean
+
+        Args:
+            data (pandas.DataFrame):
+                timestamp column in time order followed by {channel}_{statistic} columns, see read_archive
+
+        Returns:
+            (pandas.DataFrame):
+                the data with one row per bucket
+    """
+    if data[timestamp_column].is_unique:
+        return data
+    timestamps = data[timestamp_column]
+    grouped = data.groupby(timestamp_column, sort=False)
+    merged = {timestamp_column: grouped[timestamp_column].first()}
+    for channel in channels:
+        for statistic in statistics:
+            column = rollup_column(channel, statistic)
+            if statistic == 'mean':
+                means = data[column]
+                counts = data[rollup_column(channel, 'count')].fillna(1.)
+                weights = counts.where(means.notna(), 0.)
+                # NaN for buckets without samples
+                merged[column] = ((means.fillna(0.) * weights).groupby(timestamps, sort=False).sum()
+                                  / weights.groupby(timestamps, sort=False).sum())
+            elif statistic == 'count':
+                merged[column] = grouped[column].sum(min_count=1)
+            else:
+                # min, max or the last value, NaN skipped
+                merged[column] = getattr(grouped[column], statistic)()
+    return pd.DataFrame(merged).reset_index(drop=True)
+
+
+def rollup_frame(directory, data, tiers=default_tiers, compression='zstd'):
+    """Adds the rows of a DataFrame to every tier at once, e.g. a log read from a file
+
+        Args:
+            directory (str):
+                rollup directory
+            data (pandas.DataFrame):
+                timestamp column of UTC times followed by the channels
+
+        Returns:
+            (list):
+                paths of the day files written
+    """
+    data = data.copy()
+    timestamps = pd.to_datetime(data.pop(data.columns[0]))
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+    data = data.apply(pd.to_numeric, errors='coerce').astype(np.float64)
+    paths = []
+    for name, seconds in tiers:
+        grouped = data.groupby(timestamps.dt.floor('{}s'.format(seconds)).to_numpy())
+        buckets = {statistic: getattr(grouped, statistic)() for statistic in statistics}
+        bucket_starts = pd.Series(buckets['min'].index)
+        columns = {rollup_column(channel, statistic): buckets[statistic][channel].to_numpy()
+                   for channel in data.columns for statistic in statistics}
+        paths += archive_columns(
+            os.path.join(directory, name), bucket_starts, columns, tier_row_group_hours(seconds), compression
+        )
+    return paths
+
+
+def plot_rollup(ax, directory, channels, start=None, end=None, width=None, tiers=default_tiers):
+    """Plots the mean of each channel inside a band from its min to its max
+
+        Args:
+            ax (matplotlib.axes.Axes):
+                axes to plot on
+            width (int):
+                points wanted across the range, defaults to the width of the axes in pixels
+
+        Returns:
+            (pandas.DataFrame):
+                the data plotted, see read_rollup
+    """
+    if width is None:
+        width = max(int(ax.bbox.width), 1)
+    data = read_rollup(directory, channels, start, end, width, tiers, ('min', 'max', 'mean'))
+    for channel in channels:
+        line, = ax.plot(data[timestamp_column], data[rollup_column(channel, 'mean')], label=channel)
+        ax.fill_between(
+            data[timestamp_column], data[rollup_column(channel, 'min')], data[rollup_column(channel, 'max')],
+            color=line.get_color(), alpha=0.3, linewidth=0
+        )
+    return data
+
+
+if __name__ == '__main__':
+    for tsv_path in sys.argv[2:]:
+        for rollup_path in rollup_frame(sys.argv[1], pd.read_csv(tsv_path, delimiter='\t')):
+            print(rollup_path)
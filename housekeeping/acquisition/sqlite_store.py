@@ -0,0 +1,247 @@
+"""
+Housekeeping readings in a single SQLite database, queryable while the acquisition writes to it.
+
+The readings are narrow, one row per channel and sample, with the channel names kept once in a dictionary table:
+
+    channels (channel_id INTEGER PRIMARY KEY, name TEXT UNIQUE)
+    readings (timestamp INTEGER, channel_id INTEGER, value REAL)
+
+Timestamps are int64 nanoseconds since the epoch (UTC), as in the archive. An index on (channel_id, timestamp, value)
+covers the time range queries, so they read only the index and never the table. Values that aren't numbers are not
+stored.
+
+The database is in WAL mode: the writer appends to the write-ahead log while any number of readers, in this process
+or others, query the last committed state without blocking it or being blocked. Rows are collected in memory and
+inserted in one transaction once enough have piled up or enough time has passed:
+
+    with SQLiteWriter('housekeeping.db') as store, Poller(devices) as poller:
+        poller.run(poll_period=5, callback=store.write_snapshot)
+
+    data = read_sqlite('housekeeping.db', ['Pressure_Lesker392_0_Lesker392_pressure_mBar'], start, end)
+
+Existing TSV logs are added with import_tsv:
+
+    python -m housekeeping.acquisition.sqlite_store housekeeping.db 2021-06-01.tsv 2021-06-02.tsv
+"""
+import math
+import sqlite3
+import sys
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+
+import numpy as np
+import pandas as pd
+
+from housekeeping.acquisition.archive import to_epoch_ns
+
+schema = """
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS readings (
+    timestamp INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL REFERENCES channels (channel_id),
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS readings_channel_timestamp ON readings (channel_id, timestamp, value);
+"""
+
+
+def connect(path, read_only=False, timeout=30.):
+    """Opens the database in WAL mode, creating it if it doesn't exist unless read_only"""
+    if read_only:
+        connection = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True, timeout=timeout)
+    else:
+        connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        # WAL mode is stored in the database, readers opening it later get it too
+        connection.execute('PRAGMA journal_mode=WAL')
+        # a power cut can lose the last transactions but never corrupts the database
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(schema)
+    return connection
+
+
+def channel_ids(connection):
+    """Returns {channel name: channel_id} of the database"""
+    return dict(connection.execute('SELECT name, channel_id FROM channels'))
+
+
+def add_channels(connection, names):
+    """Adds the channels that aren't in the database yet, returns {channel name: channel_id} of all of them"""
+    connection.executemany('INSERT OR IGNORE INTO channels (name) VALUES (?)', [(name,) for name in names])
+    return channel_ids(connection)
+
+
+def _to_float(value):
+    """Returns value as a float, None if it isn't a number"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+class SQLiteWriter:
+    """Collects rows and inserts them into the database in batches"""
+
+    def __init__(self, path, batch_rows=1000, batch_period=10.):
+        """
+        Parameters
+        ----------
+        path : str
+            database file, created if it doesn't exist
+        batch_rows : int
+            readings to collect before inserting them
+        batch_period : float
+            longest time in seconds a reading waits to be inserted, checked whenever a row is written
+        """
+        self.path = path
+        self.batch_rows = batch_rows
+        self.batch_period = batch_period
+        self.connection = connect(path)
+        with self.connection:
+            self.channel_ids = channel_ids(self.connection)
+        # (timestamp, channel_id, value) not inserted yet
+        self.batch = []
+        self.last_insert = monotonic()
+        self.lock = Lock()
+
+    def _insert(self):
+        if self.batch:
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT INTO readings (timestamp, channel_id, value) VALUES (?, ?, ?)', self.batch
+                )
+            self.batch = []
+        self.last_insert = monotonic()
+
+    def write(self, row, timestamp=None):
+        """Adds a row
+
+            Args:
+                row (dict):
+                    {channel: value}
+                timestamp (datetime):
+                    UTC time of the row, defaults to now
+        """
+        if timestamp is None:
+            timestamp = datetime.utcnow()
+        timestamp = int(to_epoch_ns([timestamp])[0])
+        with self.lock:
+            new_channels = [channel for channel in row if channel not in self.channel_ids]
+            if new_channels:
+                with self.connection:
+                    self.channel_ids = add_channels(self.connection, new_channels)
+            for channel, value in row.items():
+                value = _to_float(value)
+                if value is not None:
+                    self.batch.append((timestamp, self.channel_ids[channel], value))
+            if len(self.batch) >= self.batch_rows or monotonic() - self.last_insert >= self.batch_period:
+                self._insert()
+
+    def write_snapshot(self, snapshot):
+        """Poller callback that stores every channel of a Snapshot"""
+        self.write(snapshot.flatten(), snapshot.timestamp)
+
+    def flush(self):
+        """Inserts the collected readings"""
+        with self.lock:
+            self._insert()
+
+    def close(self):
+        with self.lock:
+            if self.connection is None:
+                return
+            self._insert()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_sqlite(path, channels=None, start=None, end=None):
+    """Loads channels of the database between two times
+
+        Args:
+            path (str):
+                database file
+            channels (list):
+                channels to load, all of them if None
+            start (datetime):
+                first UTC time to include, None for the beginning
+            end (datetime):
+                last UTC time to include, None for the end
+
+        Returns:
+            (pandas.DataFrame):
+                timestamp column of datetime64[ns] followed by the channels in time order, NaN where a channel has no
+                reading
+    """
+    connection = connect(path, read_only=True)
+    try:
+        ids = channel_ids(connection)
+        if channels is None:
+            channels = list(ids)
+        start = -2 ** 63 if start is None else int(to_epoch_ns([start])[0])
+        end = 2 ** 63 - 1 if end is None else int(to_epoch_ns([end])[0])
+        frames = []
+        # one range scan of the covering index per channel
+        for channel in channels:
+            if channel not in ids:
+                continue
+            readings = np.array(connection.execute(
+                'SELECT timestamp, value FROM readings WHERE channel_id = ? AND timestamp BETWEEN ? AND ? '
+                'ORDER BY timestamp', (ids[channel], start, end)
+            ).fetchall(), dtype=[('timestamp', np.int64), ('value', np.float64)])
+            frames.append(pd.Series(readings['value'], index=readings['timestamp'], name=channel))
+    finally:
+        connection.close()
+    columns = list(channels)
+    if frames:
+        # a channel written twice at the same time keeps its last value
+        frames = [frame[~frame.index.duplicated(keep='last')] for frame in frames]
+        data = pd.concat(frames, axis=1).sort_index()
+        data = data.reindex(columns=columns)
+    else:
+        data = pd.DataFrame({channel: pd.Series(dtype='float64') for channel in columns})
+    data.insert(0, 'timestamp', pd.to_datetime(data.index.to_numpy(dtype=np.int64), unit='ns'))
+    return data.reset_index(drop=True)
+
+
+def import_tsv(path, database, delimiter='\t'):
+    """Adds a TSV log to the database in one transaction, its timestamps are taken as UTC
+
+        Returns:
+            (int):
+                readings added
+    """
+    data = pd.read_csv(path, delimiter=delimiter)
+    # the first column holds the timestamps, 'timestamp' or 'datetime' depending on the logger
+    timestamps = to_epoch_ns(pd.to_datetime(data.pop(data.columns[0])).to_numpy())
+    connection = connect(database)
+    try:
+        with connection:
+            ids = add_channels(connection, data.columns)
+            count = 0
+            for channel in data.columns:
+                values = pd.to_numeric(data[channel], errors='coerce').to_numpy(dtype=np.float64)
+                rows = ~np.isnan(values)
+                connection.executemany(
+                    'INSERT INTO readings (timestamp, channel_id, value) VALUES (?, ?, ?)',
+                    zip(timestamps[rows].tolist(), [ids[channel]] * int(rows.sum()), values[rows].tolist())
+                )
+                count += int(rows.sum())
+    finally:
+        connection.close()
+    return count
+
+
+if __name__ == '__main__':
+    for tsv_path in sys.argv[2:]:
+        print(tsv_path, import_tsv(tsv_path, sys.argv[1]))
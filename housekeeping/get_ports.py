@@ -1,11 +1,11 @@
 import json
 
-from serial.tools.list_ports import comports
+from housekeeping.instruments.base.port_registry import port_registry
 
 with open('devices.json') as f:
     devices = json.load(f)
 
-comports = comports()
+port_registry.refresh()
 
 devices_flattened = {}
 
@@ -16,11 +16,9 @@ for device_type, device_type_dict in devices.items():
 
 # print(devices_flattened)
 
-comport_dict = {}
-for port in comports:
+for port in port_registry.ports:
     print(port.serial_number, port.device)
-    comport_dict[port.serial_number] = port.device
 
 for device_name, device_dict in devices_flattened.items():
-    port = comport_dict.get(device_dict.get('serial_number', ''), 'no port')
-    print(device_name, port)
+    port = port_registry.by_serial_number.get(device_dict.get('serial_number', ''))
+    print(device_name, 'no port' if port is None else port.device)
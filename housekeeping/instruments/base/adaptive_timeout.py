@@ -0,0 +1,136 @@
+"""
+Read timeouts learned from how long each command actually takes to answer.
+
+With a fixed 2 s timeout an unplugged instrument stalls its poll cycle for 2 s per query. AdaptiveTimeout keeps the
+recent response times of each command and sets the read timeout to a high percentile of them times a multiplier plus a
+margin, so a reading that normally takes 40 ms times out after a few hundred, while a slow command like the Cryotel
+STATUS keeps the time it needs. Until a command has been seen enough times it gets a short initial timeout, or what its
+slowest answer so far needs, and the port's configured timeout is only the ceiling.
+
+A miss doubles the next timeout of that command, up to the ceiling, in case the instrument was merely slow. A reply cut
+short by the timeout is a miss as well. Once the whole device has stopped answering the escalation stops, so a dead
+device keeps failing fast until it comes back, including on commands it never answered.
+"""
+import math
+from collections import deque
+
+
+class CommandTiming:
+    """Recent response times of one command"""
+
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        # consecutive timeouts
+        self.misses = 0
+        # learned timeout before escalation, None until there are enough samples
+        self.learned = None
+
+
+class AdaptiveTimeout:
+
+    def __init__(self, initial=0.5, floor=0.05, ceiling=2.0, percentile=99., multiplier=2., margin=0.1,
+                 min_samples=10, window=100, escalation=2., dead_after=3):
+        """
+        Parameters
+        ----------
+        initial : float
+            timeout in seconds of commands without enough samples yet, raised to what their slowest answer needs
+        floor : float
+            shortest timeout in seconds
+        ceiling : float
+            longest timeout in seconds, usually the port's configured timeout
+        percentile : float
+            percentile of the recent response times to start from
+        multiplier : float
+            the percentile is multiplied by this
+        margin : float
+            seconds added after the multiplier
+        min_samples : int
+            responses to see before a command's timeout is learned
+        window : int
+            responses per command to remember, older ones are forgotten so the timeout follows the instrument
+        escalation : float
+            the timeout is multiplied by this after each consecutive miss of a command
+        dead_after : int
+            consecutive misses across all commands after which the device counts as gone and escalation stops
+        """
+        self.initial = initial
+        self.floor = floor
+        self.ceiling = ceiling
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.margin = margin
+        self.min_samples = min_samples
+        self.window = window
+        self.escalation = escalation
+        self.dead_after = dead_after
+        # {command: CommandTiming}
+        self.commands = {}
+        # consecutive misses of the device, whichever commands they were
+        self.device_misses = 0
+
+    def _get_timing(self, command):
+        timing = self.commands.get(command)
+        if timing is None:
+            timing = self.commands[command] = CommandTiming(self.window)
+        return timing
+
+    def _clamp(self, timeout):
+        return min(max(timeout, self.floor), self.ceiling)
+
+    @property
+    def device_dead(self):
+        return self.device_misses >= self.dead_after
+
+    def _unlearned_timeout(self, timing):
+        """Timeout of a command with too few samples to learn from, enough for the slowest answer seen"""
+        if timing is None or not timing.latencies:
+            return self.initial
+        return max(self.initial, max(timing.latencies) * self.multiplier + self.margin)
+
+    def timeout(self, command):
+        """Read timeout in seconds for the next send of a command"""
+        timing = self.commands.get(command)
+        learned = None if timing is None else timing.learned
+        if self.device_dead:
+            if learned is None:
+                # fail as fast as the slowest command the device used to answer
+                learned_timeouts = [t.learned for t in self.commands.values() if t.learned is not None]
+                learned = max(learned_timeouts) if learned_timeouts else self._unlearned_timeout(timing)
+            return self._clamp(learned)
+        if learned is None:
+            learned = self._unlearned_timeout(timing)
+        misses = 0 if timing is None else timing.misses
+        return self._clamp(learned * self.escalation ** misses)
+
+    def observe(self, command, latency, timed_out):
+        """Records the outcome of a send
+
+            Args:
+                command (str):
+                    command key, see ModifiedGenericInstrument._command_key
+                latency (float):
+                    seconds from sending to the end of the response
+                timed_out (bool):
+                    True if no response, or only part of it, arrived within the timeout
+        """
+        timing = self._get_timing(command)
+        if timed_out:
+            # the latency of a miss is only the timeout, it says nothing about the response time
+            timing.misses += 1
+            self.device_misses += 1
+            return
+        timing.misses = 0
+        self.device_misses = 0
+        timing.latencies.append(latency)
+        if len(timing.latencies) >= self.min_samples:
+            latencies = sorted(timing.latencies)
+            index = max(int(math.ceil(self.percentile / 100. * len(latencies))) - 1, 0)
+            timing.learned = latencies[index] * self.multiplier + self.margin
+
+    def snapshot(self):
+        """Returns {command: current timeout} and whether the device counts as gone"""
+        return {
+            'device_dead': self.device_dead,
+            'timeouts': {command: self.timeout(command) for command in list(self.commands)},
+        }
@@ -0,0 +1,363 @@
+"""
+asyncio backend for ModifiedGenericInstrument drivers.
+
+The blocking backend runs a driver's framing (see housekeeping.instruments.base.exchange) with pyserial calls that
+block a thread until the device answers or the read times out. AsyncSerialTransport runs the same framing on an event
+loop instead, and AsyncInstrument runs a driver's existing command methods on top of it, so one loop does the I/O of
+the whole rack with a bounded timeout on every request:
+
+    async def main():
+        async with AsyncInstrument(Lesker392(serial_number='FT58MCQ8A')) as lesker, \\
+                AsyncInstrument(Model218(serial_number='FT86IZRBA')) as monitor:
+            pressure, temperatures = await asyncio.gather(lesker.get_pressure(), monitor.get_kelvin_reading_all())
+
+AsyncInstrument.query and command run the driver's _query_exchange and _command_exchange framing as coroutines on the
+loop, without a thread. They send the string as it is and skip any driver override of query or command (e.g.
+Model325's padding, the Lake Shore error checks and cache), call those as driver methods to keep them. Any other
+driver method runs once, unchanged, in a thread of the loop's default executor shared by every instrument. Whenever
+the method reaches an exchange, the thread hands it to the event loop and waits for its result, so a method of n
+exchanges costs n round trips and its other work (logging, caches, error windows) happens once, as with the blocking
+backend.
+
+Both are recorded by the driver's instrumentation, with the bytes counted by the transport. The read timeout is the
+transport's, the driver's adaptive timeout isn't used.
+
+While an AsyncInstrument is open it owns the serial port. Blocking calls of the driver's methods from other threads go
+through the event loop as well, calls from the event loop's own thread raise InstrumentException since they would wait
+on themselves.
+"""
+import asyncio
+import functools
+from threading import get_ident
+from time import perf_counter
+
+import serial
+from lakeshore.generic_instrument import InstrumentException
+
+from housekeeping.instruments.base.exchange import Write, ReadUntil, ReadLines, ReadAll, Sleep, ResetInput
+from housekeeping.instruments.base.instrumentation import CommandEvent, TrafficCounter
+
+
+class AsyncSerialTransport:
+    """Runs exchanges over a pyserial port without blocking the event loop"""
+
+    def __init__(self, device_serial, read_timeout=None, poll_interval=0.01):
+        """
+        Parameters
+        ----------
+        device_serial : serial.Serial
+            an open serial port, or any object with the same read/write/in_waiting interface
+        read_timeout : float
+            ceiling on each ReadUntil step in seconds, defaults to the timeout the port was opened with
+        poll_interval : float
+            how often to check for input in seconds when the port can't be watched by the event loop (e.g. on Windows)
+        """
+        self.device_serial = device_serial
+        if read_timeout is None:
+            read_timeout = device_serial.timeout
+        self.read_timeout = read_timeout
+        self.poll_interval = poll_interval
+        self.buffer = bytearray()
+        self.lock = None
+        self.data_received = None
+        self.error = None
+        self._loop = None
+        self._fileno = None
+        self._poll_task = None
+        self._serial_timeout = None
+
+    def open(self):
+        """Starts watching the port, must be called from a running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self.lock = asyncio.Lock()
+        self.data_received = asyncio.Event()
+        # reads only ever take what's already waiting, so the port can be left non-blocking
+        self._serial_timeout = self.device_serial.timeout
+        self.device_serial.timeout = 0
+        try:
+            fileno = self.device_serial.fileno()
+            self._loop.add_reader(fileno, self._read_available)
+            self._fileno = fileno
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            self._poll_task = self._loop.create_task(self._poll())
+
+    def close(self):
+        """Stops watching the port and restores its blocking timeout"""
+        if self._fileno is not None:
+            self._loop.remove_reader(self._fileno)
+            self._fileno = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self._serial_timeout is not None:
+            self.device_serial.timeout = self._serial_timeout
+            self._serial_timeout = None
+
+    def _read_available(self):
+        try:
+            data = self.device_serial.read(self.device_serial.in_waiting or 1)
+        except serial.SerialException as e:
+            # the port went away, stop watching it and fail the pending and following reads
+            self.error = e
+            if self._fileno is not None:
+                self._loop.remove_reader(self._fileno)
+                self._fileno = None
+            data = b''
+        if data:
+            self.buffer += data
+        self.data_received.set()
+
+    async def _poll(self):
+        while True:
+            if self.device_serial.in_waiting:
+                self._read_available()
+            await asyncio.sleep(self.poll_interval)
+
+    def _take(self, size):
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    async def read_until(self, terminator, count=1):
+        """Reads up to and including the count-th terminator, returns what arrived if the read timeout passes first"""
+        deadline = self._loop.time() + self.read_timeout
+        while True:
+            end = 0
+            for _ in range(count):
+                index = self.buffer.find(terminator, end)
+                if index < 0:
+                    break
+                end = index + len(terminator)
+            else:
+                return self._take(end)
+            if self.error is not None:
+                raise self.error
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                return self._take(len(self.buffer))
+            self.data_received.clear()
+            try:
+                await asyncio.wait_for(self.data_received.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def read_all(self):
+        if self.error is not None:
+            raise self.error
+        if self._poll_task is not None and self.device_serial.in_waiting:
+            self._read_available()
+        return self._take(len(self.buffer))
+
+    def reset_input(self):
+        self.buffer.clear()
+        self.device_serial.reset_input_buffer()
+
+    async def _perform(self, step):
+        if isinstance(step, Write):
+            return self.device_serial.write(step.data)
+        elif isinstance(step, ReadUntil):
+            return await self.read_until(step.terminator)
+        elif isinstance(step, ReadLines):
+            return await self.read_until(step.terminator, step.count)
+        elif isinstance(step, ReadAll):
+            return await self.read_all()
+        elif isinstance(step, Sleep):
+            return await asyncio.sleep(step.seconds)
+        elif isinstance(step, ResetInput):
+            return self.reset_input()
+        raise TypeError('Unknown exchange step {!r}'.format(step))
+
+    async def _drive(self, exchange, traffic):
+        result = None
+        while True:
+            try:
+                step = exchange.send(result)
+            except StopIteration as stop:
+                return stop.value
+            result = await self._perform(step)
+            if traffic is None:
+                continue
+            if isinstance(step, Write):
+                traffic.bytes_sent += len(step.data)
+            elif isinstance(result, bytes):
+                traffic.bytes_received += len(result)
+
+    async def run(self, exchange, timeout=None, traffic=None):
+        """Performs one exchange, requests on the same port are run one at a time
+
+            Args:
+                exchange (generator):
+                    see housekeeping.instruments.base.exchange
+                timeout (float):
+                    ceiling on the whole request in seconds, including time spent waiting for the port
+                traffic (instrumentation.TrafficCounter):
+                    if given, bytes_sent and bytes_received are incremented with the bytes written and read
+
+            Returns:
+                the exchange's result
+        """
+        try:
+            return await asyncio.wait_for(self._run_locked(exchange, traffic), timeout)
+        except asyncio.TimeoutError:
+            raise InstrumentException("Communication timed out")
+        finally:
+            exchange.close()
+
+    async def _run_locked(self, exchange, traffic):
+        async with self.lock:
+            return await self._drive(exchange, traffic)
+
+
+class AsyncInstrument:
+    """
+    Wraps a connected driver so its methods can be awaited. Any method of the driver can be called through the
+    wrapper, `await wrapper.get_pressure()` runs Lesker392.get_pressure unchanged with its serial I/O performed by an
+    AsyncSerialTransport. `await wrapper.query('PR1')` sends the query from the event loop itself.
+    """
+
+    def __init__(self, instrument, timeout=None, read_timeout=None, poll_interval=0.01):
+        """
+        Parameters
+        ----------
+        instrument : ModifiedGenericInstrument
+            a driver connected over serial
+        timeout : float
+            ceiling in seconds on each request to the instrument, None for no ceiling beyond the read timeout
+        read_timeout : float
+            see AsyncSerialTransport
+        poll_interval : float
+            see AsyncSerialTransport
+        """
+        self.instrument = instrument
+        self.timeout = timeout
+        self.transport = AsyncSerialTransport(instrument.device_serial, read_timeout, poll_interval)
+        self._loop = None
+        self._loop_thread = None
+
+    async def open(self):
+        self.transport.open()
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = get_ident()
+        self.instrument._exchange_runner = self._run_exchange
+        return self
+
+    async def close(self):
+        self.instrument._exchange_runner = None
+        self.transport.close()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def call(self, method, *args, **kwargs):
+        """Runs a blocking driver method in the event loop's default executor, its exchanges on the event loop
+
+            Args:
+                method (str or callable):
+                    name of the driver method, or the bound method itself
+                args, kwargs:
+                    passed to the method
+
+            Returns:
+                whatever the method returns
+        """
+        if isinstance(method, str):
+            method = getattr(self.instrument, method)
+        return await self._loop.run_in_executor(None, functools.partial(method, *args, **kwargs))
+
+    def _run_exchange(self, exchange, traffic=None):
+        """Performs an exchange of a driver method on the event loop and waits for its result, errors are raised inside
+        the method where it can handle them like blocking failures"""
+        if get_ident() == self._loop_thread:
+            exchange.close()
+            raise InstrumentException(
+                'Blocking call of {} from the event loop, await the AsyncInstrument instead'.format(
+                    self.instrument.get_instrument_name()
+                )
+            )
+        return asyncio.run_coroutine_threadsafe(
+            self.transport.run(exchange, self.timeout, traffic), self._loop
+        ).result()
+
+    async def query(self, query_string, *args, **kwargs):
+        """Sends a query from the event loop and returns the response, see the module docstring for what it skips
+
+            Args:
+                query_string (str):
+                    A serial query ending in a question mark
+                args, kwargs:
+                    passed on to the driver's _query_exchange
+        """
+        return await self._send(query_string, self.instrument._query_exchange(query_string, *args, **kwargs), True)
+
+    async def command(self, command_string):
+        """Sends a command from the event loop, see the module docstring for what it skips"""
+        await self._send(command_string, self.instrument._command_exchange(command_string), False)
+
+    async def _send(self, string, exchange, is_query):
+        instrument = self.instrument
+        recording = instrument.instrumentation is not None
+        traffic = TrafficCounter() if recording else None
+        # the exchange starts once the transport's lock is held
+        started = []
+
+        def timed_exchange():
+            started.append(perf_counter())
+            return (yield from exchange)
+
+        wait_start = perf_counter()
+        error = None
+        try:
+            return await self.transport.run(timed_exchange(), self.timeout, traffic)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            exchange.close()
+            if recording:
+                end = perf_counter()
+                start = started[0] if started else end
+                instrument.instrumentation.record(CommandEvent(
+                    device=instrument.get_instrument_name(),
+                    command=instrument._command_key(string),
+                    is_query=is_query,
+                    latency=end - start,
+                    lock_wait=start - wait_start,
+                    bytes_sent=traffic.bytes_sent,
+                    bytes_received=traffic.bytes_received,
+                    timed_out=instrument._is_timeout(error),
+                    error=error
+                ))
+
+    def __getattr__(self, name):
+        attribute = getattr(self.instrument, name)
+        if not callable(attribute):
+            return attribute
+
+        async def method(*args, **kwargs):
+            return await self.call(attribute, *args, **kwargs)
+        method.__name__ = name
+        method.__doc__ = attribute.__doc__
+        return method
+
+
+async def gather_calls(instruments, method, *args, **kwargs):
+    """Calls the same method on several AsyncInstruments at once
+
+        Args:
+            instruments (dict):
+                {device_name: AsyncInstrument}
+            method (str):
+                name of the driver method to call
+
+        Returns:
+            (dict):
+                {device_name: result}, the result is the exception instead for devices that failed
+    """
+    names = list(instruments)
+    results = await asyncio.gather(
+        *[instruments[name].call(method, *args, **kwargs) for name in names], return_exceptions=True
+    )
+    return dict(zip(names, results))
@@ -0,0 +1,91 @@
+"""
+Serial framing steps shared by the pyserial and asyncio transports.
+
+A driver describes a query as a generator (an exchange) that yields the I/O steps below and receives their results,
+for example
+
+    def _query_exchange(self, query):
+        yield Write(query.encode('ascii') + b'\\r\\n')
+        response = yield ReadUntil(b'\\r\\n')
+        return response.decode('ascii').rstrip()
+
+The transport that drives the generator decides whether each step blocks a thread or awaits an event loop, so the
+framing only has to be written once per driver.
+"""
+from collections import namedtuple
+from time import sleep, monotonic
+
+# Send bytes to the instrument, result is None
+Write = namedtuple('Write', 'data')
+# Read until the terminator or the read timeout, result is the bytes read (partial or empty on timeout)
+ReadUntil = namedtuple('ReadUntil', 'terminator')
+# Read until count terminators have arrived, the read timeout is a ceiling on the whole read rather than on each line.
+# Result is the bytes read (fewer lines on timeout)
+ReadLines = namedtuple('ReadLines', 'terminator count')
+# Read whatever is already waiting in the input buffer, result is bytes
+ReadAll = namedtuple('ReadAll', '')
+# Wait without touching the port, result is None
+Sleep = namedtuple('Sleep', 'seconds')
+# Throw away anything waiting in the input buffer, result is None
+ResetInput = namedtuple('ResetInput', '')
+
+
+def read_serial_lines(device_serial, terminator, count):
+    """Blocking implementation of ReadLines"""
+    timeout = device_serial.timeout
+    if timeout is not None:
+        deadline = monotonic() + timeout
+    data = b''
+    try:
+        for _ in range(count):
+            if timeout is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                device_serial.timeout = remaining
+            line = device_serial.read_until(terminator)
+            data += line
+            if not line.endswith(terminator):
+                break
+    finally:
+        device_serial.timeout = timeout
+    return data
+
+
+def run_serial_exchange(exchange, device_serial, traffic=None):
+    """Drives an exchange with a blocking pyserial connection and returns its result
+
+        Args:
+            exchange (generator):
+                the driver's framing
+            device_serial (serial.Serial):
+                open connection to the instrument
+            traffic (instrumentation.TrafficCounter):
+                if given, bytes_sent and bytes_received are incremented with the bytes written and read
+    """
+    result = None
+    while True:
+        try:
+            step = exchange.send(result)
+        except StopIteration as stop:
+            return stop.value
+        if isinstance(step, Write):
+            result = device_serial.write(step.data)
+            if traffic is not None:
+                traffic.bytes_sent += len(step.data)
+            continue
+        if isinstance(step, ReadUntil):
+            result = device_serial.read_until(step.terminator)
+        elif isinstance(step, ReadLines):
+            result = read_serial_lines(device_serial, step.terminator, step.count)
+        elif isinstance(step, ReadAll):
+            result = device_serial.read_all()
+        elif isinstance(step, Sleep):
+            result = sleep(step.seconds)
+        elif isinstance(step, ResetInput):
+            result = device_serial.reset_input_buffer()
+        else:
+            exchange.close()
+            raise TypeError('Unknown exchange step {!r}'.format(step))
+        if traffic is not None and result:
+            traffic.bytes_received += len(result)
@@ -0,0 +1,169 @@
+"""
+Per-command timing and traffic statistics for the drivers.
+
+Every query and command sent through ModifiedGenericInstrument is recorded by its instrumentation as a CommandEvent.
+The default Instrumentation keeps log-bucketed histograms of latency and dut_lock wait time plus timeout, error, retry
+and byte counters for each (device, command) pair, and passes each event on to any hooks added to it:
+
+    from housekeeping.instruments.base.instrumentation import instrumentation
+    instrumentation.add_hook(lambda event: print(event.device, event.command, event.latency))
+    ...
+    for device, commands in instrumentation.snapshot().items():
+        for command, stats in commands.items():
+            print(device, command, stats['latency']['p99'], stats['timeouts'])
+
+Calls made through the asyncio backend (see housekeeping.instruments.base.async_transport) are recorded as well. Driver
+methods count the hand over of each exchange to the event loop in their latency, queries and commands sent from the
+loop count the wait for the port in their lock wait.
+"""
+import bisect
+import math
+from collections import namedtuple
+from threading import Lock
+
+CommandEvent = namedtuple(
+    'CommandEvent',
+    'device command is_query latency lock_wait bytes_sent bytes_received timed_out error'
+)
+CommandEvent.__doc__ = """One query or command. Times are in seconds, error is the exception raised or None"""
+
+
+class Histogram:
+    """Counts values in logarithmically spaced buckets, so recording is cheap and percentiles are within one bucket"""
+
+    def __init__(self, lowest=1e-5, highest=100., buckets_per_decade=10):
+        decades = math.log10(highest / lowest)
+        self.bounds = [lowest * 10 ** (i / buckets_per_decade)
+                       for i in range(int(round(decades * buckets_per_decade)) + 1)]
+        # one more bucket for values above the highest bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.
+        self.minimum = None
+        self.maximum = None
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile, None if nothing was recorded"""
+        if not self.count:
+            return None
+        rank = q / 100. * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                bound = self.bounds[index] if index < len(self.bounds) else self.maximum
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.minimum,
+            'max': self.maximum,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class CommandStats:
+    """Statistics of one command on one device"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.lock_wait = Histogram()
+        self.timeouts = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def record(self, event):
+        self.latency.record(event.latency)
+        self.lock_wait.record(event.lock_wait)
+        self.bytes_sent += event.bytes_sent
+        self.bytes_received += event.bytes_received
+        if event.timed_out:
+            self.timeouts += 1
+        elif event.error is not None:
+            self.errors += 1
+
+    def as_dict(self):
+        return {
+            'latency': self.latency.as_dict(),
+            'lock_wait': self.lock_wait.as_dict(),
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'retries': self.retries,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+        }
+
+
+class Instrumentation:
+    """Collects CommandEvents into CommandStats and hands them to the hooks"""
+
+    def __init__(self):
+        self.lock = Lock()
+        # {(device, command): CommandStats}
+        self.stats = {}
+        self.hooks = []
+
+    def add_hook(self, hook):
+        """hook(event) is called with every CommandEvent, from the thread that sent the command"""
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def _get_stats(self, device, command):
+        key = (device, command)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = CommandStats()
+        return stats
+
+    def record(self, event):
+        with self.lock:
+            self._get_stats(event.device, event.command).record(event)
+        for hook in self.hooks:
+            hook(event)
+
+    def record_retry(self, device, command):
+        """Counts a command, or e.g. a connection attempt, that had to be tried again"""
+        with self.lock:
+            self._get_stats(device, command).retries += 1
+
+    def snapshot(self):
+        """Returns {device: {command: statistics}} as plain dictionaries"""
+        with self.lock:
+            snapshot = {}
+            for (device, command), stats in self.stats.items():
+                snapshot.setdefault(device, {})[command] = stats.as_dict()
+        return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+
+class TrafficCounter:
+    """Bytes moved by one query or command"""
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+# shared by every instrument in the process
+instrumentation = Instrumentation()
@@ -1,11 +1,36 @@
 import serial
-from time import sleep
+from time import sleep, perf_counter
 
-from lakeshore.generic_instrument import GenericInstrument, comports, InstrumentException
+from lakeshore.generic_instrument import GenericInstrument, InstrumentException
+
+from housekeeping.instruments.base.adaptive_timeout import AdaptiveTimeout
+from housekeeping.instruments.base.exchange import Write, ReadUntil, run_serial_exchange
+from housekeeping.instruments.base.instrumentation import CommandEvent, TrafficCounter, instrumentation
+from housekeeping.instruments.base.port_registry import port_registry
+from housekeeping.instruments.base.reading_schema import ReadingSchema
 
 
 class ModifiedGenericInstrument(GenericInstrument):
     # vid_pid = (1659, 8963)
+    # set by AsyncInstrument while it is open, performs the exchanges on its event loop
+    _exchange_runner = None
+    # records every query and command, see housekeeping.instruments.base.instrumentation. Can be replaced per instance,
+    # None turns recording off
+    instrumentation = instrumentation
+    # device key of the recorded statistics, defaults to the class name and port
+    instrument_name = None
+    # bytes moved by the query or command in progress, while dut_lock is held
+    _traffic = None
+    # learned read timeouts, see housekeeping.instruments.base.adaptive_timeout. None keeps the port's own timeout
+    adaptive_timeout = None
+    # the last query timed out, its answer may still turn up in the input buffer
+    _missed_reply = False
+    # set by a driver's framing when the read timed out part way through the reply, counted as a timeout
+    _short_reply = False
+    # channels returned by read_values, see housekeeping.instruments.base.reading_schema
+    reading_schema = ReadingSchema(())
+    _prefixed_reading_schema = None
+
     def __init__(self,
                  serial_number=None,
                  com_port=None,
@@ -26,6 +51,118 @@ class ModifiedGenericInstrument(GenericInstrument):
             serial_number, com_port, baud_rate, data_bits, stop_bits, parity, flow_control, handshaking, timeout,
             ip_address, tcp_port, connection
         )
+        if self.device_serial is not None and self.device_serial.timeout is not None:
+            self.adaptive_timeout = AdaptiveTimeout(ceiling=self.device_serial.timeout)
+
+    def command(self, command_string):
+        """Send a command to the instrument
+
+            Args:
+                command_string (str):
+                    A serial command
+        """
+        self._send(command_string, False)
+        self.logger.info('Sent command to %s: %s', self.serial_number, command_string)
+
+    def query(self, query_string, *args, **kwargs):
+        """Send a query to the instrument and return the response
+
+            Args:
+                query_string (str):
+                    A serial query ending in a question mark
+                args, kwargs:
+                    passed on to the driver's _query_exchange
+
+            Returns:
+               The instrument query response as a string.
+        """
+        response = self._send(query_string, True, *args, **kwargs)
+        self.logger.info('Sent query to %s: %s', self.serial_number, query_string)
+        self.logger.info('Received response from %s: %s', self.serial_number, response)
+        return response
+
+    def _send(self, string, is_query, *args, **kwargs):
+        wait_start = perf_counter()
+        with self.dut_lock:
+            start = perf_counter()
+            command_key = self._command_key(string)
+            recording = self.instrumentation is not None
+            self._traffic = TrafficCounter() if recording else None
+            self._short_reply = False
+            configured_timeout = self._apply_adaptive_timeout(command_key) if is_query else None
+            error = None
+            try:
+                # Query the instrument over serial. If serial is not configured, use TCP.
+                if self.device_serial is not None:
+                    if is_query:
+                        return self._usb_query(string, *args, **kwargs)
+                    return self._usb_command(string)
+                if self.device_tcp is not None:
+                    if is_query:
+                        return self._tcp_query(string)
+                    return self._tcp_command(string)
+                raise InstrumentException("No connections configured")
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                latency = perf_counter() - start
+                timed_out = self._is_timeout(error) or self._short_reply
+                traffic, self._traffic = self._traffic, None
+                if configured_timeout is not None:
+                    if self.device_serial.timeout != configured_timeout:
+                        self.device_serial.timeout = configured_timeout
+                    self.adaptive_timeout.observe(command_key, latency, timed_out)
+                    self._missed_reply = timed_out
+                if recording:
+                    self.instrumentation.record(CommandEvent(
+                        device=self.get_instrument_name(),
+                        command=command_key,
+                        is_query=is_query,
+                        latency=latency,
+                        lock_wait=start - wait_start,
+                        bytes_sent=traffic.bytes_sent,
+                        bytes_received=traffic.bytes_received,
+                        timed_out=timed_out,
+                        error=error
+                    ))
+
+    def _apply_adaptive_timeout(self, command_key):
+        """Sets the port's read timeout for a query, returns the timeout to restore afterwards or None"""
+        # the event loop's transport has its own read timeout
+        if self.adaptive_timeout is None or self.device_serial is None or self._exchange_runner is not None:
+            return None
+        if self._missed_reply:
+            # drop a late answer to the query that timed out before it's taken for this one's
+            self.device_serial.reset_input_buffer()
+        configured_timeout = self.device_serial.timeout
+        timeout = self.adaptive_timeout.timeout(command_key)
+        # pyserial reconfigures the port on every assignment
+        if timeout != configured_timeout:
+            self.device_serial.timeout = timeout
+        return configured_timeout
+
+    def get_instrument_name(self):
+        """Name the instrumentation files this instrument's statistics under"""
+        if self.instrument_name is not None:
+            return self.instrument_name
+        if self.device_serial is not None:
+            return '{}@{}'.format(type(self).__name__, self.device_serial.port)
+        return '{}@{}'.format(type(self).__name__, self.serial_number)
+
+    @staticmethod
+    def _command_key(string):
+        """
+        The command a query or command is counted under, its mnemonic without arguments, e.g. KRDG? for "KRDG? 1" and
+        TTARGET for "TTARGET=77". Chained commands keep every mnemonic.
+        """
+        return ';'.join(part.strip().split(' ')[0].split('=')[0] for part in string.split(';'))
+
+    @staticmethod
+    def _is_timeout(error):
+        if isinstance(error, serial.SerialTimeoutException):
+            return True
+        return isinstance(error, InstrumentException) and 'timed out' in str(error)
 
     def _get_identity(self):
         serial_number = 'xxxx'
@@ -34,17 +171,18 @@ class ModifiedGenericInstrument(GenericInstrument):
         firmware_version = 'xxxx'
         return serial_number, model_number, serial_string, firmware_version
 
-    def _usb_command(self, command):
-        """Send a command over the serial USB connection"""
-        self.device_serial.write(command.encode('ascii') + self.serial_cmd_termination)
+    def _encode_command(self, command):
+        return command.encode('ascii') + self.serial_cmd_termination
 
-    def _usb_query(self, query):
-        """Query over the serial USB connection"""
+    def _command_exchange(self, command):
+        """Framing of a command, see housekeeping.instruments.base.exchange"""
+        yield Write(self._encode_command(command))
 
-        self._usb_command(query)
-        # sleep(1)
-        # response = self.device_serial.read(5)
-        response = self.device_serial.read_until(self.serial_cmd_termination).decode('ascii')
+    def _query_exchange(self, query):
+        """Framing of a query, see housekeeping.instruments.base.exchange"""
+
+        yield from self._command_exchange(query)
+        response = (yield ReadUntil(self.serial_cmd_termination)).decode('ascii')
 
         # If nothing is returned, raise a timeout error.
         if not response:
@@ -52,40 +190,57 @@ class ModifiedGenericInstrument(GenericInstrument):
 
         return response.rstrip()
 
+    def _run_exchange(self, exchange):
+        if self._exchange_runner is not None:
+            return self._exchange_runner(exchange, self._traffic)
+        return run_serial_exchange(exchange, self.device_serial, self._traffic)
+
+    def _usb_command(self, command):
+        """Send a command over the serial USB connection"""
+        self._run_exchange(self._command_exchange(command))
+
+    def _usb_query(self, query, *args, **kwargs):
+        """Query over the serial USB connection"""
+        return self._run_exchange(self._query_exchange(query, *args, **kwargs))
+
     def connect_usb(self, serial_number=None, com_port=None, baud_rate=None, data_bits=None,
                     stop_bits=None, parity=None, timeout=None, handshaking=None, flow_control=None):
         """Establish a serial USB connection"""
 
-        # Scan the ports for devices matching the VID and PID combos of the instrument
-        for port in comports():
-            if ((port.vid, port.pid) in self.vid_pid) or not self.vid_pid:
-                # If the com port argument is passed, check for a match
-                if port.device == com_port or com_port is None:
-                    # If the serial number argument is passed, check for a match
-                    if port.serial_number == serial_number or serial_number is None:
-                        # Establish a connection with device using the instrument's serial communications parameters
-                        self.device_serial = serial.Serial(port.device,
-                                                           baudrate=baud_rate,
-                                                           bytesize=data_bits,
-                                                           stopbits=stop_bits,
-                                                           xonxoff=handshaking,
-                                                           timeout=timeout,
-                                                           parity=parity,
-                                                           rtscts=flow_control)
-
-                        # Send the instrument a line break, wait 100ms, and clear the input buffer so that
-                        # any leftover communications from a prior session don't gum up the works
-                        self.device_serial.write(self.serial_cmd_termination)
-                        sleep(0.1)
-                        self.device_serial.reset_input_buffer()
-
-                        break
-        else:
+        # Look up a port matching the VID and PID combos of the instrument, the COM port and the serial number
+        port = port_registry.find(serial_number, com_port, self.vid_pid)
+        if port is None:
             if com_port is None and serial_number is None:
                 raise InstrumentException("No serial connections found")
 
             raise InstrumentException(
                 "No serial connections found with a matching COM port and/or matching serial number")
 
+        # Establish a connection with device using the instrument's serial communications parameters
+        self.device_serial = serial.Serial(port.device,
+                                           baudrate=baud_rate,
+                                           bytesize=data_bits,
+                                           stopbits=stop_bits,
+                                           xonxoff=handshaking,
+                                           timeout=timeout,
+                                           parity=parity,
+                                           rtscts=flow_control)
+
+        # Send the instrument a line break, wait 100ms, and clear the input buffer so that
+        # any leftover communications from a prior session don't gum up the works
+        self.device_serial.write(self.serial_cmd_termination)
+        sleep(0.1)
+        self.device_serial.reset_input_buffer()
+
+    def get_reading_schema(self):
+        """reading_schema with the class name in front of every channel, as in log_dict"""
+        if self._prefixed_reading_schema is None:
+            self._prefixed_reading_schema = self.reading_schema.prefixed(self.__class__.__name__)
+        return self._prefixed_reading_schema
+
+    def read_values(self):
+        """Reads every channel of reading_schema, returns their values as a tuple in the same order"""
+        return ()
+
     def log_dict(self):
-        return {}
+        return self.get_reading_schema().as_dict(self.read_values())
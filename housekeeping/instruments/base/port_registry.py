@@ -0,0 +1,81 @@
+from threading import RLock
+
+from serial.tools.list_ports import comports
+
+
+class PortRegistry:
+    """
+    Enumerates the serial ports once and indexes them by serial number, device name and (VID, PID), so bringing up a
+    whole fleet doesn't rescan every port for every instrument. Call refresh() after plugging in new adapters, find()
+    also refreshes once on its own when nothing matches.
+    """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.ports = []
+        self.by_serial_number = {}
+        self.by_device = {}
+        self.by_vid_pid = {}
+        self.enumerated = False
+
+    def refresh(self):
+        """Re-enumerates the serial ports and rebuilds the indexes"""
+        with self.lock:
+            self.ports = comports()
+            self.by_serial_number = {}
+            self.by_device = {}
+            self.by_vid_pid = {}
+            for port in self.ports:
+                if port.serial_number is not None:
+                    self.by_serial_number.setdefault(port.serial_number, port)
+                self.by_device[port.device] = port
+                self.by_vid_pid.setdefault((port.vid, port.pid), []).append(port)
+            self.enumerated = True
+
+    def _find(self, serial_number, com_port, vid_pid):
+        if serial_number is not None:
+            port = self.by_serial_number.get(serial_number)
+            candidates = [port] if port is not None else []
+        elif com_port is not None:
+            port = self.by_device.get(com_port)
+            candidates = [port] if port is not None else []
+        elif vid_pid:
+            candidates = [port for key in vid_pid for port in self.by_vid_pid.get(tuple(key), [])]
+        else:
+            candidates = self.ports
+        for port in candidates:
+            if vid_pid and (port.vid, port.pid) not in vid_pid:
+                continue
+            if com_port is not None and port.device != com_port:
+                continue
+            return port
+        return None
+
+    def find(self, serial_number=None, com_port=None, vid_pid=None):
+        """Returns the first port matching every criterion given
+
+            Args:
+                serial_number (str):
+                    USB serial number of the adapter
+                com_port (str):
+                    device name, e.g. COM5 or /dev/ttyUSB0
+                vid_pid (list):
+                    (VID, PID) tuples the port may have, any port matches if empty or None
+
+            Returns:
+                (serial.tools.list_ports_common.ListPortInfo or None)
+        """
+        with self.lock:
+            if not self.enumerated:
+                self.refresh()
+                return self._find(serial_number, com_port, vid_pid)
+            port = self._find(serial_number, com_port, vid_pid)
+            if port is None:
+                # the adapter may have been plugged in since the last scan
+                self.refresh()
+                port = self._find(serial_number, com_port, vid_pid)
+            return port
+
+
+# shared by every instrument in the process
+port_registry = PortRegistry()
@@ -0,0 +1,58 @@
+"""
+Channels each driver reads in one acquisition, declared once.
+
+A driver lists its channels as a ReadingSchema and returns their values from read_values() as a tuple in that order.
+Consumers size their storage from the schema once and then copy rows, with no per-sample dictionaries or key lookups:
+
+    schema = monitor.get_reading_schema()
+    readings = schema.allocate(17280)
+    for row in range(len(readings)):
+        readings[row] = monitor.read_values()
+    readings['Model218_ch1'], schema.units
+
+log_dict() is built from the same schema, so its keys stay what they were.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+Channel = namedtuple('Channel', 'name unit dtype')
+Channel.__new__.__defaults__ = (None, 'f8')
+Channel.__doc__ = """One value of a reading: its name, unit (None if set on the instrument) and NumPy dtype"""
+
+
+class ReadingSchema:
+    """Ordered channels of a reading"""
+
+    def __init__(self, channels):
+        self.channels = tuple(Channel(*channel) if isinstance(channel, tuple) else Channel(channel)
+                              for channel in channels)
+        self.names = tuple(channel.name for channel in self.channels)
+        self.units = tuple(channel.unit for channel in self.channels)
+        self.dtype = np.dtype([(channel.name, channel.dtype) for channel in self.channels])
+        # the values of a failed or skipped reading
+        self.missing = tuple(np.nan if np.dtype(channel.dtype).kind == 'f' else 0 for channel in self.channels)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def prefixed(self, prefix):
+        """Returns the schema with '{prefix}_' in front of every channel name"""
+        return ReadingSchema(channel._replace(name='{}_{}'.format(prefix, channel.name)) for channel in self.channels)
+
+    @classmethod
+    def concatenate(cls, schemas):
+        """Joins schemas, e.g. of every device in a fleet, into one"""
+        return cls(channel for schema in schemas for channel in schema)
+
+    def allocate(self, rows):
+        """Returns a record array of rows readings, filled with the missing values"""
+        array = np.empty(rows, self.dtype)
+        array[:] = self.missing
+        return array
+
+    def as_dict(self, values):
+        return dict(zip(self.names, values))
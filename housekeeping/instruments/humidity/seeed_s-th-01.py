@@ -64,6 +64,7 @@ class SeeedSTH01(ModifiedGenericInstrument):
         _dict = {}
         prefix = self.__class__.__name__
         _dict["{}_pressure_mBar".format(prefix)] = self.get_pressure()
+        return _dict
 
 
 # if __name__ == '__main__':
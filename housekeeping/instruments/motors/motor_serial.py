@@ -1,4 +1,4 @@
-import sys
+import logging
 
 import serial
 from datetime import datetime as dt
@@ -6,10 +6,12 @@ from time import sleep
 from collections import OrderedDict
 
 import numpy as np
-from lakeshore.generic_instrument import InstrumentException
 
+from housekeeping.instruments.base.exchange import ReadAll, ReadUntil, Sleep
 from housekeeping.instruments.base.modified_generic_instrument import ModifiedGenericInstrument
 
+logger = logging.getLogger(__name__)
+
 
 def calculate_move_time(steps, speed, acceleration):
     a_time = speed / acceleration
@@ -74,47 +76,37 @@ class BaseMotorCom(ModifiedGenericInstrument):
                The instrument query response as a string.
 
         """
+        return super(BaseMotorCom, self).query(query_string, timeout_s, end_statements)
 
-        # Query the instrument over serial. If serial is not configured, use TCP.
-        with self.dut_lock:
-            if self.device_serial is not None:
-                response = self._usb_query(query_string, timeout_s, end_statements)
-            elif self.device_tcp is not None:
-                response = self._tcp_query(query_string)
-            else:
-                raise InstrumentException("No connections configured")
-
-            self.logger.info('Sent query to %s: %s', self.serial_number, query_string)
-            self.logger.info('Received response from %s: %s', self.serial_number, response)
-
-        return response
-
-    def _usb_query(self, query, timeout_s=1.0, end_statements=('EOR', 'com_fail')):
-        print(query)
-        print(timeout_s)
-        self.device_serial.read_all()  # clear cache
+    @staticmethod
+    def _command_key(string):
+        # moves are counted per motor, M0 to M3, without their steps, speed and acceleration
+        return string[:2]
+
+    def _query_exchange(self, query, timeout_s=1.0, end_statements=('EOR', 'com_fail')):
+        """Framing of a query, see housekeeping.instruments.base.exchange"""
+        logger.debug('%s, timeout %s s', query, timeout_s)
+        yield ReadAll()  # clear cache
         response = ''
         total_seconds = 0
-        self._usb_command(query)
-        sleep(1)
+        yield from self._command_exchange(query)
+        yield Sleep(1)
         start = dt.now()
         while total_seconds < timeout_s:
             # print(total_seconds)
             # sleep(0.1)
-            line = self.device_serial.readline()
+            line = yield ReadUntil(b'\n')
             line = line.decode('ascii')
             response += line
             line = line.strip()
             if line:
-                print(line)
-            else:
-                sys.stdout.write('.')
+                logger.debug(line)
             end_line = False
             for end_statement in end_statements:
                 if line.startswith(end_statement):
                     end_line = True
             if end_line:
-                response += self.device_serial.readline().decode('ascii')
+                response += (yield ReadUntil(b'\n')).decode('ascii')
                 break
             total_seconds = (dt.now() - start).total_seconds()
         return response
@@ -159,7 +151,7 @@ class BaseMotorCom(ModifiedGenericInstrument):
             _dict['move_type'] = 'R'
         _cmd = 'M{motor_number}1{direction}{move_type}{steps}:{speed}:{acceleration}'
         _cmd_str = _cmd.format(**_dict)
-        print(_cmd_str)
+        logger.info('Moving motor %s: %s', motor_number, _cmd_str)
         total_move_time = calculate_move_time(abs(steps), speed, acceleration)
         timeout = total_move_time + buffer_time
         response = self.query(_cmd_str, timeout_s=timeout)
@@ -206,7 +198,7 @@ class LinearStageMotorCom(BaseMotorCom):
 
     def home(self, motor_number):
         steps = self.move(motor_number, -10000, 50, 100, switch_move=True)
-        print("home", steps)
+        logger.info('Homed motor %s after %s steps', motor_number, steps)
         self.position_steps[motor_number] = 0
 
 
@@ -1,13 +1,16 @@
 import numpy as np
 import serial
-import os
 from time import sleep
-from datetime import date, datetime
+from datetime import datetime
 
+from housekeeping.acquisition.log_writer import LogWriter
 from housekeeping.instruments.base.modified_generic_instrument import ModifiedGenericInstrument
+from housekeeping.instruments.base.reading_schema import Channel, ReadingSchema
 
 
 class Lesker392(ModifiedGenericInstrument):
+    reading_schema = ReadingSchema([Channel('pressure_mBar', 'mbar')])
+
     def __init__(self,
                  serial_number=None,
                  com_port=None,
@@ -61,10 +64,9 @@ class Lesker392(ModifiedGenericInstrument):
     def set_ion_gauge_off(self):
         self.query("#01IG0")
 
-    def log_dict(self):
-        _dict = {}
-        prefix = self.__class__.__name__
-        _dict["{}_pressure_mBar".format(prefix)] = self.get_pressure()  # TODO: generalize for external gauge connection
+    def read_values(self):
+        # TODO: generalize for external gauge connection
+        return self.get_pressure(),
 
 
 if __name__ == '__main__':
@@ -72,27 +74,19 @@ if __name__ == '__main__':
     lesker = Lesker392(com_port='COM20')
     # sleep(2)
     print(lesker.get_pressure())
-    save_file = date.isoformat(date.today()) + '.tsv'
-    header = 'timestamp\t' + 'system_mbar\t' + 'ion_gauge_mbar\t' + 'cg1_mbar\t' + 'cg2_mbar' + '\n'
-    if not os.path.isfile(save_file):
-        with open(save_file, 'w') as f:
-            f.write(header)
     lesker.set_ion_gauge_off()
     sleep(5)
     lesker.set_ion_gauge_on()
     sleep(5)
-    while True:
-        timestamp = datetime.now()
-        pressure = lesker.get_pressure()
-        ion_gauge_pressure = lesker.get_pressure_ig()
-        # cg1_pressure = lesker.get_pressure_cg1()
-        # cg2_pressure = lesker.get_pressure_cg2()
-        cg1_pressure = np.nan
-        cg2_pressure = np.nan
-        writeline = datetime.isoformat(timestamp) + '\t' + str(pressure) + '\t' + str(ion_gauge_pressure) + '\t' + \
-            str(cg1_pressure) + '\t' + str(cg2_pressure) + '\n'
-        print(writeline.strip()),
-        # print(monitor.query('IEEE?'))
-        with open(save_file, 'a') as f:
-            f.write(writeline)
-        sleep(5)
+    with LogWriter(columns=['system_mbar', 'ion_gauge_mbar', 'cg1_mbar', 'cg2_mbar']) as writer:
+        while True:
+            timestamp = datetime.utcnow()
+            pressure = lesker.get_pressure()
+            ion_gauge_pressure = lesker.get_pressure_ig()
+            # cg1_pressure = lesker.get_pressure_cg1()
+            # cg2_pressure = lesker.get_pressure_cg2()
+            cg1_pressure = np.nan
+            cg2_pressure = np.nan
+            print(writer.write([pressure, ion_gauge_pressure, cg1_pressure, cg2_pressure], timestamp))
+            # print(monitor.query('IEEE?'))
+            sleep(5)
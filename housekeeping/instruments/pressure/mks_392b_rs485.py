@@ -1,9 +1,13 @@
 import serial
 
-from housekeeping.instruments.base.modified_generic_instrument import ModifiedGenericInstrument, InstrumentException
+from housekeeping.instruments.base.modified_generic_instrument import ModifiedGenericInstrument
+from housekeeping.instruments.base.reading_schema import Channel, ReadingSchema
 
 
 class MKS392BRS485(ModifiedGenericInstrument):
+    # in the units selected on the gauge
+    reading_schema = ReadingSchema([Channel('pressure')])
+
     def __init__(self,
                  serial_number=None,
                  com_port=None,
@@ -17,7 +21,7 @@ class MKS392BRS485(ModifiedGenericInstrument):
                  ip_address=None,
                  tcp_port=7777,
                  connection=None,
-                 serial_cmd_termination='\f',
+                 serial_cmd_termination=';FF',
                  address=253):
         super(MKS392BRS485, self).__init__(
             serial_number=serial_number,
@@ -36,25 +40,15 @@ class MKS392BRS485(ModifiedGenericInstrument):
         )
         self.address = address
 
-    def _usb_command(self, command):
-        """Send a command over the serial USB connection"""
+    def _encode_command(self, command):
+        # frames are @<address><command>;FF, where FF are the two characters rather than a form feed
         prefix = '@{}'.format(self.address).encode()
-        suffix = ';'.encode()
-        self.device_serial.write(prefix + command.encode() + suffix + self.serial_cmd_termination)
-
-    def _usb_query(self, query):
-        """Query over the serial USB connection."""
-
-        self._usb_command(query)
-        response = self.device_serial.read_until(self.serial_cmd_termination).decode()
-
-        # If nothing is returned, raise a timeout error.
-        if not response:
-            raise InstrumentException("Communication timed out")
-
-        return response.rstrip()
+        return prefix + command.encode() + self.serial_cmd_termination
 
     def get_pressure(self):
         return self.query('PR4?')
 
-
+    def read_values(self):
+        # responses are framed as @<address>ACK<value>;FF
+        response = self.get_pressure()
+        return float(response.split('ACK')[-1].split(';')[0]),
@@ -1,9 +1,17 @@
+import logging
+
 import serial
 
+from housekeeping.instruments.base.exchange import ReadUntil
 from housekeeping.instruments.base.modified_generic_instrument import ModifiedGenericInstrument, InstrumentException
+from housekeeping.instruments.base.reading_schema import Channel, ReadingSchema
+
+logger = logging.getLogger(__name__)
 
 
 class PfeifferDualGauge(ModifiedGenericInstrument):
+    reading_schema = ReadingSchema([Channel('pressure_mBar', 'mbar')])
+
     def __init__(self,
                  serial_number=None,
                  com_port=None,
@@ -34,13 +42,14 @@ class PfeifferDualGauge(ModifiedGenericInstrument):
             serial_cmd_termination=serial_cmd_termination
         )
 
-    def _usb_query(self, query):
-        """Query over the serial USB connection"""
+    def _query_exchange(self, query):
+        """Framing of a query, see housekeeping.instruments.base.exchange"""
 
-        self._usb_command(query)
-        self.device_serial.readline()
-        self._usb_command(chr(5))
-        response = self.device_serial.read_until(self.serial_cmd_termination).decode('ascii')
+        yield from self._command_exchange(query)
+        # acknowledgement line, the reading is only sent after an ENQ
+        yield ReadUntil(b'\n')
+        yield from self._command_exchange(chr(5))
+        response = (yield ReadUntil(self.serial_cmd_termination)).decode('ascii')
 
         # If nothing is returned, raise a timeout error.
         if not response:
@@ -50,11 +59,14 @@ class PfeifferDualGauge(ModifiedGenericInstrument):
 
     def get_pressure(self):
         response = self.query('PR1')
-        print(response)
+        logger.debug(response)
         pressure = str(response)[5:-5]
         pressure = str(response)[2:]
         return float(pressure)
 
+    def read_values(self):
+        return self.get_pressure(),
+
 
 if __name__ == '__main__':
     gauge = PfeifferDualGauge(serial_number='AL032OADA')
@@ -4,27 +4,39 @@ from pandas import read_csv, to_datetime
 from matplotlib import pyplot as plt
 from matplotlib import dates as mdates
 
+from housekeeping.acquisition.rollup import plot_rollup
+
 default_fields = (
     'system_mbar', 'ion_gauge_mbar', 'cg1_mbar', 'cg2_mbar', 'lesker_mbar'
 )
 
 
-def plot_pressure_log(log_file_name=None, fields=default_fields):
-    if log_file_name is None:
-        file_dir = os.path.dirname(__file__)
-        log_files = [os.path.join(file_dir, f) for f in os.listdir(file_dir) if f.endswith('.tsv')]
-        log_files.sort()
-        log_file_name = log_files[-1]
-    print(log_file_name)
-    log_data = read_csv(log_file_name, delimiter='\t')
-    log_data['time'] = to_datetime(log_data['timestamp'])
-    log_data = log_data[log_data['ion_gauge_mbar'] < 1000]
+def plot_pressure_log(log_file_name=None, fields=default_fields, rollup_directory=None, start=None, end=None):
+    """Plots fields of a TSV log, the newest one next to this file by default
+
+        Args:
+            rollup_directory (str):
+                plot the fields as channels of this rollup instead (see housekeeping.acquisition.rollup), between
+                start and end (UTC datetimes, None for all of it) from the coarsest tier that fills the plot
+    """
     ax1 = plt.subplot(111)
-    for field in fields:
-        try:
-            ax1.plot(log_data['time'], log_data[field])
-        except KeyError:
-            print('No field: {}'.format(field))
+    if rollup_directory is not None:
+        plot_rollup(ax1, rollup_directory, fields, start, end)
+    else:
+        if log_file_name is None:
+            file_dir = os.path.dirname(__file__)
+            log_files = [os.path.join(file_dir, f) for f in os.listdir(file_dir) if f.endswith('.tsv')]
+            log_files.sort()
+            log_file_name = log_files[-1]
+        print(log_file_name)
+        log_data = read_csv(log_file_name, delimiter='\t')
+        log_data['time'] = to_datetime(log_data['timestamp'])
+        log_data = log_data[log_data['ion_gauge_mbar'] < 1000]
+        for field in fields:
+            try:
+                ax1.plot(log_data['time'], log_data[field])
+            except KeyError:
+                print('No field: {}'.format(field))
     ax1.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
     ax1.set_xlabel('Time')
     ax1.set_ylabel('Pressure (mbar)')
@@ -0,0 +1,122 @@
+"""
+Software stand-ins for the instruments that speak the same wire protocols as the hardware, so the drivers, the poller
+and anything built on them can be run and timed without the rack:
+
+    monitor = connect_simulated(Model218)
+    print(monitor.get_kelvin_reading_all())
+
+    devices = build_simulated_devices()
+    with Poller(devices) as poller:
+        print_snapshot(poller.poll())
+
+Latency and baud rate can be set per device. By default the simulators are reached through an in-memory serial port,
+pty=True serves them on pseudo terminals instead so the driver goes through the operating system's serial stack.
+"""
+import os
+
+import serial
+
+from housekeeping.instruments.simulated.base import SimulatedDevice, LineDevice, SimulatedSerial, PtySimulator
+from housekeeping.instruments.simulated.lakeshore import SimulatedModel218, SimulatedModel325, SimulatedModel331
+from housekeeping.instruments.simulated.cryotel import SimulatedCryotelAVC
+from housekeeping.instruments.simulated.pressure import (
+    SimulatedLesker392, SimulatedMKS392B, SimulatedPfeifferDualGauge
+)
+from housekeeping.instruments.simulated.motors import SimulatedMotorCom
+from housekeeping.instruments.simulated.humidity import SimulatedSeeedSTH01
+from housekeeping.instruments.utils import load_devices, get_device_class
+
+# keys are driver class names
+simulators = {
+    "Model218": SimulatedModel218,
+    "Model325": SimulatedModel325,
+    "Model331": SimulatedModel331,
+    "CryotelAVC": SimulatedCryotelAVC,
+    "Lesker392": SimulatedLesker392,
+    "MKS392BRS485": SimulatedMKS392B,
+    "PfeifferDualGauge": SimulatedPfeifferDualGauge,
+    "LinearStageMotorCom": SimulatedMotorCom,
+    "FilterWheelMotorCom": SimulatedMotorCom,
+    "SeeedSTH01": SimulatedSeeedSTH01
+}
+
+default_devices_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'devices.json')
+
+# PtySimulators started by simulated_connection, see close_simulators
+running_simulators = []
+
+
+def get_simulator_class(device_class):
+    """Returns the simulator for a driver class"""
+    try:
+        return simulators[device_class.__name__]
+    except KeyError:
+        raise KeyError('No simulator registered for {}'.format(device_class.__name__))
+
+
+def simulated_connection(device, baud_rate=None, timeout=2.0, pty=False):
+    """Returns a serial connection to a simulated device, to be passed to a driver as connection=
+
+        Args:
+            device (SimulatedDevice):
+                the simulated instrument
+            baud_rate (int):
+                line speed, defaults to the instrument's
+            timeout (float):
+                read timeout in seconds
+            pty (bool):
+                serve the device on a pseudo terminal and open it with pyserial, instead of connecting in memory
+
+        Returns:
+            (SimulatedSerial or serial.Serial)
+    """
+    if not pty:
+        return SimulatedSerial(device, baud_rate, timeout)
+    simulator = PtySimulator(device, baud_rate).start()
+    running_simulators.append(simulator)
+    return serial.Serial(simulator.port, baudrate=simulator.baud_rate or 9600, timeout=timeout)
+
+
+def connect_simulated(device_class, latency=None, baud_rate=None, timeout=2.0, pty=False, **simulator_kwargs):
+    """Creates a driver connected to a new simulated instrument
+
+        Args:
+            device_class (class):
+                driver class, e.g. Model218
+            latency (float):
+                seconds the instrument takes to start answering
+            baud_rate (int):
+                line speed, defaults to the instrument's
+            timeout (float):
+                read timeout in seconds
+            pty (bool):
+                see simulated_connection
+            simulator_kwargs:
+                passed to the simulator, e.g. temperatures=[...] for the Lake Shore monitors
+
+        Returns:
+            an instance of device_class
+    """
+    device = get_simulator_class(device_class)(latency=latency, **simulator_kwargs)
+    return device_class(connection=simulated_connection(device, baud_rate, timeout, pty))
+
+
+def build_simulated_devices(devices_file=default_devices_file, latency=None, baud_rate=None, timeout=2.0, pty=False):
+    """Simulated counterpart of housekeeping.acquisition.poller.build_devices
+
+        Returns:
+            (dict):
+                {device_name: instrument}, one simulated instrument for each entry of the devices.json file
+    """
+    devices = {}
+    for device_name, (device_type, class_name, _) in load_devices(devices_file).items():
+        device = connect_simulated(get_device_class(device_type, class_name), latency, baud_rate, timeout, pty)
+        device.instrument_name = device_name
+        devices[device_name] = device
+    return devices
+
+
+def close_simulators():
+    """Stops the pseudo terminal simulators started so far"""
+    while running_simulators:
+        running_simulators.pop().close()
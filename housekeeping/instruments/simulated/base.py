@@ -0,0 +1,312 @@
+"""
+Transports for simulated instruments.
+
+A SimulatedDevice answers the bytes a driver writes with the bytes the real instrument would send back. It can be
+reached two ways:
+
+    SimulatedSerial
+        an in-memory object with the parts of the serial.Serial interface the drivers use, passed to a driver as
+        connection=
+    PtySimulator
+        runs the device behind a pseudo terminal, so anything that opens serial ports by name can talk to it (Linux and
+        macOS only)
+
+Both deliver replies at the rate the configured baud rate allows, after the device's processing latency, so timing
+measurements made against a simulator are comparable to the ones made on the rack.
+"""
+import os
+import select
+from collections import deque
+from threading import Condition, Event, RLock, Thread
+from time import monotonic
+
+try:
+    import tty
+except ImportError:
+    # no pseudo terminals on Windows, SimulatedSerial still works there
+    tty = None
+
+
+class SimulatedDevice:
+    """Base class of the simulated instruments"""
+    default_baud_rate = 9600
+    # seconds between the end of a request and the start of the reply
+    default_latency = 0.01
+    # start bit + data bits + parity + stop bits
+    bits_per_character = 10
+
+    def __init__(self, latency=None):
+        if latency is None:
+            latency = self.default_latency
+        self.latency = latency
+        # device state is touched by the transport thread and by whoever inspects or changes the simulation
+        self.lock = RLock()
+        self.start_time = monotonic()
+        # traffic in each direction, for throughput measurements
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+    def elapsed(self):
+        """Seconds since the simulated instrument was switched on"""
+        return monotonic() - self.start_time
+
+    def receive(self, data):
+        """Takes bytes written by the host
+
+            Returns:
+                (list):
+                    (delay, reply bytes) tuples, delay is in seconds after the request finished arriving
+        """
+        raise NotImplementedError
+
+    def transfer(self, data):
+        """Called by the transports, counts the traffic and returns receive(data)"""
+        replies = self.receive(data)
+        with self.lock:
+            self.bytes_received += len(data)
+            self.bytes_sent += sum(len(reply) for _, reply in replies)
+        return replies
+
+
+class LineDevice(SimulatedDevice):
+    """A device that reads one request per terminated line and answers with one terminated line"""
+    terminator = b'\r\n'
+    reply_terminator = b'\r\n'
+
+    def __init__(self, latency=None):
+        super(LineDevice, self).__init__(latency)
+        self.input_buffer = bytearray()
+
+    def receive(self, data):
+        replies = []
+        with self.lock:
+            self.input_buffer += data
+            while True:
+                index = self.input_buffer.find(self.terminator)
+                if index < 0:
+                    break
+                line = bytes(self.input_buffer[:index]).decode('ascii', 'replace')
+                del self.input_buffer[:index + len(self.terminator)]
+                reply = self.handle_line(line.strip())
+                if reply is None:
+                    continue
+                if isinstance(reply, str):
+                    replies.append((self.latency, reply.encode('ascii') + self.reply_terminator))
+                else:
+                    replies.extend(reply)
+        return replies
+
+    def handle_line(self, line):
+        """Returns the reply without its terminator, None for no reply, or a list of (delay, bytes) tuples"""
+        raise NotImplementedError
+
+
+class ReplySchedule:
+    """Times the bytes of a device's replies as they would arrive over a serial line"""
+
+    def __init__(self, character_time):
+        self.character_time = character_time
+        self.chunks = deque()
+        self.request_end = 0.0
+        self.reply_end = 0.0
+
+    def add(self, now, request_size, replies):
+        # the device only sees a request once its last character is through
+        self.request_end = max(now, self.request_end) + request_size * self.character_time
+        for delay, data in replies:
+            start = max(self.request_end + delay, self.reply_end)
+            self.chunks.append((start, data))
+            self.reply_end = start + len(data) * self.character_time
+
+    def take_arrived(self, now):
+        """Removes and returns the bytes that have finished arriving by now"""
+        data = bytearray()
+        while self.chunks:
+            start, chunk = self.chunks[0]
+            if now < start:
+                break
+            if self.character_time:
+                count = min(len(chunk), int((now - start) / self.character_time + 1e-9))
+            else:
+                count = len(chunk)
+            data += chunk[:count]
+            if count < len(chunk):
+                self.chunks[0] = (start + count * self.character_time, chunk[count:])
+                break
+            self.chunks.popleft()
+        return bytes(data)
+
+    def next_arrival(self):
+        """Time the next byte finishes arriving, None if nothing is on its way"""
+        if not self.chunks:
+            return None
+        return self.chunks[0][0] + self.character_time
+
+
+class SimulatedSerial:
+    """In-memory stand-in for serial.Serial connected to a SimulatedDevice"""
+
+    def __init__(self, device, baud_rate=None, timeout=2.0, port=None):
+        """
+        Parameters
+        ----------
+        device : SimulatedDevice
+            the instrument on the other end of the line
+        baud_rate : int
+            line speed, defaults to the instrument's. 0 for replies that arrive all at once
+        timeout : float
+            read timeout in seconds, as for serial.Serial
+        port : str
+            name reported as the port, defaults to a unique sim:// name
+        """
+        self.device = device
+        if baud_rate is None:
+            baud_rate = device.default_baud_rate
+        self.baudrate = baud_rate
+        self.timeout = timeout
+        if port is None:
+            port = 'sim://{}/{}'.format(type(device).__name__, id(device))
+        self.port = port
+        self.is_open = True
+        character_time = device.bits_per_character / baud_rate if baud_rate else 0.0
+        self.schedule = ReplySchedule(character_time)
+        self.buffer = bytearray()
+        self.condition = Condition()
+
+    def write(self, data):
+        data = bytes(data)
+        replies = self.device.transfer(data)
+        with self.condition:
+            self.schedule.add(monotonic(), len(data), replies)
+            self.condition.notify_all()
+        return len(data)
+
+    def _collect(self):
+        self.buffer += self.schedule.take_arrived(monotonic())
+
+    def _take(self, size):
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def _wait(self, deadline):
+        """Waits for the next byte or the deadline, returns False once the deadline has passed"""
+        now = monotonic()
+        if deadline is not None and now >= deadline:
+            return False
+        next_arrival = self.schedule.next_arrival()
+        wake = next_arrival if deadline is None else min(deadline, next_arrival or deadline)
+        self.condition.wait(None if wake is None else max(wake - now, 0))
+        return True
+
+    def _read(self, done):
+        deadline = None if self.timeout is None else monotonic() + self.timeout
+        with self.condition:
+            while True:
+                self._collect()
+                size = done()
+                if size is not None:
+                    return self._take(size)
+                if not self._wait(deadline):
+                    return self._take(len(self.buffer))
+
+    def read(self, size=1):
+        return self._read(lambda: size if len(self.buffer) >= size else None)
+
+    def read_until(self, expected=b'\n', size=None):
+        def done():
+            index = self.buffer.find(expected)
+            if index >= 0:
+                end = index + len(expected)
+                return end if size is None else min(end, size)
+            if size is not None and len(self.buffer) >= size:
+                return size
+            return None
+        return self._read(done)
+
+    def read_all(self):
+        with self.condition:
+            self._collect()
+            return self._take(len(self.buffer))
+
+    @property
+    def in_waiting(self):
+        with self.condition:
+            self._collect()
+            return len(self.buffer)
+
+    def reset_input_buffer(self):
+        with self.condition:
+            self._collect()
+            self.buffer.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+class PtySimulator:
+    """
+    Serves a SimulatedDevice on a pseudo terminal. Open simulator.port with serial.Serial, or pass the open port to a
+    driver as connection=, the same way as a real adapter:
+
+        with PtySimulator(SimulatedModel218()) as simulator:
+            monitor = Model218(connection=serial.Serial(simulator.port, timeout=2))
+    """
+
+    def __init__(self, device, baud_rate=None):
+        if tty is None:
+            raise OSError('Pseudo terminals are not available on this platform, use SimulatedSerial instead')
+        self.device = device
+        if baud_rate is None:
+            baud_rate = device.default_baud_rate
+        self.baud_rate = baud_rate
+        character_time = device.bits_per_character / baud_rate if baud_rate else 0.0
+        self.schedule = ReplySchedule(character_time)
+        self.master, self.slave = os.openpty()
+        # no echo or line editing, the host sees exactly what the device sends
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.stopping = Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self._run, name='simulator {}'.format(self.port), daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopping.is_set():
+            now = monotonic()
+            next_arrival = self.schedule.next_arrival()
+            timeout = 0.1 if next_arrival is None else min(max(next_arrival - now, 0), 0.1)
+            readable, _, _ = select.select([self.master], [], [], timeout)
+            if readable:
+                try:
+                    data = os.read(self.master, 4096)
+                except OSError:
+                    # the other end was closed
+                    break
+                self.schedule.add(monotonic(), len(data), self.device.transfer(data))
+            data = self.schedule.take_arrived(monotonic())
+            if data:
+                os.write(self.master, data)
+
+    def close(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,157 @@
+"""
+Simulated Sunpower CryoTel AVC controller.
+
+Requests end in a carriage return. Every reply echoes the request on its first line and ends each line with \\r\\n,
+setters are sent as COMMAND=VALUE and answered with the new value. The cold head relaxes towards the target temperature
+in temperature mode, towards the temperature the commanded power can hold in power mode and back to room temperature
+when the cooler is off.
+"""
+import math
+import random
+
+from housekeeping.instruments.simulated.base import LineDevice
+
+
+class SimulatedCryotelAVC(LineDevice):
+    terminator = b'\r'
+    default_latency = 0.02
+    room_temperature = 295.
+    # seconds for the cold head to cover 63% of the way to where it's heading
+    cooldown_time_constant = 600.
+    warmup_time_constant = 1800.
+    max_power = 240.
+    min_power = 70.
+
+    def __init__(self, latency=None, coldhead_temperature=None, target_temperature=77., commanded_power=120.,
+                 noise=0.01, seed=None):
+        """
+        Parameters
+        ----------
+        latency : float
+            seconds between the end of a request and the start of the reply
+        coldhead_temperature : float
+            cold head temperature at power on in Kelvin, defaults to room temperature
+        target_temperature : float
+            TTARGET at power on in Kelvin
+        commanded_power : float
+            PWOUT at power on in Watts
+        noise : float
+            standard deviation of the temperature noise in Kelvin
+        seed : int
+            seeds the noise, for repeatable runs
+        """
+        super(SimulatedCryotelAVC, self).__init__(latency)
+        if coldhead_temperature is None:
+            coldhead_temperature = self.room_temperature
+        self.coldhead_temperature = coldhead_temperature
+        self.target_temperature = target_temperature
+        self.commanded_power = commanded_power
+        self.noise = noise
+        self.random = random.Random(seed)
+        # OFF, ON (temperature mode) or POWER
+        self.cooler_state = 'OFF'
+        self.gains = {'KP': 50., 'KI': 0.5, 'KD': 0.}
+        self.error_code = '00000000'
+        self.logged_in = False
+        self.updated = self.elapsed()
+
+    def equilibrium_temperature(self):
+        if self.cooler_state == 'OFF':
+            return self.room_temperature
+        if self.cooler_state == 'ON':
+            return self.target_temperature
+        return max(self.room_temperature - 0.9 * self.commanded_power, 35.)
+
+    def measured_power(self):
+        if self.cooler_state == 'OFF':
+            return 0.
+        if self.cooler_state == 'POWER':
+            return self.commanded_power
+        # full power while cooling down, settling to what holds the target
+        power = self.min_power + self.gains['KP'] * (self.coldhead_temperature - self.target_temperature) / 10.
+        return min(max(power, self.min_power), self.max_power)
+
+    def _advance(self):
+        now = self.elapsed()
+        time_constant = self.warmup_time_constant if self.cooler_state == 'OFF' else self.cooldown_time_constant
+        fraction = 1 - math.exp(-(now - self.updated) / time_constant)
+        self.coldhead_temperature += (self.equilibrium_temperature() - self.coldhead_temperature) * fraction
+        self.updated = now
+
+    def _noisy(self, value):
+        return value + self.random.gauss(0., self.noise)
+
+    def _measured_power(self):
+        power = self.measured_power()
+        return self._noisy(power) if power else power
+
+    def status_lines(self):
+        return [
+            '------------------',
+            'Mode = {}'.format('TEMPERATURE' if self.cooler_state == 'ON' else 'POWER'),
+            'Power Measured = {:.2f}'.format(self._measured_power()),
+            'Power Commanded = {:.2f}'.format(self.commanded_power),
+            'Target Temp = {:.2f}'.format(self.target_temperature),
+            'Reject Temp = {:.2f}'.format(self._noisy(303. + self.measured_power() / 20.)),
+            'Coldhead Temp = {:.2f}'.format(self._noisy(self.coldhead_temperature)),
+        ]
+
+    def handle_line(self, line):
+        if not line:
+            return None
+        with self.lock:
+            self._advance()
+            command, _, argument = line.upper().partition('=')
+            command = command.strip()
+            argument = argument.strip()
+            try:
+                lines = self.handle(command, argument or None)
+            except ValueError:
+                lines = ['Invalid Argument']
+            return '\r\n'.join([line] + lines)
+
+    def handle(self, command, argument):
+        if command == 'STATUS':
+            return self.status_lines()
+        if command == 'COOLER':
+            if argument is not None:
+                if argument not in ('OFF', 'ON', 'POWER'):
+                    raise ValueError(argument)
+                self.cooler_state = argument
+            return [self.cooler_state]
+        if command == 'TTARGET':
+            if argument is not None:
+                self.target_temperature = float(argument)
+            return ['{:.2f}'.format(self.target_temperature)]
+        if command == 'PWOUT':
+            if argument is not None:
+                self.commanded_power = min(max(float(argument), 0.), self.max_power)
+            return ['{:.2f}'.format(self.commanded_power)]
+        if command in self.gains:
+            if argument is not None:
+                self.gains[command] = float(argument)
+            return ['{:.2f}'.format(self.gains[command])]
+        if command == 'P':
+            return ['{:.2f}'.format(self._measured_power())]
+        if command == 'E':
+            return ['{:.2f}'.format(self.max_power), '{:.2f}'.format(self.min_power),
+                    '{:.2f}'.format(self._measured_power())]
+        if command == 'TC':
+            return ['{:.2f}'.format(self._noisy(self.coldhead_temperature))]
+        if command == 'TEMP RJ':
+            return ['{:.2f}'.format(self._noisy(303. + self.measured_power() / 20.))]
+        if command == 'ERROR':
+            return [self.error_code]
+        if command == 'MODE':
+            return ['TEMPERATURE' if self.cooler_state == 'ON' else 'POWER']
+        if command == 'SENSOR':
+            return ['DIODE']
+        if command == 'VERSION':
+            return ['SIM 1.0']
+        if command in ('LOGIN', 'PASSWD'):
+            self.logged_in = True
+            return ['OK']
+        if command == 'LOGOUT':
+            self.logged_in = False
+            return ['OK']
+        return ['Unknown Command']
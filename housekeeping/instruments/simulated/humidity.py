@@ -0,0 +1,105 @@
+"""
+Simulated Seeed S-TH-01 temperature and humidity sensor, Modbus RTU.
+
+Input/holding registers 0, 1 and 2 hold temperature (signed), relative humidity and dew point, each times 100, and are
+read with function 3 or 4. Frames with a bad CRC or for another slave address are ignored, as on an RS-485 bus.
+"""
+import math
+import random
+import struct
+
+from housekeeping.instruments.simulated.base import SimulatedDevice
+
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+ILLEGAL_FUNCTION = 1
+ILLEGAL_DATA_ADDRESS = 2
+
+
+def modbus_crc(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return struct.pack('<H', crc)
+
+
+def dew_point(celsius, relative_humidity):
+    """Magnus formula"""
+    gamma = math.log(relative_humidity / 100.) + 17.62 * celsius / (243.12 + celsius)
+    return 243.12 * gamma / (17.62 - gamma)
+
+
+class SimulatedSeeedSTH01(SimulatedDevice):
+    default_latency = 0.01
+    # request frames: address, function, start register (2), register count (2), CRC (2)
+    request_size = 8
+
+    def __init__(self, latency=None, temperature=21.5, humidity=35., address=1, noise=0.05, seed=None):
+        """
+        Parameters
+        ----------
+        latency : float
+            seconds between the end of a request and the start of the reply
+        temperature : float
+            air temperature in Celsius
+        humidity : float
+            relative humidity in percent
+        address : int
+            Modbus slave address
+        noise : float
+            standard deviation of the temperature and humidity noise
+        seed : int
+            seeds the noise, for repeatable runs
+        """
+        super(SimulatedSeeedSTH01, self).__init__(latency)
+        self.temperature = temperature
+        self.humidity = humidity
+        self.address = address
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.input_buffer = bytearray()
+
+    def registers(self):
+        temperature = self.temperature + self.random.gauss(0., self.noise)
+        humidity = min(max(self.humidity + self.random.gauss(0., self.noise), 0.1), 100.)
+        return [
+            int(round(temperature * 100)) & 0xFFFF,
+            int(round(humidity * 100)),
+            int(round(dew_point(temperature, humidity) * 100)) & 0xFFFF,
+        ]
+
+    def frame(self, pdu):
+        data = bytes([self.address]) + pdu
+        return data + modbus_crc(data)
+
+    def handle_frame(self, function, start, count):
+        if function not in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            return self.frame(bytes([function | 0x80, ILLEGAL_FUNCTION]))
+        registers = self.registers()
+        if count < 1 or start + count > len(registers):
+            return self.frame(bytes([function | 0x80, ILLEGAL_DATA_ADDRESS]))
+        values = registers[start:start + count]
+        return self.frame(bytes([function, 2 * count]) + struct.pack('>{}H'.format(count), *values))
+
+    def receive(self, data):
+        replies = []
+        with self.lock:
+            self.input_buffer += data
+            while len(self.input_buffer) >= self.request_size:
+                request = bytes(self.input_buffer[:self.request_size])
+                if modbus_crc(request[:-2]) != request[-2:]:
+                    # not a frame boundary, or line noise, resynchronize one byte later
+                    del self.input_buffer[0]
+                    continue
+                del self.input_buffer[:self.request_size]
+                if request[0] != self.address:
+                    continue
+                function = request[1]
+                start, count = struct.unpack('>HH', request[2:6])
+                replies.append((self.latency, self.handle_frame(function, start, count)))
+        return replies
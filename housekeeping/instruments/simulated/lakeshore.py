@@ -0,0 +1,434 @@
+"""
+Simulated Lake Shore 218, 325 and 331.
+
+Commands and queries can be chained with semicolons, each query on a line is answered in order with the answers
+separated by semicolons, the 325 pads the reply with one more. Errors set the standard event status register bits read
+back with *ESR?, lines longer than the 64 character input buffer are rejected as a command error.
+
+Readings follow a slow drift plus noise around a base temperature per input and are refreshed every update_period
+seconds, which sets the new reading bit of the status byte until *CLS and updates the MDAT min/max values. Settings
+not modelled in detail are stored and read back as sent.
+"""
+import math
+import random
+from datetime import datetime
+
+from housekeeping.instruments.simulated.base import LineDevice
+
+# standard event status register bits
+OPERATION_COMPLETE = 1
+QUERY_ERROR = 4
+EXECUTION_ERROR = 16
+COMMAND_ERROR = 32
+POWER_ON = 128
+
+# status byte bits
+NEW_READING = 1
+ALARM = 8
+EVENT_STATUS = 32
+SERVICE_REQUEST = 64
+
+
+class UnknownCommand(Exception):
+    pass
+
+
+def diode_volts(kelvin):
+    """Sensor units of the simulated diodes, monotonic with a negative temperature coefficient"""
+    return 0.09 + 1.62 * math.exp(-kelvin / 180.)
+
+
+# (sensor units, kelvin) points of the standard curve installed on every simulated input, in ascending sensor units
+standard_curve = [(round(diode_volts(kelvin), 5), kelvin) for kelvin in
+                  [round(325 - 323.6 * i / 99, 3) for i in range(100)]]
+standard_curve_header = 'DT-SIM,STANDARD,2,325.000,1'
+standard_curve_number = 1
+
+
+class SimulatedLakeshore(LineDevice):
+    """Behaviour shared by the simulated Lake Shore instruments, set up as a Model 218"""
+    model = 'MODEL218S'
+    firmware = '061407'
+    inputs = ('1', '2', '3', '4', '5', '6', '7', '8')
+    # argument of KRDG?, CRDG? and SRDG? that returns every input separated by commas
+    all_inputs = '0'
+    default_temperatures = (295., 80., 40., 20., 10., 4.2, 77., 300.)
+    relays = ('1', '2', '3', '4', '5', '6', '7', '8')
+    user_curves = range(21, 29)
+    max_curve_points = 200
+    max_line_length = 64
+    # appended to every reply
+    reply_padding = ''
+    default_latency = 0.02
+    update_period = 0.5
+    # {command: (number of leading index arguments, value returned before it's set)}
+    settings = {
+        'ALARM': (1, '0,1,+000.000,+000.000,+000.000,0'),
+        'ALMB': (0, '0'),
+        'ANALOG': (1, '0,0,1,1,+000.000,+000.000,+000.000'),
+        'BAUD': (0, '2'),
+        'DISPFLD': (1, '1,1'),
+        'FILTER': (1, '1,10,2'),
+        'IEEE': (0, '0,0,12'),
+        'INCRV': (1, str(standard_curve_number)),
+        'INPUT': (1, '1'),
+        'INTYPE': (1, '0'),
+        'LOCK': (0, '0,123'),
+        'MODE': (0, '0'),
+        'RELAY': (1, '0,1,0'),
+        '*ESE': (0, '0'),
+        '*SRE': (0, '0'),
+    }
+
+    def __init__(self, latency=None, temperatures=None, serial_number='SIM0001', noise=0.002, drift=0.05,
+                 drift_period=600., seed=None):
+        """
+        Parameters
+        ----------
+        latency : float
+            seconds between the end of a request and the start of the reply
+        temperatures : list
+            base temperature of each input in Kelvin
+        serial_number : str
+            reported by *IDN?
+        noise : float
+            standard deviation of the reading noise in Kelvin
+        drift : float
+            amplitude of the slow drift in Kelvin
+        drift_period : float
+            period of the slow drift in seconds
+        seed : int
+            seeds the reading noise, for repeatable runs
+        """
+        super(SimulatedLakeshore, self).__init__(latency)
+        if temperatures is None:
+            temperatures = self.default_temperatures
+        self.base_temperatures = dict(zip(self.inputs, temperatures))
+        self.serial_number = serial_number
+        self.noise = noise
+        self.drift = drift
+        self.drift_period = drift_period
+        self.random = random.Random(seed)
+        self.esr = POWER_ON
+        self.values = {}
+        self.curves = {}
+        self.curve_headers = {}
+        self.step = 0
+        self.readings = {}
+        self.minimum = {}
+        self.maximum = {}
+        self.new_reading = True
+        self.latched_alarms = {}
+        for channel in self.inputs:
+            self._update_reading(channel, 0.)
+        self.reset_min_max()
+
+    # readings
+
+    def temperature(self, channel, seconds):
+        """Kelvin reading of an input at a time since power on"""
+        phase = self.inputs.index(channel)
+        drift = self.drift * math.sin(2 * math.pi * seconds / self.drift_period + phase)
+        return self.base_temperatures[channel] + drift + self.random.gauss(0., self.noise)
+
+    def sensor_units(self, kelvin):
+        return diode_volts(kelvin)
+
+    def _update_reading(self, channel, seconds):
+        kelvin = self.temperature(channel, seconds)
+        self.readings[channel] = kelvin
+        self.minimum[channel] = min(self.minimum.get(channel, kelvin), kelvin)
+        self.maximum[channel] = max(self.maximum.get(channel, kelvin), kelvin)
+
+    def _advance(self):
+        step = int(self.elapsed() / self.update_period)
+        if step <= self.step:
+            return
+        # the extremes between two polls have to be seen, but don't replay hours of readings after a long pause
+        for missed_step in range(max(self.step + 1, step - 1000), step + 1):
+            for channel in self.inputs:
+                self._update_reading(channel, missed_step * self.update_period)
+        self.step = step
+        self.new_reading = True
+
+    def reset_min_max(self):
+        self.minimum = dict(self.readings)
+        self.maximum = dict(self.readings)
+
+    def _input_readings(self, channel, convert):
+        if channel == self.all_inputs:
+            return ','.join(convert(self.readings[c]) for c in self.inputs)
+        # the 325/331 have no all inputs argument, 0 is an execution error like any other unknown input
+        return convert(self.readings[channel.upper()])
+
+    # settings
+
+    def get_value(self, command, index=()):
+        return self.values.get((command,) + tuple(i.upper() for i in index), self.settings[command][1])
+
+    def set_value(self, command, arguments):
+        index_count = self.settings[command][0]
+        if len(arguments) <= index_count:
+            raise IndexError(command)
+        index = tuple(i.upper() for i in arguments[:index_count])
+        self.values[(command,) + index] = ','.join(arguments[index_count:])
+
+    # alarms and relays
+
+    def alarm_state(self, channel):
+        """Returns (high, low) alarm states of an input, latched alarms stay on until ALMRST"""
+        enable, source, high, low = self.get_value('ALARM', [channel]).split(',')[:4]
+        latch = self.get_value('ALARM', [channel]).split(',')[5:6] == ['1']
+        if not int(enable):
+            return False, False
+        reading = self.readings[channel]
+        if int(source) == 2:
+            reading -= 273.15
+        elif int(source) == 3:
+            reading = self.sensor_units(reading)
+        state = (reading > float(high), reading < float(low))
+        if latch:
+            latched = self.latched_alarms.get(channel, (False, False))
+            state = (state[0] or latched[0], state[1] or latched[1])
+            self.latched_alarms[channel] = state
+        return state
+
+    def relay_state(self, relay):
+        mode, channel, alarm_type = self.get_value('RELAY', [relay]).split(',')[:3]
+        if int(mode) != 2:
+            return int(mode) == 1
+        high, low = self.alarm_state(channel.upper())
+        return {0: low, 1: high, 2: high or low}[int(alarm_type)]
+
+    def status_byte(self):
+        stb = 0
+        if self.new_reading:
+            stb |= NEW_READING
+        if any(any(self.alarm_state(channel)) for channel in self.inputs):
+            stb |= ALARM
+        if self.esr & int(self.get_value('*ESE')):
+            stb |= EVENT_STATUS
+        if stb & int(self.get_value('*SRE')):
+            stb |= SERVICE_REQUEST
+        return stb
+
+    # curves
+
+    def get_curve_point(self, curve, index):
+        if curve == standard_curve_number:
+            if index <= len(standard_curve):
+                return standard_curve[index - 1]
+            return 0., 0.
+        return self.curves.get(curve, {}).get(index, (0., 0.))
+
+    def get_curve_header(self, curve):
+        if curve == standard_curve_number:
+            return standard_curve_header
+        return self.curve_headers.get(curve, 'User Curve,,2,+325.000,1')
+
+    # protocol
+
+    def handle_line(self, line):
+        if not line:
+            return None
+        with self.lock:
+            if len(line) > self.max_line_length:
+                self.esr |= COMMAND_ERROR
+                return None
+            self._advance()
+            responses = []
+            for part in line.split(';'):
+                part = part.strip()
+                if not part:
+                    continue
+                name, _, arguments = part.partition(' ')
+                name = name.upper()
+                arguments = [argument.strip() for argument in arguments.split(',')] if arguments.strip() else []
+                try:
+                    response = self.handle(name, arguments)
+                except UnknownCommand:
+                    self.esr |= COMMAND_ERROR
+                    continue
+                except (KeyError, IndexError, TypeError, ValueError):
+                    # known command with arguments out of range or missing
+                    self.esr |= EXECUTION_ERROR
+                    continue
+                if response is not None:
+                    responses.append(response)
+            if not responses:
+                return None
+            return ';'.join(responses) + self.reply_padding
+
+    @staticmethod
+    def _method_name(name):
+        return name.replace('*', 'star_').replace('?', '_query').lower()
+
+    def handle(self, name, arguments):
+        handler = getattr(self, 'handle_' + self._method_name(name), None)
+        if handler is not None:
+            return handler(*arguments)
+        if name.endswith('?') and name[:-1] in self.settings:
+            return self.get_value(name[:-1], arguments[:self.settings[name[:-1]][0]])
+        if name in self.settings:
+            return self.set_value(name, arguments)
+        raise UnknownCommand(name)
+
+    def handle_star_idn_query(self):
+        return 'LSCI,{},{},{}'.format(self.model, self.serial_number, self.firmware)
+
+    def handle_star_cls(self):
+        self.esr = 0
+        self.new_reading = False
+
+    def handle_star_esr_query(self):
+        esr = self.esr
+        self.esr = 0
+        return str(esr)
+
+    def handle_star_stb_query(self):
+        return str(self.status_byte())
+
+    def handle_star_opc(self):
+        self.esr |= OPERATION_COMPLETE
+
+    def handle_star_opc_query(self):
+        return '1'
+
+    def handle_star_rst(self):
+        self.values = {}
+
+    def handle_star_tst_query(self):
+        return '0'
+
+    def handle_star_wai(self):
+        pass
+
+    def handle_krdg_query(self, channel):
+        return self._input_readings(channel, '{:+08.3f}'.format)
+
+    def handle_crdg_query(self, channel):
+        return self._input_readings(channel, lambda kelvin: '{:+08.3f}'.format(kelvin - 273.15))
+
+    def handle_srdg_query(self, channel):
+        return self._input_readings(channel, lambda kelvin: '{:+.5f}'.format(self.sensor_units(kelvin)))
+
+    def handle_rdgst_query(self, channel):
+        if channel.upper() not in self.readings:
+            raise KeyError(channel)
+        return '000'
+
+    def handle_mdat_query(self, channel):
+        channel = channel.upper()
+        return '{:+08.3f},{:+08.3f}'.format(self.minimum[channel], self.maximum[channel])
+
+    def handle_mnmxrst(self):
+        self.reset_min_max()
+
+    def handle_alarmst_query(self, channel):
+        return '{:d},{:d}'.format(*self.alarm_state(channel.upper()))
+
+    def handle_almrst(self):
+        self.latched_alarms = {}
+
+    def handle_relayst_query(self, relay=None):
+        if relay is not None:
+            return str(int(self.relay_state(relay)))
+        return str(sum(self.relay_state(r) << i for i, r in enumerate(self.relays)))
+
+    def handle_crvhdr(self, curve, *header):
+        curve = int(curve)
+        if curve not in self.user_curves or len(header) != 5:
+            raise ValueError(curve)
+        self.curve_headers[curve] = ','.join(header)
+
+    def handle_crvhdr_query(self, curve):
+        return self.get_curve_header(int(curve))
+
+    def handle_crvpt(self, curve, index, units, kelvin):
+        curve, index = int(curve), int(index)
+        if curve not in self.user_curves or not 1 <= index <= self.max_curve_points:
+            raise ValueError(curve)
+        self.curves.setdefault(curve, {})[index] = (float(units), float(kelvin))
+
+    def handle_crvpt_query(self, curve, index):
+        index = int(index)
+        if not 1 <= index <= self.max_curve_points:
+            raise ValueError(index)
+        return '{:+.5f},{:+.3f}'.format(*self.get_curve_point(int(curve), index))
+
+    def handle_crvdel(self, curve):
+        curve = int(curve)
+        if curve not in self.user_curves:
+            raise ValueError(curve)
+        self.curves.pop(curve, None)
+        self.curve_headers.pop(curve, None)
+
+    def handle_datetime_query(self):
+        now = datetime.now()
+        return '{:02d},{:02d},{:02d},{:02d},{:02d},{:02d}'.format(
+            now.month, now.day, now.year % 100, now.hour, now.minute, now.second
+        )
+
+    def handle_datetime(self, *date_time):
+        if len(date_time) != 6:
+            raise ValueError(date_time)
+
+
+class SimulatedModel218(SimulatedLakeshore):
+    pass
+
+
+class SimulatedLakeshoreController(SimulatedLakeshore):
+    """Two input, two loop controller"""
+    inputs = ('A', 'B')
+    all_inputs = None
+    default_temperatures = (80., 300.)
+    relays = ()
+    settings = dict(SimulatedLakeshore.settings, **{
+        'CMODE': (1, '1'),
+        'CSET': (1, 'A,1,1,1'),
+        'PID': (1, '+0050.0,+0020.0,+0000'),
+        'RAMP': (1, '0,+000.0'),
+        'RANGE': (1, '0'),
+        'SETP': (1, '+300.000'),
+    })
+
+    def control_input(self, loop):
+        if ('CSET', loop) in self.values:
+            return self.values[('CSET', loop)].split(',')[0]
+        # loop 1 controls input A and loop 2 input B until told otherwise
+        return self.inputs[int(loop) - 1]
+
+    def heater_output(self, loop):
+        """Proportional-only stand in for the control loop, in percent"""
+        if not int(self.get_value('RANGE', [loop])):
+            return 0.
+        error = float(self.get_value('SETP', [loop])) - self.readings[self.control_input(loop)]
+        gain = float(self.get_value('PID', [loop]).split(',')[0])
+        return min(max(gain * error, 0.), 100.)
+
+    def handle_htr_query(self, loop='1'):
+        return '{:+06.1f}'.format(self.heater_output(loop))
+
+    def handle_aout_query(self, loop='2'):
+        return '{:+06.1f}'.format(self.heater_output(loop))
+
+    def handle_htrst_query(self, loop='1'):
+        return '0'
+
+    def handle_rampst_query(self, loop):
+        return '0'
+
+
+class SimulatedModel325(SimulatedLakeshoreController):
+    model = 'MODEL325'
+    firmware = '1.6'
+    # the 325 ends its replies with a semicolon
+    reply_padding = ';'
+    user_curves = range(21, 36)
+
+
+class SimulatedModel331(SimulatedLakeshoreController):
+    model = 'MODEL331S'
+    firmware = '1.8'
+    user_curves = range(21, 42)
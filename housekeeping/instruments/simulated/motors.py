@@ -0,0 +1,65 @@
+"""
+Simulated BaseMotorCom motor controller.
+
+A move request looks like M<motor>1<+/-><R/S><steps>:<speed>:<acceleration>. The controller acknowledges it straight
+away and reports EOR: <steps moved> followed by READY once the move is over, with the move lasting as long as the
+speed and acceleration allow. Switch moves (S) stop early at the limit switches. Anything it can't parse is answered
+with com_fail.
+"""
+import re
+
+from housekeeping.instruments.motors.motor_serial import calculate_move_time
+from housekeeping.instruments.simulated.base import LineDevice
+
+move_pattern = re.compile(r'^M(\d)1([+-])([RS])(\d+):(\d+):(\d+)$')
+
+
+class SimulatedMotorCom(LineDevice):
+    terminator = b'\n'
+    reply_terminator = b'\n'
+    default_latency = 0.005
+
+    def __init__(self, latency=None, motors=4, positions=None, travel=20000, time_scale=1.):
+        """
+        Parameters
+        ----------
+        latency : float
+            seconds between the end of a request and the acknowledgement
+        motors : int
+            number of motors on the controller
+        positions : list
+            position of each motor at power on in steps from its lower limit switch
+        travel : int
+            steps between the lower and upper limit switches
+        time_scale : float
+            multiplies the duration of moves, e.g. 0.01 to run motion sequences quickly
+        """
+        super(SimulatedMotorCom, self).__init__(latency)
+        if positions is None:
+            positions = [travel // 10] * motors
+        self.positions = list(positions)
+        self.travel = travel
+        self.time_scale = time_scale
+
+    def handle_line(self, line):
+        if not line:
+            return None
+        match = move_pattern.match(line)
+        if match is None or int(match.group(1)) >= len(self.positions):
+            return [(self.latency, 'com_fail: {}\nREADY\n'.format(line).encode('ascii'))]
+        motor, direction, move_type, steps, speed, acceleration = match.groups()
+        motor, steps, speed, acceleration = int(motor), int(steps), int(speed), int(acceleration)
+        if speed <= 0 or acceleration <= 0:
+            return [(self.latency, 'com_fail: {}\nREADY\n'.format(line).encode('ascii'))]
+        with self.lock:
+            sign = 1 if direction == '+' else -1
+            if move_type == 'S':
+                # runs until it hits the limit switch in the direction of travel
+                limit = self.travel if sign > 0 else 0
+                steps = min(steps, abs(limit - self.positions[motor]))
+            self.positions[motor] += sign * steps
+        move_time = calculate_move_time(steps, speed, acceleration) * self.time_scale if steps else 0.
+        return [
+            (self.latency, 'MOVE {}\n'.format(line).encode('ascii')),
+            (move_time, 'EOR: {}\nREADY\n'.format(steps).encode('ascii')),
+        ]
@@ -0,0 +1,183 @@
+"""
+Simulated vacuum gauges.
+
+    SimulatedLesker392
+        KJL 392 ion gauge controller, #01RD style requests ending in a carriage return, *01 replies
+    SimulatedMKS392B
+        MKS RS-485 gauge, @253PR4?;FF requests answered with @253ACK<value>;FF
+    SimulatedPfeifferDualGauge
+        Pfeiffer TPG 26x, a mnemonic is acknowledged with ACK and its data is only sent after an ENQ
+"""
+import random
+
+from housekeeping.instruments.simulated.base import LineDevice, SimulatedDevice
+
+
+class SimulatedGaugeMixin:
+    """Pressure reading with multiplicative noise"""
+
+    def setup_gauge(self, pressure, noise, seed):
+        self.pressure = pressure
+        self.noise = noise
+        self.random = random.Random(seed)
+
+    def read_pressure(self):
+        return self.pressure * (1 + self.random.gauss(0., self.noise))
+
+
+class SimulatedLesker392(SimulatedGaugeMixin, LineDevice):
+    terminator = b'\r'
+    reply_terminator = b'\r'
+    default_baud_rate = 19200
+    default_latency = 0.03
+    # reported for the ion gauge while its filament is off
+    ion_gauge_off = 9.9e9
+
+    def __init__(self, latency=None, pressure=2e-6, convection_pressure=1e-3, address='01', noise=0.01, seed=None):
+        """
+        Parameters
+        ----------
+        latency : float
+            seconds between the end of a request and the start of the reply
+        pressure : float
+            ion gauge pressure in mbar
+        convection_pressure : float
+            pressure read by the convection gauges in mbar, they bottom out long before the ion gauge does
+        address : str
+            RS-485 address, requests to other addresses aren't answered
+        noise : float
+            relative standard deviation of the readings
+        seed : int
+            seeds the noise, for repeatable runs
+        """
+        super(SimulatedLesker392, self).__init__(latency)
+        self.setup_gauge(pressure, noise, seed)
+        self.convection_pressure = convection_pressure
+        self.address = address
+        self.ion_gauge_on = True
+
+    def reply(self, value):
+        return '*{} {}'.format(self.address, value)
+
+    def handle_line(self, line):
+        if not line.startswith('#') or line[1:3] != self.address:
+            return None
+        command = line[3:].upper()
+        with self.lock:
+            if command == 'RD':
+                value = self.read_pressure() if self.ion_gauge_on else self.ion_gauge_off
+            elif command == 'RDS':
+                # the system pressure comes from the ion gauge once it's on and in range
+                value = self.read_pressure() if self.ion_gauge_on else self.convection_pressure
+            elif command in ('RDCG1', 'RDCG2'):
+                value = self.convection_pressure * (1 + self.random.gauss(0., self.noise))
+            elif command in ('IG0', 'IG1'):
+                self.ion_gauge_on = command == 'IG1'
+                return self.reply('PROGM OK')
+            else:
+                return '?{} SYNTX ER'.format(self.address)
+            return self.reply('{:.2E}'.format(value))
+
+
+class SimulatedMKS392B(SimulatedGaugeMixin, LineDevice):
+    terminator = b';FF'
+    reply_terminator = b';FF'
+    default_latency = 0.02
+    broadcast_address = '254'
+
+    def __init__(self, latency=None, pressure=1e-3, address=253, units='TORR', noise=0.01, seed=None):
+        """
+        Parameters
+        ----------
+        latency : float
+            seconds between the end of a request and the start of the reply
+        pressure : float
+            pressure in the gauge's units
+        address : int
+            RS-485 address, requests to other addresses aren't answered
+        units : str
+            reported by U?
+        noise : float
+            relative standard deviation of the readings
+        seed : int
+            seeds the noise, for repeatable runs
+        """
+        super(SimulatedMKS392B, self).__init__(latency)
+        self.setup_gauge(pressure, noise, seed)
+        self.address = str(address)
+        self.units = units
+
+    def handle_line(self, line):
+        if not line.startswith('@'):
+            return None
+        address, command = line[1:4], line[4:].upper()
+        if address not in (self.address, self.broadcast_address):
+            return None
+        with self.lock:
+            if command in ('PR1?', 'PR2?', 'PR3?', 'PR4?', 'PR5?'):
+                value = '{:.2E}'.format(self.read_pressure())
+            elif command == 'U?':
+                value = self.units
+            elif command == 'AD?':
+                value = self.address
+            else:
+                # 160: unrecognized message
+                return '@{}NAK160'.format(self.address)
+            return '@{}ACK{}'.format(self.address, value)
+
+
+class SimulatedPfeifferDualGauge(SimulatedGaugeMixin, SimulatedDevice):
+    default_latency = 0.02
+    ACK = b'\x06'
+    NAK = b'\x15'
+    ENQ = 5
+
+    def __init__(self, latency=None, pressure=(1e-3, 5e-4), noise=0.01, seed=None):
+        """
+        Parameters
+        ----------
+        latency : float
+            seconds between the end of a request and the start of the reply
+        pressure : tuple
+            pressure of gauge 1 and gauge 2 in mbar
+        noise : float
+            relative standard deviation of the readings
+        seed : int
+            seeds the noise, for repeatable runs
+        """
+        super(SimulatedPfeifferDualGauge, self).__init__(latency)
+        self.setup_gauge(pressure, noise, seed)
+        self.input_buffer = bytearray()
+        self.mnemonic = None
+
+    def read_gauge(self, gauge):
+        # status 0: measurement data okay
+        return '0,{:+.4E}'.format(self.pressure[gauge] * (1 + self.random.gauss(0., self.noise)))
+
+    def data(self):
+        if self.mnemonic in ('PR1', 'PR2'):
+            return self.read_gauge(int(self.mnemonic[-1]) - 1)
+        return ','.join([self.read_gauge(0), self.read_gauge(1)])
+
+    def receive(self, data):
+        replies = []
+        with self.lock:
+            for byte in data:
+                if byte == self.ENQ:
+                    # the data of the last acknowledged mnemonic, NAK if there isn't one
+                    reply = self.NAK if self.mnemonic is None else self.data().encode('ascii')
+                    replies.append((self.latency, reply + b'\r\n'))
+                    continue
+                if byte != ord('\r'):
+                    self.input_buffer.append(byte)
+                    continue
+                mnemonic = bytes(self.input_buffer).decode('ascii', 'replace').strip().upper()
+                self.input_buffer.clear()
+                if not mnemonic:
+                    continue
+                if mnemonic in ('PR1', 'PR2', 'PRX'):
+                    self.mnemonic = mnemonic
+                    replies.append((self.latency, self.ACK + b'\r\n'))
+                else:
+                    replies.append((self.latency, self.NAK + b'\r\n'))
+        return replies
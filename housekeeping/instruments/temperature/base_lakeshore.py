@@ -1,4 +1,10 @@
+import logging
+import math
+import re
+from collections import deque
 from enum import IntEnum
+from threading import get_ident, Lock
+from time import monotonic
 
 import serial
 
@@ -7,6 +13,8 @@ from lakeshore.temperature_controllers import HeaterError, StandardEventRegister
 
 from housekeeping.instruments.base.modified_generic_instrument import ModifiedGenericInstrument
 
+logger = logging.getLogger(__name__)
+
 
 class AlarmParameters:
     """Class used to disable or configure an alarm in conjunction with the set/get_alarm_parameters() method"""
@@ -79,7 +87,7 @@ class StatusByteRegister(RegisterBase):
         "alarm",
         "error",
         "event_status_bit",
-        "service_request"
+        "service_request",
         "datalog_done"
     ]
 
@@ -118,6 +126,20 @@ class InputSensorUnits(IntEnum):
     LINEAR_EQUATION = 4
 
 
+class RelayControlMode(IntEnum):
+    """Relay control mode enumeration"""
+    OFF = 0
+    ON = 1
+    ALARMS = 2
+
+
+class RelayControlAlarm(IntEnum):
+    """Enumeration of the alarms of an input that switch a relay in alarms mode"""
+    LOW_ALARM = 0
+    HIGH_ALARM = 1
+    BOTH_ALARMS = 2
+
+
 class SensorTypes(IntEnum):
     DIODE_2_5V = 0
     DIODE_7_5V = 1
@@ -214,6 +236,221 @@ class Terminator(IntEnum):
     NONE = 3
 
 
+class BatchResult:
+    """Placeholder for the return value of a method queued on a QueryBatch"""
+
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        # responses to the commands (None) and queries the method has made so far, in order
+        self.responses = []
+        self.done = False
+        self._value = None
+
+    @property
+    def value(self):
+        """The method's return value, available once the batch has been sent"""
+        if not self.done:
+            raise InstrumentException('Batch has not been sent yet')
+        return self._value
+
+
+class _BatchedQuery(BaseException):
+    """Stops a queued method at a query whose response hasn't been read yet"""
+
+
+class _BatchReplay:
+    """Answers a queued method's commands and queries while a batch is being assembled"""
+
+    def __init__(self, result, config_cache=None):
+        self.result = result
+        self.config_cache = config_cache
+        self.position = 0
+        # (command or query string, is_query, cached response or None)
+        self.new_operations = []
+
+    def command(self, command_string):
+        if self.position >= len(self.result.responses):
+            self.new_operations.append((command_string, False, None))
+            if self.config_cache is not None:
+                # it goes out ahead of any query queued after it, which mustn't be answered from the cache
+                self.config_cache.command_sent(command_string)
+        self.position += 1
+
+    def query(self, query_string):
+        if self.position < len(self.result.responses):
+            response = self.result.responses[self.position]
+            self.position += 1
+            return response
+        response = self.config_cache.get(query_string) if self.config_cache is not None else None
+        if response is None:
+            self.new_operations.append((query_string, True, None))
+            raise _BatchedQuery()
+        # known already, the method carries on in this round
+        self.new_operations.append((query_string, True, response))
+        self.position += 1
+        return response
+
+
+class QueryBatch:
+    """
+    Collects getter and setter calls and sends them chained with semicolons, in as few lines as the instrument accepts.
+    Each queued method runs unchanged and parses its own response.
+
+        with monitor.batch() as batch:
+            temperatures = batch.add(monitor.get_kelvin_reading_all)
+            setpoint = batch.add(monitor.get_setpoint, 1)
+        print(temperatures.value, setpoint.value)
+    """
+
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.send()
+
+    def add(self, method, *args, **kwargs):
+        """Queues a call to one of the instrument's methods
+
+            Args:
+                method (callable):
+                    bound method of the instrument, e.g. monitor.get_kelvin_reading
+                args, kwargs:
+                    passed to the method
+
+            Returns:
+                (BatchResult):
+                    holds the method's return value once the batch has been sent
+        """
+        result = BatchResult(method, args, kwargs)
+        self.results.append(result)
+        return result
+
+    def send(self):
+        """Sends every queued call. Methods that make several queries take one round per query."""
+        replays = self.instrument._batch_replays
+        pending = [result for result in self.results if not result.done]
+        while pending:
+            round_operations = []
+            finished = []
+            for result in pending:
+                replay = _BatchReplay(result, self.instrument.config_cache)
+                replays[get_ident()] = replay
+                try:
+                    result._value = result.method(*result.args, **result.kwargs)
+                    finished.append(result)
+                except _BatchedQuery:
+                    pass
+                finally:
+                    del replays[get_ident()]
+                round_operations.append((result, replay.new_operations))
+            responses = iter(self.instrument.send_chained([
+                (string, is_query) for _, operations in round_operations
+                for string, is_query, cached in operations if cached is None
+            ]))
+            for result, operations in round_operations:
+                result.responses.extend(next(responses) if cached is None else cached for _, _, cached in operations)
+            for result in finished:
+                result.done = True
+            pending = [result for result in pending if not result.done]
+
+
+class ConfigCache:
+    """
+    Read-through cache of configuration queries, whose answers only change when a matching command is sent. Entries
+    expire after ttl seconds in case the configuration was changed from the front panel.
+    """
+    # query mnemonic: command mnemonics that change its answer
+    invalidated_by = {
+        'CRVHDR?': ('CRVHDR', 'CRVDEL'),
+        'INPUT?': ('INPUT', 'INTYPE'),
+        'INTYPE?': ('INTYPE',),
+        'INCRV?': ('INCRV', 'INTYPE', 'CRVDEL'),
+        'PID?': ('PID',),
+        'FILTER?': ('FILTER',),
+        'ALARM?': ('ALARM',),
+        'RELAY?': ('RELAY',),
+    }
+    # commands that can change all of them
+    reset_commands = ('*RST', 'DFLT')
+
+    def __init__(self, ttl=300.):
+        self.ttl = ttl
+        self.lock = Lock()
+        # {query string: (query mnemonic, response, expiry time)}
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        # command mnemonic: query mnemonics it invalidates
+        self.invalidates = {}
+        for query, commands in self.invalidated_by.items():
+            for command in commands:
+                self.invalidates.setdefault(command, []).append(query)
+
+    @staticmethod
+    def _split(string):
+        """Returns the normalized string and its mnemonic, the instruments don't care about case or extra spaces"""
+        string = ' '.join(string.upper().split())
+        return string, string.split(' ')[0]
+
+    def get(self, query_string):
+        """Returns the cached response, or None if the query isn't cached or has expired"""
+        key, mnemonic = self._split(query_string)
+        if mnemonic not in self.invalidated_by:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[2] < monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query_string, response):
+        key, mnemonic = self._split(query_string)
+        if mnemonic not in self.invalidated_by:
+            return
+        with self.lock:
+            self.entries[key] = (mnemonic, response, monotonic() + self.ttl)
+
+    def invalidate(self, query_mnemonic=None):
+        """Drops the entries of one query mnemonic, e.g. 'PID?', or all of them"""
+        with self.lock:
+            if query_mnemonic is None:
+                self.entries = {}
+                return
+            query_mnemonic = query_mnemonic.upper()
+            self.entries = {key: entry for key, entry in self.entries.items() if entry[0] != query_mnemonic}
+
+    def command_sent(self, command_string):
+        """Drops the entries a command may have changed"""
+        _, mnemonic = self._split(command_string)
+        if mnemonic in self.reset_commands:
+            self.invalidate()
+        for query_mnemonic in self.invalidates.get(mnemonic, ()):
+            self.invalidate(query_mnemonic)
+
+
+class LatchedError:
+    """An error found in the standard event register by a sweep, with the commands and queries that could have set it"""
+
+    def __init__(self, event_register, window):
+        self.event_register = event_register
+        # commands and queries sent since the previous sweep, oldest first
+        self.window = window
+
+    def __str__(self):
+        errors = [name for name in ('query_error', 'command_error', 'execution_error')
+                  if getattr(self.event_register, name)]
+        return '{} latched by one of: {}'.format(', '.join(errors), '; '.join(self.window))
+
+
 class BaseLakeshoreMonitor(ModifiedGenericInstrument):
     """
     BaseLakeshoreMonitor is based on LS218S monitor
@@ -235,7 +472,12 @@ class BaseLakeshoreMonitor(ModifiedGenericInstrument):
                  connection=None,
                  serial_cmd_termination='\r\n'
                  ):
-
+        # {thread id: _BatchReplay} for threads assembling a QueryBatch
+        self._batch_replays = {}
+        # commands and queries sent since the last error sweep, see set_error_check_mode
+        self._error_window = deque(maxlen=self.error_window_length)
+        self._last_error_sweep = monotonic()
+        self.latched_errors = deque(maxlen=100)
         super(BaseLakeshoreMonitor, self).__init__(
             serial_number, com_port, baud_rate, data_bits, stop_bits, parity, flow_control, handshaking, timeout,
             ip_address, tcp_port, connection, serial_cmd_termination
@@ -255,9 +497,223 @@ class BaseLakeshoreMonitor(ModifiedGenericInstrument):
     SensorTypes = SensorTypes
     InterfaceMode = InterfaceMode
 
+    # From the 218/325/331 manuals: commands can be chained with semicolons, only one query is permitted per line and it
+    # has to come last, and a line can't exceed 64 characters
+    batch_line_length = 64
+    batch_queries_per_line = 1
+    # see enable_config_cache
+    config_cache = None
+    # points per curve, and points set_curve writes before waiting for the instrument to catch up
+    curve_points = 200
+    curve_upload_chunk = 20
+    # see set_error_check_mode
+    error_check_mode = None
+    error_sweep_period = 10.
+    error_window_length = 256
+
     def _get_identity(self):
         return self.query('*IDN?').split(',')
 
+    def command(self, command_string):
+        replay = self._batch_replays.get(get_ident())
+        if replay is not None:
+            return replay.command(command_string)
+        try:
+            if self.error_check_mode is None:
+                super(BaseLakeshoreMonitor, self).command(command_string)
+            else:
+                self._checked_command(command_string)
+        finally:
+            if self.config_cache is not None:
+                self.config_cache.command_sent(command_string)
+        self._sweep_errors_if_due()
+
+    def query(self, query_string):
+        replay = self._batch_replays.get(get_ident())
+        if replay is not None:
+            return replay.query(query_string)
+        config_cache = self.config_cache
+        if config_cache is not None:
+            response = config_cache.get(query_string)
+            if response is not None:
+                return response
+        if self.error_check_mode == 'deferred':
+            self._error_window.append(query_string)
+        response = super(BaseLakeshoreMonitor, self).query(query_string)
+        if config_cache is not None:
+            config_cache.put(query_string, response)
+        if self.error_check_mode == 'every_call':
+            self._error_check(self._query_event_register())
+        self._sweep_errors_if_due()
+        return response
+
+    def set_error_check_mode(self, mode, sweep_period=10.):
+        """Selects how the standard event register is checked for query, command and execution errors
+
+            Args:
+                mode (str or None):
+                    * None - no checks, the default
+                    * 'every_call' - *ESR? is read after every command and query, which raise InstrumentException on
+                        an error. Doubles the number of round trips of a read-heavy poll loop.
+                    * 'deferred' - only commands are checked as they are sent, chained with *ESR? on the same line.
+                        Queries go out unchecked and the register is swept every sweep_period seconds, an error found
+                        there is logged and kept in latched_errors with the commands and queries sent since the
+                        previous sweep. Commands sent through a QueryBatch are left to the sweep as well. An error
+                        found by a command's *ESR? may have been latched by an earlier query, so it is kept in
+                        latched_errors with the same window before the command raises.
+                sweep_period (float):
+                    seconds between sweeps in 'deferred' mode
+        """
+        if mode not in (None, 'every_call', 'deferred'):
+            raise ValueError('Unknown error check mode {}'.format(mode))
+        self.error_check_mode = mode
+        self.error_sweep_period = sweep_period
+        self._error_window.clear()
+        self._last_error_sweep = monotonic()
+
+    @staticmethod
+    def _parse_event_register(response):
+        # the 325 pads its responses with semicolons
+        return int(response.strip(';').split(';')[-1])
+
+    def _query_event_register(self):
+        return self._parse_event_register(super(BaseLakeshoreMonitor, self).query('*ESR?'))
+
+    def _checked_command(self, command_string):
+        if self.error_check_mode == 'deferred':
+            self._error_window.append(command_string)
+        line_string = command_string + ';*ESR?'
+        if len(line_string) > self.batch_line_length:
+            super(BaseLakeshoreMonitor, self).command(command_string)
+            error_code = self._query_event_register()
+        else:
+            error_code = self._parse_event_register(super(BaseLakeshoreMonitor, self).query(line_string))
+        if self.error_check_mode == 'deferred':
+            # reading *ESR? cleared the register, an error latched by an earlier unchecked query would be lost to the
+            # sweep, so it is kept with the whole window before being raised against this command
+            self._latch_error(error_code)
+        self._error_check(error_code)
+
+    def _sweep_errors_if_due(self):
+        if self.error_check_mode == 'deferred' and monotonic() - self._last_error_sweep >= self.error_sweep_period:
+            self.sweep_errors()
+
+    def sweep_errors(self):
+        """Reads and clears the standard event register, attributing any error to the commands and queries sent since
+        the previous sweep
+
+            Returns:
+                (LatchedError):
+                    or None if no error was latched
+        """
+        self._last_error_sweep = monotonic()
+        return self._latch_error(self._query_event_register())
+
+    def _latch_error(self, error_code):
+        """Keeps an error read from the standard event register with the commands and queries sent since the previous
+        read, and starts a new window"""
+        window = list(self._error_window)
+        self._error_window.clear()
+        event_register = self.EventRegister.from_integer(error_code)
+        if not (event_register.query_error or event_register.command_error or event_register.execution_error):
+            return None
+        latched_error = LatchedError(event_register, window)
+        self.latched_errors.append(latched_error)
+        logger.warning('%s: %s', self.get_instrument_name(), latched_error)
+        return latched_error
+
+    def enable_config_cache(self, ttl=300.):
+        """Answers configuration queries (curve headers, input types and curves, PID, filters, alarm and relay
+        parameters) from a cache, so repeated reads don't compete with the temperature readings for the serial line.
+        Setting the configuration through this driver invalidates the matching entries.
+
+            Args:
+                ttl (float):
+                    seconds before an entry is read from the instrument again, covers changes from the front panel
+
+            Returns:
+                (ConfigCache)
+        """
+        self.config_cache = ConfigCache(ttl)
+        return self.config_cache
+
+    def disable_config_cache(self):
+        self.config_cache = None
+
+    def refresh_config(self, query_mnemonic=None):
+        """Makes the next configuration reads go to the instrument
+
+            Args:
+                query_mnemonic (str):
+                    only refresh this query, e.g. 'PID?', refreshes everything if None
+        """
+        if self.config_cache is not None:
+            self.config_cache.invalidate(query_mnemonic)
+
+    def batch(self):
+        """Returns a QueryBatch that sends the calls added to it chained together"""
+        return QueryBatch(self)
+
+    def send_chained(self, operations):
+        """Sends commands and queries chained with semicolons in as few lines as the instrument accepts
+
+            Args:
+                operations (list):
+                    (command or query string, is_query) tuples, in the order they should run
+
+            Returns:
+                (list):
+                    the response to each operation, None for commands
+        """
+        responses = []
+        line = []
+        for string, is_query in operations:
+            line_queries = sum(line_is_query for _, line_is_query in line)
+            line_length = len(';'.join([line_string for line_string, _ in line] + [string]))
+            if line and (line_queries >= self.batch_queries_per_line or line_length > self.batch_line_length):
+                responses.extend(self._send_chained_line(line))
+                line = []
+            line.append((string, is_query))
+        if line:
+            responses.extend(self._send_chained_line(line))
+        self._sweep_errors_if_due()
+        return responses
+
+    def _send_chained_line(self, line):
+        if self.error_check_mode == 'deferred':
+            self._error_window.extend(string for string, _ in line)
+        try:
+            responses = self._send_chained_line_uncached(line)
+            if self.error_check_mode == 'every_call':
+                self._error_check(self._query_event_register())
+        finally:
+            if self.config_cache is not None:
+                for string, is_query in line:
+                    if not is_query:
+                        self.config_cache.command_sent(string)
+        if self.config_cache is not None:
+            for (string, is_query), response in zip(line, responses):
+                if is_query:
+                    self.config_cache.put(string, response)
+        return responses
+
+    def _send_chained_line_uncached(self, line):
+        line_string = ';'.join(string for string, _ in line)
+        query_count = sum(is_query for _, is_query in line)
+        if not query_count:
+            super(BaseLakeshoreMonitor, self).command(line_string)
+            return [None] * len(line)
+        # the 325 pads its responses with semicolons
+        response = super(BaseLakeshoreMonitor, self).query(line_string).strip(';')
+        # split on semicolons that aren't inside quotes
+        line_responses = re.split(''';(?=(?:[^'"]|'[^']*'|"[^"]*")*$)''', response)
+        if len(line_responses) != query_count:
+            raise InstrumentException(
+                'Expected {} responses to "{}", received "{}"'.format(query_count, line_string, response)
+            )
+        line_responses.reverse()
+        return [line_responses.pop() if is_query else None for _, is_query in line]
+
     def _error_check(self, error_code):
         event_register = self.EventRegister.from_integer(error_code)
         if event_register.query_error:
@@ -340,6 +796,28 @@ class BaseLakeshoreMonitor(ModifiedGenericInstrument):
         status_flag = StatusByteRegister.from_integer(response)
         return status_flag
 
+    def enable_new_reading_request(self):
+        """Enables only the new reading bit in the service request enable register, so the instrument requests service
+        whenever it has taken a new set of readings"""
+        self.set_service_request(
+            self.ServiceRegister(new_reading=True, alarm=False, error=False, service_request=False)
+        )
+
+    def new_reading_available(self):
+        """Returns True if the instrument has taken readings since the new reading bit was cleared, from the status
+        byte, a query with a much shorter response than the readings themselves. Neither *STB? nor the readings clear
+        the bit, see clear_new_reading"""
+        return bool(self.get_status_byte().new_reading)
+
+    def clear_new_reading(self):
+        """Clears the new reading bit of the status byte with *CLS, which clears the standard event register as well.
+        In 'deferred' error check mode the register is swept first so no error is lost. Clear it before fetching the
+        readings, a reading taken in between then sets the bit again instead of being missed."""
+        if self.error_check_mode == 'deferred':
+            self.sweep_errors()
+        # not checked, *ESR? would only see the register *CLS just cleared
+        super(BaseLakeshoreMonitor, self).command('*CLS')
+
     def get_self_test(self):
         """Instrument self test result completed at power up
 
@@ -473,6 +951,101 @@ class BaseLakeshoreMonitor(ModifiedGenericInstrument):
         curve_point = self.query("CRVPT? {},{}".format(curve, index)).split(",")
         return float(curve_point[0]), float(curve_point[1])
 
+    def get_curve(self, curve, progress=None):
+        """Returns the data points of a curve, reading as many points per line as the instrument accepts and stopping
+        at the first empty point, which ends a curve
+
+            Args:
+                curve (int):
+                    * Specifies which curve to read
+
+                progress (callable):
+                    * Called as progress(points_read, curve_points) after every line
+
+            Return:
+                data_points (list):
+                    * A list containing every point in the curve represented as a tuple
+                        * (sensor_units: float, temp_value: float)
+
+        """
+        data_points = []
+        points_per_line = max(self.batch_queries_per_line, 1)
+        for first_index in range(1, self.curve_points + 1, points_per_line):
+            indices = range(first_index, min(first_index + points_per_line, self.curve_points + 1))
+            with self.batch() as batch:
+                results = [batch.add(self.get_curve_data_point, curve, index) for index in indices]
+            for result in results:
+                if result.value == (0., 0.):
+                    if progress is not None:
+                        progress(len(data_points), self.curve_points)
+                    return data_points
+                data_points.append(result.value)
+            if progress is not None:
+                progress(len(data_points), self.curve_points)
+        return data_points
+
+    def set_curve(self, curve, data_points, curve_header=None, verify=True, progress=None):
+        """Replaces a user curve, sending as many points per line as fit
+
+            Args:
+                curve (int):
+                    * Specifies which curve to set
+
+                data_points (list):
+                    * A list containing every point in the curve represented as a tuple
+                        * (sensor_units: float, temp_value: float)
+
+                curve_header (CurveHeader):
+                    * Header to write with the curve, the curve is left without one if None
+
+                verify (bool):
+                    * Read the curve back and raise InstrumentException if it doesn't match
+
+                progress (callable):
+                    * Called as progress(points_written, number_of_points) as the upload goes
+
+        """
+        if len(data_points) > self.curve_points:
+            raise InstrumentException('A curve holds at most {} points, {} were given'.format(
+                self.curve_points, len(data_points)))
+        with self.batch() as batch:
+            batch.add(self.delete_curve, curve)
+            if curve_header is not None:
+                batch.add(self.set_curve_header, curve, curve_header)
+        for first_index in range(0, len(data_points), self.curve_upload_chunk):
+            chunk = data_points[first_index:first_index + self.curve_upload_chunk]
+            with self.batch() as batch:
+                for index, point in enumerate(chunk, first_index + 1):
+                    batch.add(self.set_curve_data_point, curve, index, point[0], point[1])
+                # waits for the instrument to work through the chunk before the next one is written
+                batch.add(self.check_operation_complete_command)
+            if progress is not None:
+                progress(first_index + len(chunk), len(data_points))
+        if verify:
+            self.verify_curve(curve, data_points)
+
+    def verify_curve(self, curve, data_points, rel_tol=1e-5, abs_tol=1e-5):
+        """Reads a curve back and compares it with the points that were written. The instrument rounds each point to
+        its display precision, so the points are compared within a tolerance.
+
+            Args:
+                curve (int):
+                    * Specifies which curve to check
+
+                data_points (list):
+                    * (sensor_units: float, temp_value: float) tuples that were written
+
+        """
+        read_points = self.get_curve(curve)
+        if len(read_points) != len(data_points):
+            raise InstrumentException('Curve {} has {} points, {} were written'.format(
+                curve, len(read_points), len(data_points)))
+        for index, (read_point, point) in enumerate(zip(read_points, data_points), 1):
+            if not all(math.isclose(read_value, float(value), rel_tol=rel_tol, abs_tol=abs_tol)
+                       for read_value, value in zip(read_point, point)):
+                raise InstrumentException('Curve {} point {} reads back as {}, {} was written'.format(
+                    curve, index, read_point, tuple(point)))
+
     def set_display_field_settings(self, field, input_channel, display_units):
         """Configures a display field in custom display mode.
 
@@ -669,6 +1242,30 @@ class BaseLakeshoreMonitor(ModifiedGenericInstrument):
                 """
         return [float(i) for i in (self.query("KRDG? {}".format(0))).split(',')]
 
+    def get_sensor_reading(self, input_channel):
+        """Returns the sensor reading in the sensor's units, see housekeeping.instruments.temperature.curves to convert
+        it to kelvin
+
+            Args:
+                input_channel:
+                    * Selects the channel to retrieve measurement.
+
+            Returns:
+                reading (float):
+                    * The raw sensor reading in the units of the connected sensor
+
+        """
+        return float(self.query("SRDG? {}".format(input_channel)))
+
+    def get_sensor_reading_all(self):
+        """Returns the sensor readings of every input in the sensors' units
+
+            Returns:
+                (list):
+                    The raw sensor readings
+        """
+        return [float(i) for i in (self.query("SRDG? {}".format(0))).split(',')]
+
     def set_keypad_lock(self, state, code):
         """Locks or unlocks front panel keypad (except for alarms and disabling heaters).
 
@@ -722,6 +1319,9 @@ class BaseLakeshoreMonitor(ModifiedGenericInstrument):
 
 class Model218Model331Overlap(BaseLakeshoreMonitor):
     SensorTypes = Model325Model331SensorTypes
+    # inputs covered by get_envelope and get_alarm_summary, set by each model
+    input_channels = ()
+    relays = ()
 
     def set_alarm_parameters(self, input_channel, alarm_enable, alarm_settings=None):
         """Configures the alarm parameters for an input
@@ -766,9 +1366,11 @@ class Model218Model331Overlap(BaseLakeshoreMonitor):
         """
         parameters = self.query("ALARM? " + str(input_channel)).split(",")
         alarm_enable = bool(int(parameters[0]))
+        # the 331 adds audible and visible, the 218 has one audible setting for all inputs (ALMB)
+        audible, visible = [bool(int(parameter)) for parameter in parameters[6:8]] or [None, None]
         alarm_settings = AlarmParameters(
-            float(parameters[1]), float(parameters[2]), float(parameters[3]), bool(int((parameters[4]))),
-            bool(int(parameters[5]))
+            int(parameters[1]), float(parameters[2]), float(parameters[3]), float(parameters[4]),
+            bool(int(parameters[5])), audible, visible
         )
         return {'alarm_enable': alarm_enable,
                 'alarm_settings': alarm_settings}
@@ -806,6 +1408,112 @@ class Model218Model331Overlap(BaseLakeshoreMonitor):
     def reset_alarm_status(self):
         self.command('ALMRST')
 
+    def set_relay_control_parameters(self, relay_number, mode, activating_input_channel=None,
+                                     alarm_relay_trigger_type=RelayControlAlarm.BOTH_ALARMS):
+        """Configures a relay
+
+            Args:
+                relay_number (int):
+                    * The relay to configure, see relays
+                mode (RelayControlMode):
+                    * Off, on, or switched by the alarms of an input
+                activating_input_channel (str):
+                    * The input whose alarms switch the relay in alarms mode, defaults to the first input
+                alarm_relay_trigger_type (RelayControlAlarm):
+                    * The alarms of the input that switch the relay in alarms mode
+        """
+        if activating_input_channel is None:
+            activating_input_channel = self.input_channels[0]
+        self.command("RELAY {},{},{},{}".format(
+            relay_number, int(mode), activating_input_channel, int(alarm_relay_trigger_type)
+        ))
+
+    def get_relay_control_parameters(self, relay_number):
+        """Returns the configuration of a relay
+
+            Return:
+                (dict):
+                    {mode: RelayControlMode, activating_input_channel: str,
+                    alarm_relay_trigger_type: RelayControlAlarm}
+        """
+        mode, activating_input_channel, alarm_relay_trigger_type = \
+            self.query("RELAY? {}".format(relay_number)).split(",")[:3]
+        return {'mode': RelayControlMode(int(mode)),
+                'activating_input_channel': activating_input_channel,
+                'alarm_relay_trigger_type': RelayControlAlarm(int(alarm_relay_trigger_type))}
+
+    def turn_relay_on(self, relay_number):
+        self.set_relay_control_parameters(relay_number, RelayControlMode.ON)
+
+    def turn_relay_off(self, relay_number):
+        self.set_relay_control_parameters(relay_number, RelayControlMode.OFF)
+
+    def set_relay_alarms(self, relay_number, activating_input_channel, alarm_relay_trigger_type):
+        """Sets a relay to turn on and off automatically based on the state of the alarm of the specified input"""
+        self.set_relay_control_parameters(
+            relay_number, RelayControlMode.ALARMS, activating_input_channel, alarm_relay_trigger_type
+        )
+
+    def get_relay_status(self, relay_number):
+        """Returns True if the relay is energized, whether switched on or by an alarm"""
+        return bool(int(self.query("RELAYST? {}".format(relay_number))))
+
+    def _add_relay_statuses(self, batch, relays):
+        """Queues the states of the relays, returns a function that gives their values once the batch is sent"""
+        results = [batch.add(self.get_relay_status, relay_number) for relay_number in relays]
+        return lambda: [result.value for result in results]
+
+    def get_alarm_summary(self, input_channels=None, relays=None):
+        """Returns the alarm and relay states of the whole instrument.
+
+        The instrument checks its alarms at its own reading rate and switches the relays itself, so this only has to
+        be polled as often as the host needs to know. The alarm states of the inputs are only queried when the status
+        byte says an alarm is on; otherwise the summary costs the status byte and the relay states.
+
+            Args:
+                input_channels (list):
+                    inputs to report, defaults to input_channels
+                relays (list):
+                    relays to report, defaults to relays
+
+            Return:
+                (dict):
+                    {alarm: bool, inputs: {input_channel: (high_state, low_state)}, relays: {relay_number: bool}}
+        """
+        if input_channels is None:
+            input_channels = self.input_channels
+        if relays is None:
+            relays = self.relays
+        with self.batch() as batch:
+            status_byte = batch.add(self.get_status_byte)
+            relay_states = self._add_relay_statuses(batch, relays)
+        alarm = bool(status_byte.value.alarm)
+        input_states = {input_channel: (False, False) for input_channel in input_channels}
+        if alarm:
+            with self.batch() as batch:
+                alarm_statuses = [batch.add(self.get_alarm_status, input_channel) for input_channel in input_channels]
+            for alarm_status in alarm_statuses:
+                input_states[alarm_status.value['input']] = (
+                    alarm_status.value['high_state'], alarm_status.value['low_state']
+                )
+        return {
+            'alarm': alarm,
+            'inputs': input_states,
+            'relays': dict(zip(relays, relay_states())),
+        }
+
+    def alarm_log_dict(self):
+        """log_dict of the alarm and relay states, 1 for on and 0 for off"""
+        summary = self.get_alarm_summary()
+        prefix = self.__class__.__name__
+        _dict = {"{}_alarm".format(prefix): int(summary['alarm'])}
+        for input_channel, (high_state, low_state) in summary['inputs'].items():
+            _dict["{}_ch{}_high_alarm".format(prefix, input_channel)] = int(high_state)
+            _dict["{}_ch{}_low_alarm".format(prefix, input_channel)] = int(low_state)
+        for relay_number, relay_state in summary['relays'].items():
+            _dict["{}_relay{}".format(prefix, relay_number)] = int(relay_state)
+        return _dict
+
     def set_analog_output_parameters(
             self, output, bipolar_enable, mode, temperature_input, source, high_value, low_value, manual_value
     ):
@@ -881,6 +1589,71 @@ class Model218Model331Overlap(BaseLakeshoreMonitor):
     def get_baud_rate(self):
         return self.Baud(int(self.query('BAUD?')))
 
+    def get_min_max_data(self, input_channel):
+        """Returns the minimum and maximum data from an input
+
+            Args:
+                input_channel (str):
+                    Specifies which input to query
+            Return:
+                min_max_data (dict):
+                    * [minimum: float, maximum: float]
+
+        """
+        min_max_data = self.query("MDAT? " + str(input_channel)).split(",")
+        min_max_dictionary = {"minimum": float(min_max_data[0]),
+                              "maximum": float(min_max_data[1])}
+        return min_max_dictionary
+
+    def reset_min_max_data(self):
+        """Resets the minimum and maximum input data"""
+        self.command("MNMXRST")
+
+    def _add_kelvin_readings(self, batch, input_channels):
+        """Queues the readings of the inputs, returns a function that gives their values once the batch is sent"""
+        results = [batch.add(self.get_kelvin_reading, input_channel) for input_channel in input_channels]
+        return lambda: [result.value for result in results]
+
+    def get_envelope(self, input_channels=None):
+        """Returns the present reading of each input and the extremes the instrument saw since the last call, then
+        resets the extremes. Polled slowly, this still keeps every excursion between polls.
+
+            Args:
+                input_channels (list):
+                    inputs to read, defaults to input_channels
+
+            Return:
+                (dict):
+                    {input_channel: (kelvin, minimum, maximum)}, the extremes are in the units selected with MNMX,
+                    Kelvin by default
+        """
+        if input_channels is None:
+            input_channels = self.input_channels
+        with self.batch() as batch:
+            readings = self._add_kelvin_readings(batch, input_channels)
+            extremes = [batch.add(self.get_min_max_data, input_channel) for input_channel in input_channels]
+            batch.add(self.reset_min_max_data)
+        return {
+            input_channel: (reading, extreme.value['minimum'], extreme.value['maximum'])
+            for input_channel, reading, extreme in zip(input_channels, readings(), extremes)
+        }
+
+    def read_values(self):
+        with self.batch() as batch:
+            readings = self._add_kelvin_readings(batch, self.input_channels)
+        return tuple(readings())
+
+    def envelope_log_dict(self):
+        """log_dict with the minimum and maximum since the previous call next to each reading"""
+        _dict = {}
+        prefix = self.__class__.__name__
+        for input_channel, (kelvin, minimum, maximum) in self.get_envelope().items():
+            key = "{}_ch{}".format(prefix, input_channel)
+            _dict[key] = kelvin
+            _dict[key + '_min'] = minimum
+            _dict[key + '_max'] = maximum
+        return _dict
+
 
 '''
     def set_to_factory_defaults(self):
@@ -909,27 +1682,6 @@ class Model218Model331Overlap(BaseLakeshoreMonitor):
         return reading_status
 
     
-    def get_sensor_reading(self, input_channel):
-        """Returns the sensor reading in the sensor's units.
-
-            Args:
-                input_channel:
-                    * Selects the channel to retrieve measurement.
-                    * Options are:
-                        * A
-                        * B
-                        * C(1 - 5)
-                        * D(1 - 5)
-
-            Returns:
-                reading (float):
-                    * The raw sensor reading in the units of the connected sensor
-
-        """
-
-        return float(self.query("SRDG? {}".format(input_channel)))
-
-   
     def get_all_inputs_celsius_reading(self):
         """Returns the temperature reading in degrees Celsius of all the inputs.
 
@@ -1070,28 +1822,6 @@ class Model218Model331Overlap(BaseLakeshoreMonitor):
 
 
 
-    def get_min_max_data(self, input_channel):
-        """Returns the minimum and maximum data from an input
-
-            Args:
-                input_channel (str):
-                    Specifies which input to query
-            Return:
-                min_max_data (dict):
-                    * [minimum: float, maximum: float]
-
-        """
-        min_max_data = self.query("MDAT? " + str(input_channel)).split(",")
-        min_max_dictionary = {"minimum": float(min_max_data[0]),
-                              "maximum": float(min_max_data[1])}
-        return min_max_dictionary
-
-    def reset_min_max_data(self):
-        """Resets the minimum and maximum input data"""
-        self.command("MNMXRST")
-
-    
-
     def set_website_login(self, username, password):
         """Sets the username and password to connect instrument to website.
 
@@ -1166,66 +1896,6 @@ class Model218Model331Overlap(BaseLakeshoreMonitor):
                                                               calibration_point_2[0], calibration_point_2[1],
                                                               calibration_point_3[0], calibration_point_3[1]))
 
-    def get_curve(self, curve):
-        """Returns a list of all the data points in a particular curve
-
-            Args:
-                curve (int):
-                    * Specifies which curve to set
-
-            Return:
-                data_points (list):
-                    * A list containing every point in the curve represented as a tuple
-                        * (sensor_units: float, temp_value: float)
-
-        """
-
-        data_points = []
-        true_point_index = 0
-        for i in range(0, 200):
-            point = self.get_curve_data_point(curve, i + 1)
-            data_points.append(point)
-            if point[0] != 0 or point[1] != 0:
-                true_point_index = i
-
-        # Remove all extraneous points
-        data_points = data_points[:true_point_index + 1]
-
-        return data_points
-
-    def set_curve(self, curve, data_points):
-        """Method to define a user curve using a list of data points
-
-            Args:
-                curve (int):
-                    * Specifies which curve to set
-
-                data_points (list):
-                    * A list containing every point in the curve represented as a tuple
-                        * (sensor_units: float, temp_value: float)
-
-        """
-
-        self.delete_curve(curve)
-
-        for index, point in data_points:
-            self.set_curve_data_point(curve, index + 1, point[0], point[1])
-
-    def get_relay_status(self, relay_channel):
-        """Returns whether the specified relay is On or Off.
-
-            Args:
-                relay_channel (int)
-                    * The relay channel to query.
-                    * Options are:
-                        * 1 or 2
-
-            Returns:
-                (bool):
-                    * True if relay is on, False if relay is off.
-        """
-        return bool(int(self.query("RELAYST? " + str(relay_channel))))
-
     
     def configure_input(self, input_channel, settings):
         """Configures a sensor for measurement input readings.
@@ -1361,101 +2031,13 @@ class Model218Model331Overlap(BaseLakeshoreMonitor):
             return_dictionary = {'display_mode': Model224DisplayMode(display_mode),
                                  'number_of_fields': Model224NumberOfFields(number_of_fields)}
         return return_dictionary
-
-    def turn_relay_on(self, relay_number):
-        """Turns the specified relay on.
-
-            Args:
-                relay_number (int):
-                    * The relay to turn on.
-                    * Options are:
-                        * 1 or 2
-
-        """
-        self.command("RELAY {},1,0,0".format(relay_number))
-
-    def turn_relay_off(self, relay_number):
-        """Turns the specified relay off.
-
-            Args:
-                relay_number (int):
-                    * The relay to turn off.
-                    * Options are:
-                        * 1 or 2
-
-        """
-        self.command("RELAY {},0,0,0".format(relay_number))
-
-    def set_relay_alarms(self, relay_number, activating_input_channel, alarm_relay_trigger_type):
-        """Sets a relay to turn on and off automatically based on the state of the alarm of the specified input channel.
-
-            Args:
-                relay_number (int):
-                    * The relay to configure.
-                    * Options are:
-                        * 1 or 2
-
-                activating_input_channel (str):
-                    * Specifies which input alarm activates the relay when the relay is in alarm mode
-                    * Only applies if ALARM mode is chosen.
-                    * Options are:
-                        * A
-                        * B
-                        * C(1 - 5)
-                        * D(1 - 5)
-
-                alarm_relay_trigger_type (Model224RelayControlAlarm):
-                    * Specifies the type of alarm that triggers the relay
-                    * Only applies if ALARM mode is chosen.
-
-        """
-        self.command("RELAY {},2,{},{}".format(relay_number, activating_input_channel, alarm_relay_trigger_type))
-
-    def get_relay_alarm_control_parameters(self, relay_number):
-        """Returns the relay alarm configuration for either of the two configurable relays. Relay must be
-        configured for alarm mode to retrieve parameters.
-
-            Args:
-                relay_number (int)
-                    * Specifies which relay to query
-                    * Options are:
-                        * 1 or 2
-
-            Return:
-                (dict):
-                    {activating_input_channel: str, alarm_relay_trigger_type: Model224RelayControlAlarm}
-
-        """
-
-        relay_config = self.query("RELAY? {}".format(relay_number)).split(",")
-        activating_input_channel = relay_config[1]
-        alarm_relay_trigger_type = Model224RelayControlAlarm(int(relay_config[2]))
-        return {'activating_input_channel': activating_input_channel,
-                'alarm_relay_trigger_type': alarm_relay_trigger_type}
-
-    def get_relay_control_mode(self, relay_number):
-        """Returns the configured mode of the specified relay.
-
-            Args:
-                relay_number (int):
-                    * Specifies which relay to query
-                    * Options are:
-                        * 1 or 2
-
-            Returns:
-                (Model224RelayControlMode):
-                    * The configured mode of the relay, represented as an object of the enum type
-                        Model224RelayControlMode
-
-        """
-        relay_settings = self.query("RELAY? " + str(relay_number))
-        split_relay_settings = relay_settings.split(",")
-        return Model224RelayControlMode(int(split_relay_settings[0]))
 '''
 
 
 class BaseLakeshoreController(BaseLakeshoreMonitor):
     _heater_error_enum = HeaterError
+    # the 325 and 331 don't accept 0 for all inputs, every reading names one
+    input_channels = ('A', 'B')
 
     def get_heater_output(self, output):
         """Sample heater output in percent, scale is dependent upon the instrument used and heater configuration
@@ -1643,3 +2225,34 @@ class BaseLakeshoreController(BaseLakeshoreMonitor):
                     * Control setpoint value
         """
         return float(self.query("SETP? {}".format(output)))
+
+    def get_control_snapshot(self, output):
+        """Returns the readings and control loop state of an output, queued as one batch
+
+            Args:
+                output (int):
+                    * Specifies which output's control loop to query
+
+            Return:
+                (dict):
+                    * Keys:
+                    * "kelvin_readings": list, one per input_channels
+                    * "heater_output": float
+                    * "setpoint": float
+                    * "heater_range": HeaterRange
+                    * "pid": dict, see get_heater_pid
+
+        """
+        with self.batch() as batch:
+            kelvin_readings = [
+                batch.add(self.get_kelvin_reading, input_channel) for input_channel in self.input_channels
+            ]
+            heater_output = batch.add(self.get_heater_output, output)
+            setpoint = batch.add(self.get_setpoint, output)
+            heater_range = batch.add(self.get_heater_range, output)
+            pid = batch.add(self.get_heater_pid, output)
+        return {"kelvin_readings": [reading.value for reading in kelvin_readings],
+                "heater_output": heater_output.value,
+                "setpoint": setpoint.value,
+                "heater_range": heater_range.value,
+                "pid": pid.value}
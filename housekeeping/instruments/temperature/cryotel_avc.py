@@ -1,12 +1,22 @@
 import serial
-from time import sleep
 
 from lakeshore.generic_instrument import InstrumentException
 
+from housekeeping.instruments.base.exchange import ReadAll, ReadLines, ResetInput, Sleep
 from housekeeping.instruments.base.modified_generic_instrument import ModifiedGenericInstrument
+from housekeeping.instruments.base.reading_schema import Channel, ReadingSchema
 
 
 class CryotelAVC(ModifiedGenericInstrument):
+    # the status lines of delim_order
+    reading_schema = ReadingSchema([
+        Channel('Power_Measured', 'W'),
+        Channel('Power_Commanded', 'W'),
+        Channel('Target_Temp', 'K'),
+        Channel('Reject_Temp', 'K'),
+        Channel('Coldhead_Temp', 'K'),
+    ])
+
     def __init__(
             self,
             serial_number=None,
@@ -62,23 +72,28 @@ class CryotelAVC(ModifiedGenericInstrument):
     #     print(_cmd)
     #     self.device_serial.write(_cmd)
 
-    def _usb_query(self, query):
-        """Query over the serial USB connection"""
+    def _query_exchange(self, query):
+        """Framing of a query, see housekeeping.instruments.base.exchange"""
         query = query.upper()
-        self._usb_command(query)
-        # sleep(1)
-        # response = self.device_serial.read(5)
+        # drop anything left over from a previous reply, e.g. the \n after its last \r
+        yield ResetInput()
+        yield from self._command_exchange(query)
         _cmd = query.split('=')[0].strip()
-        # response = ''
-        # for l in range(self.command_return_lines[_cmd]):
-        #     response += self.device_serial.read_until(self.serial_cmd_termination).decode('ascii') + '\n'
-        sleep(0.5)
-        response = self.device_serial.read_all().decode('ascii')
-        # print(response)
+        line_count = self.command_return_lines.get(_cmd)
+        if line_count is None:
+            # unknown reply length, give the controller time to answer and take whatever arrived
+            yield Sleep(0.5)
+            response = (yield ReadAll()).decode('ascii')
+        else:
+            # returns as soon as the last line arrives, the port timeout only caps the wait
+            response = (yield ReadLines(self.serial_cmd_termination, line_count)).decode('ascii')
+            if response.count(self.serial_cmd_termination.decode('ascii')) < line_count:
+                # the timeout cut the reply short, it mustn't teach the adaptive timeout that this is how long it takes
+                self._short_reply = True
         # If nothing is returned, raise a timeout error.
         if not response:
             raise InstrumentException("Communication timed out")
-        return response.rstrip()
+        return response.strip()
 
     @staticmethod
     def warn_no_arguments(command, argument):
@@ -226,3 +241,7 @@ class CryotelAVC(ModifiedGenericInstrument):
         status = self.get_status_dict()
         status_list = [status[key] for key in self.delim_order]
         return delim.join(status_list)
+
+    def read_values(self):
+        status = self.get_status_dict()
+        return tuple(float(status[key]) for key in self.delim_order)
@@ -0,0 +1,208 @@
+"""
+Temperature sensor curves held locally in numpy arrays.
+
+Curves can be read from and written to Lake Shore .340 files and to the instruments' curve tables, and convert raw
+sensor readings (SRDG?) to Kelvin the way the instruments do, by linear interpolation between breakpoints. With the
+curves on disk, raw sensor units can be logged at a high rate and converted afterwards in bulk, or converted again
+after a recalibration:
+
+    curve = Curve.read_340('DT670.340')
+    kelvin = curve.to_kelvin(monitor.get_sensor_reading_all())
+
+    curve = Curve.from_instrument(monitor, 21)
+    curve.write_340('input_a.340')
+"""
+import re
+
+import numpy as np
+
+from housekeeping.instruments.temperature.base_lakeshore import (
+    CurveHeader, CurveFormat, CurveTemperatureCoefficients
+)
+
+# header lines of a .340 file, in the order they're written
+header_340_fields = [
+    'Sensor Model', 'Serial Number', 'Data Format', 'SetPoint Limit', 'Temperature coefficient', 'Number of Breakpoints'
+]
+format_340_descriptions = {
+    CurveFormat.MILLIVOLT_PER_KELVIN: 'mV/K',
+    CurveFormat.VOLTS_PER_KELVIN: 'V/K',
+    CurveFormat.OHMS_PER_KELVIN: 'Ohms/K',
+    CurveFormat.LOG_OHMS_PER_KELVIN: 'Log Ohms/K',
+}
+
+
+class Curve:
+    """Breakpoints of a sensor curve, sorted by ascending sensor units"""
+
+    def __init__(self, header, units, kelvin):
+        """
+        Parameters
+        ----------
+        header : CurveHeader
+            name, serial number, data format, temperature limit and coefficient
+        units : array_like
+            sensor units of each breakpoint, log10(Ohms) for CurveFormat.LOG_OHMS_PER_KELVIN
+        kelvin : array_like
+            temperature of each breakpoint
+        """
+        units = np.asarray(units, dtype=float)
+        kelvin = np.asarray(kelvin, dtype=float)
+        if units.shape != kelvin.shape or units.ndim != 1:
+            raise ValueError('units and kelvin must be one dimensional and of the same length')
+        order = np.argsort(units, kind='stable')
+        self.header = header
+        self.units = units[order]
+        self.kelvin = kelvin[order]
+
+    def __len__(self):
+        return len(self.units)
+
+    @property
+    def data_format(self):
+        return CurveFormat(int(self.header.curve_data_format))
+
+    @property
+    def data_points(self):
+        """(sensor_units, kelvin) tuples, as taken by set_curve"""
+        return list(zip(self.units.tolist(), self.kelvin.tolist()))
+
+    def _to_curve_units(self, sensor_units):
+        sensor_units = np.asarray(sensor_units, dtype=float)
+        if self.data_format != CurveFormat.LOG_OHMS_PER_KELVIN:
+            return sensor_units
+        # readings are in Ohms, the breakpoints in log10(Ohms)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.log10(sensor_units)
+
+    def to_kelvin(self, sensor_units):
+        """Converts raw sensor readings to Kelvin
+
+            Args:
+                sensor_units (float or array_like):
+                    readings as returned by SRDG?, in Volts, mV or Ohms (not log Ohms) depending on the sensor
+
+            Returns:
+                (float or numpy.ndarray):
+                    temperatures, NaN for readings outside the curve
+        """
+        kelvin = np.interp(self._to_curve_units(sensor_units), self.units, self.kelvin, left=np.nan, right=np.nan)
+        return kelvin if kelvin.ndim else float(kelvin)
+
+    def to_sensor_units(self, kelvin):
+        """Converts temperatures to the sensor readings that correspond to them, NaN outside the curve"""
+        kelvin = np.asarray(kelvin, dtype=float)
+        # temperature falls with rising units for a negative coefficient, np.interp needs ascending x
+        order = np.argsort(self.kelvin, kind='stable')
+        units = np.interp(kelvin, self.kelvin[order], self.units[order], left=np.nan, right=np.nan)
+        if self.data_format == CurveFormat.LOG_OHMS_PER_KELVIN:
+            units = 10 ** units
+        return units if units.ndim else float(units)
+
+    @classmethod
+    def from_instrument(cls, instrument, curve, progress=None):
+        """Downloads a curve and its header from a Lake Shore monitor or controller
+
+            Args:
+                instrument (BaseLakeshoreMonitor):
+                    connected instrument
+                curve (int):
+                    curve number
+                progress (callable):
+                    see BaseLakeshoreMonitor.get_curve
+        """
+        header = instrument.get_curve_header(curve)
+        data_points = instrument.get_curve(curve, progress)
+        units = [point[0] for point in data_points]
+        kelvin = [point[1] for point in data_points]
+        return cls(header, units, kelvin)
+
+    def to_instrument(self, instrument, curve, verify=True, progress=None):
+        """Uploads the curve and its header to a user curve of a Lake Shore monitor or controller, see set_curve"""
+        instrument.set_curve(curve, self.data_points, self.header, verify, progress)
+
+    @classmethod
+    def read_340(cls, path):
+        """Reads a Lake Shore .340 curve file"""
+        with open(path) as f:
+            return cls.parse_340(f.read())
+
+    @classmethod
+    def parse_340(cls, text):
+        fields = {}
+        units = []
+        kelvin = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if ':' in line:
+                key, _, value = line.partition(':')
+                fields[key.strip().lower()] = value.strip()
+                continue
+            values = line.split()
+            try:
+                numbers = [float(value) for value in values]
+            except ValueError:
+                # the column titles
+                continue
+            if len(numbers) != 3:
+                raise ValueError('Unexpected breakpoint line in .340 file: {}'.format(line))
+            units.append(numbers[1])
+            kelvin.append(numbers[2])
+
+        def leading_number(key, default):
+            # values are followed by a description, e.g. "2      (Volts/Kelvin)"
+            match = re.match(r'[-+\d.eE]+', fields.get(key, ''))
+            return match.group(0) if match else default
+
+        header = CurveHeader(
+            fields.get('sensor model', ''),
+            fields.get('serial number', ''),
+            CurveFormat(int(leading_number('data format', CurveFormat.VOLTS_PER_KELVIN))),
+            float(leading_number('setpoint limit', 0.)),
+            CurveTemperatureCoefficients(int(leading_number('temperature coefficient', 1)))
+        )
+        expected = fields.get('number of breakpoints')
+        if expected is not None and int(leading_number('number of breakpoints', 0)) != len(units):
+            raise ValueError('.340 file lists {} breakpoints but holds {}'.format(expected, len(units)))
+        return cls(header, units, kelvin)
+
+    def format_340(self):
+        """Returns the curve as the text of a .340 file"""
+        data_format = self.data_format
+        coefficient = CurveTemperatureCoefficients(int(self.header.coefficient))
+        values = [
+            self.header.curve_name,
+            self.header.serial_number,
+            '{}      ({})'.format(int(data_format), format_340_descriptions[data_format]),
+            '{:.3f}      (Kelvin)'.format(float(self.header.temperature_limit)),
+            '{} ({})'.format(int(coefficient), coefficient.name.capitalize()),
+            '{}'.format(len(self)),
+        ]
+        lines = ['{:<26}{}'.format(field + ':', value) for field, value in zip(header_340_fields, values)]
+        lines += ['', 'No.   Units      Temperature (K)', '']
+        lines += ['{:>3}  {:<12.6g} {:.6g}'.format(index, unit, kelvin)
+                  for index, (unit, kelvin) in enumerate(zip(self.units, self.kelvin), 1)]
+        return '\r\n'.join(lines) + '\r\n'
+
+    def write_340(self, path):
+        """Writes the curve as a Lake Shore .340 file"""
+        with open(path, 'w', newline='') as f:
+            f.write(self.format_340())
+
+
+def convert_columns(data, curves):
+    """Converts logged sensor readings to Kelvin in bulk
+
+        Args:
+            data (dict or pandas.DataFrame):
+                columns of raw sensor readings
+            curves (dict):
+                {column: Curve} for the columns to convert
+
+        Returns:
+            (dict):
+                {column: numpy array of Kelvin} for every column in curves
+    """
+    return {column: curve.to_kelvin(data[column]) for column, curve in curves.items()}
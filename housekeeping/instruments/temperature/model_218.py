@@ -1,11 +1,16 @@
-import os
 from time import sleep
-from datetime import date, datetime
+from datetime import datetime
 
+from housekeeping.acquisition.log_writer import LogWriter
+from housekeeping.instruments.base.reading_schema import Channel, ReadingSchema
 from housekeeping.instruments.temperature.base_lakeshore import Model218Model331Overlap
 
 
 class Model218(Model218Model331Overlap):
+    input_channels = tuple(range(1, 9))
+    relays = tuple(range(1, 9))
+    reading_schema = ReadingSchema(Channel('ch{}'.format(i), 'K') for i in input_channels)
+
     def set_date_time(self, date_time=None):
         if date_time is not None:
             assert isinstance(date_time, datetime)
@@ -33,27 +38,27 @@ class Model218(Model218Model331Overlap):
         response = self.query('INPUT? {}'.format(temperature_input))
         return bool(int(response))
 
-    def log_dict(self):
-        _dict = {}
-        prefix = self.__class__.__name__
-        for i, v in enumerate(self.get_kelvin_reading_all()):
-            _dict["{}_ch{}".format(prefix, i+1)] = v
+    def _add_kelvin_readings(self, batch, input_channels):
+        # all eight inputs in one query
+        readings = batch.add(self.get_kelvin_reading_all)
+        return lambda: [readings.value[int(input_channel) - 1] for input_channel in input_channels]
+
+    def get_relay_status_all(self):
+        """Returns the state of all eight relays, from one query"""
+        relay_status = int(self.query('RELAYST?'))
+        return [bool(relay_status & 1 << index) for index in range(len(self.relays))]
+
+    def _add_relay_statuses(self, batch, relays):
+        relay_statuses = batch.add(self.get_relay_status_all)
+        return lambda: [relay_statuses.value[int(relay_number) - 1] for relay_number in relays]
 
 
 if __name__ == '__main__':
     monitor = Model218(com_port='COM10')
     print(monitor.model_number)
-    save_file = date.isoformat(date.today()) + '.tsv'
-    header = 'timestamp\t' + '\t'.join(['temp{}'.format(i) for i in range(1, 9)]) + '\n'
-    if not os.path.isfile(save_file):
-        with open(save_file, 'w') as f:
-            f.write(header)
-    while True:
-        timestamp = datetime.now()
-        temps = monitor.get_kelvin_reading_all()
-        templine = datetime.isoformat(timestamp) + '\t' + '\t'.join([str(i) for i in temps]) + '\n'
-        print(templine.strip())
-        # print(monitor.query('IEEE?'))
-        with open(save_file, 'a') as f:
-            f.write(templine)
-        sleep(5)
+    with LogWriter(columns=['temp{}'.format(i) for i in range(1, 9)]) as writer:
+        while True:
+            temps = monitor.get_kelvin_reading_all()
+            print(writer.write(temps))
+            # print(monitor.query('IEEE?'))
+            sleep(5)
@@ -1,17 +1,25 @@
-import os
 from time import sleep
-from datetime import date, datetime
 
+from housekeeping.acquisition.log_writer import LogWriter
+from housekeeping.instruments.base.reading_schema import Channel, ReadingSchema
 from housekeeping.instruments.temperature.base_lakeshore import BaseLakeshoreController, HeaterRange
 
 
 class Model325(BaseLakeshoreController):
+    input_channels = ('A', 'B')
+    reading_schema = ReadingSchema(Channel('ch{}'.format(i), 'K') for i in input_channels)
+
     def query(self, query_string):
         return super(BaseLakeshoreController, self).query(query_string).strip(';')
 
     def command(self, command_string):
         super(BaseLakeshoreController, self).command(command_string)
 
+    def read_values(self):
+        with self.batch() as batch:
+            readings = [batch.add(self.get_kelvin_reading, input_channel) for input_channel in self.input_channels]
+        return tuple(reading.value for reading in readings)
+
 
 if __name__ == '__main__':
     monitor = Model325(com_port='COM5')
@@ -23,16 +31,8 @@ if __name__ == '__main__':
     print(monitor.get_setpoint(heater_input))
     print(monitor.get_heater_pid(heater_input))
     print(monitor.get_heater_range(heater_input))
-    save_file = date.isoformat(date.today()) + '.tsv'
-    header = 'timestamp\t' + '\t'.join(['temp{}'.format(i) for i in range(1, 9)]) + '\n'
-    if not os.path.isfile(save_file):
-        with open(save_file, 'w') as f:
-            f.write(header)
-    while True:
-        timestamp = datetime.now()
-        temps = monitor.get_kelvin_reading_all()
-        templine = datetime.isoformat(timestamp) + '\t' + '\t'.join([str(i) for i in temps]) + '\n'
-        print(templine.strip())
-        with open(save_file, 'a') as f:
-            f.write(templine)
-        sleep(5)
+    with LogWriter() as writer:
+        while True:
+            temps = monitor.get_kelvin_reading_all()
+            print(writer.write({'temp{}'.format(i): temp for i, temp in enumerate(temps, 1)}))
+            sleep(5)
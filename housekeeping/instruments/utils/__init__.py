@@ -1,9 +1,17 @@
+import json
+from importlib import import_module
+
 from housekeeping.instruments.temperature.model_325 import Model325
 from housekeeping.instruments.temperature.model_331 import Model331
 from housekeeping.instruments.temperature.model_218 import Model218
 from housekeeping.instruments.temperature.cryotel_avc import CryotelAVC
 from housekeeping.instruments.pressure.lesker392 import Lesker392
+from housekeeping.instruments.pressure.mks_392b_rs485 import MKS392BRS485
 from housekeeping.instruments.pressure.pfeiffer import PfeifferDualGauge
+from housekeeping.instruments.motors.motor_serial import LinearStageMotorCom, FilterWheelMotorCom
+
+# the module name contains dashes, so it can't be imported with a plain import statement
+SeeedSTH01 = import_module('housekeeping.instruments.humidity.seeed_s-th-01').SeeedSTH01
 
 temperature_controller = {
     "Model325": Model325,
@@ -17,5 +25,60 @@ temperature_monitor = {
 
 pressure = {
     "Lesker392": Lesker392,
-    "PfeifferDualGauge": PfeifferDualGauge
+    "PfeifferDualGauge": PfeifferDualGauge,
+    "MKS972B": MKS392BRS485
+}
+
+motor_controller = {
+    "LinearStage": LinearStageMotorCom,
+    "FilterWheel": FilterWheelMotorCom
+}
+
+humidity_sensor = {
+    "HTSens": SeeedSTH01
+}
+
+# keys match the top level sections of devices.json
+device_types = {
+    "Pressure": pressure,
+    "TemperatureMonitor": temperature_monitor,
+    "TemperatureController": temperature_controller,
+    "MotorController": motor_controller,
+    "HumiditySensor": humidity_sensor
 }
+
+
+def flatten_devices(devices):
+    """Flattens a devices.json style dictionary
+
+        Args:
+            devices (dict):
+                {device_type: {device_name: [device_dict, ...]}}
+
+        Returns:
+            (dict):
+                {'{device_type}_{device_name}_{device_number}': (device_type, device_name, device_dict)}
+    """
+    devices_flattened = {}
+    for device_type, device_type_dict in devices.items():
+        for device_name, device_list in device_type_dict.items():
+            for device_number, device_dict in enumerate(device_list):
+                devices_flattened[f'{device_type}_{device_name}_{device_number}'] = (
+                    device_type, device_name, device_dict
+                )
+    return devices_flattened
+
+
+def load_devices(devices_file):
+    """Reads a devices.json file and returns it flattened, see flatten_devices"""
+    with open(devices_file) as f:
+        devices = json.load(f)
+    return flatten_devices(devices)
+
+
+def get_device_class(device_type, device_name):
+    """Returns the instrument class for a devices.json entry"""
+    try:
+        return device_types[device_type][device_name]
+    except KeyError:
+        raise KeyError('No instrument class registered for {} {}'.format(device_type, device_name))
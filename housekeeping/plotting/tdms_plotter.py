@@ -1,10 +1,13 @@
 import os
+from datetime import datetime, timedelta
 
 from matplotlib import pyplot as plt
 from nptdms import TdmsFile
 import numpy as np
 import pandas as pd
 
+from housekeeping.acquisition.rollup import plot_rollup, rollup_frame
+
 tdms_dir = r'G:\RIMAS TDMS archive'
 all_files = os.listdir(tdms_dir)
 tdms_prefixes = ['2024_{:03d}'.format(i) for i in range(257, 266)]
@@ -14,6 +17,12 @@ for prefix in tdms_prefixes:
         if f.startswith(prefix) and f.endswith('.tdms'):
             tdms_filenames.append(os.path.join(tdms_dir, f))
 print('\n'.join(tdms_filenames))
+# days of the files, UTC
+tdms_start = datetime.strptime(tdms_prefixes[0], '%Y_%j')
+tdms_end = datetime.strptime(tdms_prefixes[-1], '%Y_%j') + timedelta(days=1)
+# the groups are rolled up into this directory once and plotted from the coarsest tier that fills the plot, instead of
+# reading every file on each run (see housekeeping.acquisition.rollup)
+rollup_dir = None
 # tdms_filename = r'C:\Users\gsfcprime\Documents\LabVIEW Data\TDMS\2024_182_01_Camera Control.tdms'
 # tdms_filename = r'C:\Users\gsfcprime\Documents\LabVIEW Data\TDMS\2024_196_01_Camera Control.tdms'
 # tdms_filename = r'C:\Users\gsfcprime\Documents\LabVIEW Data\TDMS\2024_175_01_Camera Control.tdms'
@@ -28,16 +37,36 @@ print('\n'.join(tdms_filenames))
 # ls336_data = tdms['Lakeshore 336'].as_dataframe()
 # runaway test is ~2024_262
 
+
+def tdms_rollup(group):
+    """Returns the rollup directory of a TDMS group, after rolling up the files that aren't in it yet"""
+    directory = os.path.join(rollup_dir, group)
+    os.makedirs(directory, exist_ok=True)
+    listing_path = os.path.join(directory, 'tdms_files.txt')
+    rolled_up = set()
+    if os.path.exists(listing_path):
+        with open(listing_path) as listing:
+            rolled_up = set(listing.read().splitlines())
+    for tdms_filename in tdms_filenames:
+        if os.path.basename(tdms_filename) in rolled_up:
+            continue
+        try:
+            group_data = TdmsFile.read(tdms_filename)[group].as_dataframe()
+        except (ValueError, KeyError):
+            print('{} Value/Key Error: '.format(group), tdms_filename)
+            continue
+        # the timestamps go first
+        rollup_frame(directory, group_data[['Timestamp'] + [c for c in group_data.columns if c != 'Timestamp']])
+        with open(listing_path, 'a') as listing:
+            listing.write(os.path.basename(tdms_filename) + '\n')
+    return directory
+
+
 plt_ls336 = False
 plt_cryocooler = False
 plt_pressure = True
 
 if plt_ls336:
-    ls336_data = pd.concat(
-        [TdmsFile.read(tdms_filename)['Lakeshore 336'].as_dataframe() for tdms_filename in tdms_filenames],
-        ignore_index=True
-    )
-
     channels = [
         # 'Timestamp',
         'LS336 Input A',
@@ -49,8 +78,6 @@ if plt_ls336:
         'LS336 Input D4'
     ]
 
-    timestamp = ls336_data['Timestamp']
-    temperatures = ls336_data[channels]
     fig = plt.figure()
     # major_yticks = np.arange(90, 110, 1.0)
     # minor_yticks = np.arange(90, 110, 0.2)
@@ -64,7 +91,15 @@ if plt_ls336:
     ax = fig.add_subplot(1, 1, 1)
     ax.set_yticks(major_yticks)
     ax.set_yticks(minor_yticks, minor=True)
-    ax.plot(timestamp, temperatures)
+    if rollup_dir is None:
+        ls336_data = pd.concat(
+            [TdmsFile.read(tdms_filename)['Lakeshore 336'].as_dataframe() for tdms_filename in tdms_filenames],
+            ignore_index=True
+        )
+        timestamp = ls336_data['Timestamp']
+        ax.plot(timestamp, ls336_data[channels])
+    else:
+        timestamp = plot_rollup(ax, tdms_rollup('Lakeshore 336'), channels, tdms_start, tdms_end)['timestamp']
     ax.grid(which='both')
     ax.grid(which='minor', alpha=0.2)
     ax.grid(which='major', alpha=0.5)
@@ -78,13 +113,6 @@ if plt_ls336:
     plt.show()
 
 if plt_cryocooler:
-    cryocooler_data = []
-    for tdms_filename in tdms_filenames:
-        try:
-            cryocooler_data.append(TdmsFile.read(tdms_filename)['CryoCooler'].as_dataframe())
-        except (ValueError, KeyError):
-            print('Cryocooler Value/Key Error: ', tdms_filename)
-    cryocooler_data = pd.concat(cryocooler_data, ignore_index=True)
     cc_channels = [
         'Cryo1Power Measured',
         'Cryo1Coldhead Temp',
@@ -96,9 +124,6 @@ if plt_cryocooler:
         'Cryo3Coldhead Temp',
         'Cryo3Reject Temp',
     ]
-    print(cryocooler_data)
-    cc_timestamp = cryocooler_data['Timestamp']
-
     fig = plt.figure()
     # major_yticks = np.arange(90, 110, 1.0)
     # minor_yticks = np.arange(90, 110, 0.2)
@@ -112,7 +137,19 @@ if plt_cryocooler:
     ax = fig.add_subplot(1, 1, 1)
     ax.set_yticks(major_yticks)
     ax.set_yticks(minor_yticks, minor=True)
-    ax.plot(cc_timestamp, cryocooler_data[cc_channels])
+    if rollup_dir is None:
+        cryocooler_data = []
+        for tdms_filename in tdms_filenames:
+            try:
+                cryocooler_data.append(TdmsFile.read(tdms_filename)['CryoCooler'].as_dataframe())
+            except (ValueError, KeyError):
+                print('Cryocooler Value/Key Error: ', tdms_filename)
+        cryocooler_data = pd.concat(cryocooler_data, ignore_index=True)
+        print(cryocooler_data)
+        cc_timestamp = cryocooler_data['Timestamp']
+        ax.plot(cc_timestamp, cryocooler_data[cc_channels])
+    else:
+        cc_timestamp = plot_rollup(ax, tdms_rollup('CryoCooler'), cc_channels, tdms_start, tdms_end)['timestamp']
     ax.grid(which='both')
     ax.grid(which='minor', alpha=0.2)
     ax.grid(which='major', alpha=0.5)
@@ -127,21 +164,9 @@ if plt_cryocooler:
     plt.show()
 
 if plt_pressure:
-    pressure_data = []
-    for tdms_filename in tdms_filenames:
-        try:
-            pressure_data.append(TdmsFile.read(tdms_filename)['Pressure Monitor'].as_dataframe())
-        except (ValueError, KeyError):
-            print('Pressure Monitor Value/Key Error: ', tdms_filename)
-
-    pressure_data = pd.concat(pressure_data, ignore_index=True)
     channels = [
         'Pressure Instrument',
     ]
-    print(pressure_data)
-
-    timestamp = pressure_data['Timestamp']
-
     fig = plt.figure()
     # major_yticks = np.arange(90, 110, 1.0)
     # minor_yticks = np.arange(90, 110, 0.2)
@@ -155,7 +180,20 @@ if plt_pressure:
     ax = fig.add_subplot(1, 1, 1)
     # ax.set_yticks(major_yticks)
     # ax.set_yticks(minor_yticks, minor=True)
-    ax.plot(timestamp, pressure_data[channels])
+    if rollup_dir is None:
+        pressure_data = []
+        for tdms_filename in tdms_filenames:
+            try:
+                pressure_data.append(TdmsFile.read(tdms_filename)['Pressure Monitor'].as_dataframe())
+            except (ValueError, KeyError):
+                print('Pressure Monitor Value/Key Error: ', tdms_filename)
+
+        pressure_data = pd.concat(pressure_data, ignore_index=True)
+        print(pressure_data)
+        timestamp = pressure_data['Timestamp']
+        ax.plot(timestamp, pressure_data[channels])
+    else:
+        timestamp = plot_rollup(ax, tdms_rollup('Pressure Monitor'), channels, tdms_start, tdms_end)['timestamp']
     ax.grid(which='both')
     ax.grid(which='minor', alpha=0.2)
     ax.grid(which='major', alpha=0.5)